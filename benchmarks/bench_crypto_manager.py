@@ -0,0 +1,66 @@
+"""
+CryptoManager 微基准测试
+
+对比每次调用的开销：
+- load_rsa_keys：每次从磁盘读取并解析 PEM（清空密钥环） vs 命中进程内密钥环
+- encrypt_data / decrypt_data：旧版 RSA + AES-CBC vs 保险库 AES-GCM
+
+用法（在项目根目录下）：python -m benchmarks.bench_crypto_manager
+"""
+
+import os
+import tempfile
+import timeit
+
+from managers.crypto_manager import CryptoManager
+from managers.key_ring import key_ring
+
+
+def _per_call_us(func, number):
+    """返回单次调用的平均耗时（微秒）"""
+    return timeit.timeit(func, number=number) / number * 1e6
+
+
+def _load_keys_from_disk(crypto_manager):
+    key_ring.clear()
+    crypto_manager.load_rsa_keys()
+
+
+def main(number=200):
+    payload = os.urandom(4096)
+
+    with tempfile.TemporaryDirectory() as key_path:
+        crypto_manager = CryptoManager()
+        crypto_manager.key_path = key_path
+        crypto_manager.load_data_key()
+
+        results = {
+            "load_rsa_keys (磁盘解析)": _per_call_us(
+                lambda: _load_keys_from_disk(crypto_manager), number
+            ),
+            "load_rsa_keys (密钥环)": _per_call_us(
+                crypto_manager.load_rsa_keys, number
+            ),
+        }
+
+        legacy = crypto_manager._encrypt_legacy(payload)
+        vault = crypto_manager._encrypt_vault(payload)
+        results["encrypt (旧版)"] = _per_call_us(
+            lambda: crypto_manager._encrypt_legacy(payload), number
+        )
+        results["encrypt (保险库)"] = _per_call_us(
+            lambda: crypto_manager._encrypt_vault(payload), number
+        )
+        results["decrypt (旧版)"] = _per_call_us(
+            lambda: crypto_manager.decrypt_data(legacy), number
+        )
+        results["decrypt (保险库)"] = _per_call_us(
+            lambda: crypto_manager.decrypt_data(vault), number
+        )
+
+    for name, cost in results.items():
+        print(f"{name:<28}{cost:>12.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+本地哈希嵌入基准测试
+
+用模拟日记合成一个大规模日记库，测量 HashingEmbeddings 的批量嵌入耗时、
+RagRetriever 建立索引的总耗时，以及单次查询延迟。全程离线、结果确定。
+
+用法（在项目根目录下）：python -m benchmarks.bench_hashing_embeddings [日记数量]
+"""
+
+import sys
+import time
+
+from rag.hashing_embeddings import HashingEmbeddings
+from rag.rag_retriever import RagRetriever
+from tests.mock_data.test_diary.diarys import diary_content_list
+
+
+def synthetic_diaries(count):
+    """将模拟日记轮换拼接成 count 篇互不相同的日记"""
+    base = diary_content_list
+    return [
+        f"{base[i % len(base)]}\n{base[(i * 7 + 3) % len(base)][:200]}\n第 {i} 篇"
+        for i in range(count)
+    ]
+
+
+def main(count=10000):
+    texts = synthetic_diaries(count)
+    embedding = HashingEmbeddings()
+    chars = sum(len(text) for text in texts)
+
+    start = time.perf_counter()
+    embedding.embed_array(texts)
+    embed_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    retriever = RagRetriever(texts, embedding_model=HashingEmbeddings())
+    index_seconds = time.perf_counter() - start
+
+    queries = ["张总叫我进办公室干什么？", "王阿姨", "豆豆打疫苗", "京都的清水寺"]
+    start = time.perf_counter()
+    for query in queries:
+        retriever.retrieve(query, k=3)
+    query_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+    print(f"日记数量: {count}, 总字符数: {chars}")
+    print(f"批量嵌入: {embed_seconds:.2f} s ({count / embed_seconds:.0f} 篇/s)")
+    print(f"建立索引（嵌入 + 缓存 + FAISS）: {index_seconds:.2f} s")
+    print(f"单次查询: {query_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,71 @@
+"""
+检索快速路径基准测试
+
+比较单次查询的延迟：旧路径每次构造 ``vectorstore.as_retriever`` 再走通用的
+``invoke``；新路径经查询嵌入缓存后直接调用 FAISS 索引检索，``search`` 只返回轻量的
+(段落 ID, 文档 ID, 得分)，``retrieve_batch`` 一次嵌入并检索多个查询。
+嵌入使用本地哈希模型，全程离线，结果确定。
+
+用法（在项目根目录下）：python -m benchmarks.bench_retrieval_fast_path [日记数量]
+"""
+
+import sys
+import time
+
+from benchmarks.bench_hashing_embeddings import synthetic_diaries
+from rag.hashing_embeddings import HashingEmbeddings
+from rag.rag_retriever import RagRetriever
+
+QUERIES = [
+    "张总叫我进办公室干什么？",
+    "王阿姨",
+    "豆豆打疫苗",
+    "京都的清水寺",
+    "搬到上海办居住证",
+    "高数作业请教王教授",
+    "郁金香什么时候开花",
+    "公司可能要裁员",
+]
+
+
+def per_query_ms(run, rounds=20):
+    run()  # 预热，查询嵌入进入缓存
+    start = time.perf_counter()
+    for _ in range(rounds):
+        run()
+    return (time.perf_counter() - start) / (rounds * len(QUERIES)) * 1000
+
+
+def main(count=10000):
+    retriever = RagRetriever(
+        synthetic_diaries(count), embedding_model=HashingEmbeddings()
+    )
+    k = 5
+
+    def old_path():
+        for query in QUERIES:
+            retriever.vectorstore.as_retriever(
+                search_type="similarity", search_kwargs={"k": k}
+            ).invoke(query)
+
+    paths = {
+        "旧路径 as_retriever().invoke": old_path,
+        "retrieve(mode=vector)": lambda: [
+            retriever.retrieve(query, k, mode="vector") for query in QUERIES
+        ],
+        "search(mode=vector)": lambda: [
+            retriever.search(query, k, mode="vector") for query in QUERIES
+        ],
+        "retrieve_batch(mode=vector)": lambda: retriever.retrieve_batch(
+            QUERIES, k, mode="vector"
+        ),
+        "search(hybrid)": lambda: [retriever.search(query, k) for query in QUERIES],
+        "search_batch(hybrid)": lambda: retriever.search_batch(QUERIES, k),
+    }
+    print(f"段落数量: {retriever.vectorstore.index.ntotal}, 每个查询取前 {k} 个")
+    for name, run in paths.items():
+        print(f"  {name:32s} {per_query_ms(run):.3f} ms/查询")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
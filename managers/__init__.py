@@ -1,11 +1,24 @@
 from .crypto_manager import CryptoManager
 from .config_manager import ConfigManager
-from .diary_manager import DiaryManager
+from .diary_manager import DiaryManager, DIARY_SAVED, DIARY_DELETED
+from .diary_storage import IDiaryStorage, FileDiaryStorage
+from .sqlite_diary_storage import SqliteDiaryStorage
 from .weather_manager import WeatherManager
+from .chat_log import ChatLog
+from .transcription_client import TranscriptionClient
+from .autosave_manager import AutosaveManager
 
 __all__ = [
     "CryptoManager",
     "ConfigManager",
     "DiaryManager",
+    "DIARY_SAVED",
+    "DIARY_DELETED",
+    "IDiaryStorage",
+    "FileDiaryStorage",
+    "SqliteDiaryStorage",
     "WeatherManager",
+    "ChatLog",
+    "TranscriptionClient",
+    "AutosaveManager",
 ]
@@ -0,0 +1,281 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from models import Diary
+
+# 日志记录的长度前缀：4 字节无符号大端整数
+_LENGTH = struct.Struct(">I")
+
+
+def _digest(content: str) -> bytes:
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+
+def _diff(old: str, new: str) -> Tuple[int, int, str]:
+    """
+    计算把 old 改为 new 的最小单段替换
+
+    Returns:
+        (起始位置, 删除的字符数, 插入的文本)
+    """
+    limit = min(len(old), len(new))
+    start = 0
+    while start < limit and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old[-1 - end] == new[-1 - end]:
+        end += 1
+    return start, len(old) - start - end, new[start : len(new) - end]
+
+
+class AutosaveManager:
+    """
+    自动保存引擎
+
+    编辑器把当前日记交给 ``update``，调用本身只记录待保存的内容，不做任何加密和磁盘操作。
+    后台写入线程负责两件事：
+
+    - 把每批编辑以增量（起始位置、删除长度、插入文本）的形式加密追加到该日期的崩溃日志，
+      第一条记录为完整内容。程序崩溃后可以用 ``recover`` 重放日志找回未保存的内容。
+    - 最后一次编辑后 ``debounce`` 秒内没有新编辑时，通过 DiaryManager 保存日记，
+      连续的编辑只触发一次保存。保存成功后删除日志。
+
+    切换日期时调用 ``flush(wait=False)`` 跳过防抖立即保存，界面不必等待加密和写盘。
+    """
+
+    def __init__(
+        self, diary_manager, journal_dir: str = "./data/journal/", debounce=2.0
+    ):
+        """
+        初始化自动保存引擎并启动后台写入线程
+
+        Args:
+            diary_manager: 用于保存日记的 DiaryManager，其 crypto_manager 用于加密日志
+            journal_dir: 崩溃日志目录，每个日期一个文件
+            debounce: 防抖时间（秒），最后一次编辑后等待这么久再保存
+        """
+        self.diary_manager = diary_manager
+        self.crypto_manager = diary_manager.crypto_manager
+        self.journal_dir = journal_dir
+        self.debounce = debounce
+        self.saves = 0  # 实际保存的次数
+        self._pending: Dict[str, Diary] = {}  # 日期 -> 尚未保存的日记
+        self._saving: Dict[str, Diary] = {}  # 日期 -> 正在保存的日记
+        self._batches: List[Tuple[str, str]] = []  # 尚未写入日志的编辑 (日期, 内容)
+        self._journaled: Dict[str, str] = {}  # 日期 -> 日志中最后记录的内容
+        self._clean: Dict[str, bytes] = {}  # 日期 -> 已保存内容的哈希
+        self._last_event = 0.0
+        self._running = True
+        self._condition = threading.Condition()
+        self._journal_lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        os.makedirs(journal_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+
+    def _journal_path(self, date_str: str) -> str:
+        return os.path.join(self.journal_dir, f"{date_str}.journal")
+
+    def mark_clean(self, date_str: str, content: Optional[str]):
+        """记录日记在存储中的内容，与之相同的编辑不会触发保存"""
+        with self._condition:
+            self._clean[date_str] = _digest(content or "")
+
+    def is_dirty(self, date_str: str) -> bool:
+        """日记是否有尚未保存完成的编辑"""
+        with self._condition:
+            return date_str in self._pending or date_str in self._saving
+
+    def get_pending(self, date_str: str) -> Optional[Diary]:
+        """获取尚未保存完成的日记，切换回该日期时应优先使用它而不是存储中的内容"""
+        with self._condition:
+            return self._pending.get(date_str) or self._saving.get(date_str)
+
+    def update(self, diary: Diary) -> bool:
+        """
+        提交编辑后的日记
+
+        Args:
+            diary: 编辑后的日记对象
+
+        Returns:
+            内容与已保存的内容相同时返回 False，否则返回 True
+        """
+        date_str = diary.date.split()[0]
+        content = diary.content or ""
+        with self._condition:
+            if (
+                date_str not in self._pending
+                and date_str not in self._saving
+                and self._clean.get(date_str) == _digest(content)
+            ):
+                return False
+            self._pending[date_str] = diary
+            self._batches.append((date_str, content))
+            self._last_event = time.monotonic()
+            self._idle.clear()
+            self._condition.notify()
+        return True
+
+    def flush(self, wait: bool = True, timeout: Optional[float] = None) -> bool:
+        """
+        跳过防抖等待，立即保存所有待保存的日记
+
+        Args:
+            wait: 是否等待保存完成
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            不等待时返回 True，否则返回是否在超时前保存完毕
+        """
+        with self._condition:
+            self._last_event = 0.0
+            self._condition.notify()
+        return self._idle.wait(timeout) if wait else True
+
+    def stop(self, timeout: Optional[float] = None):
+        """保存剩余的编辑后停止后台线程"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join(timeout)
+
+    def _due(self) -> bool:
+        return bool(self._pending) and (
+            time.monotonic() >= self._last_event + self.debounce
+        )
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and not self._batches and not self._due():
+                    timeout = None
+                    if self._pending:
+                        timeout = self._last_event + self.debounce - time.monotonic()
+                    self._condition.wait(timeout)
+                batches, self._batches = self._batches, []
+                pending = {}
+                # 停止时不再等待防抖，保存所有剩余的编辑
+                if self._due() or not self._running:
+                    pending, self._pending = self._pending, {}
+                    self._saving.update(pending)
+                if not self._running and not batches and not pending:
+                    return
+
+            self._write_journal(batches)
+            self._save(pending)
+
+            with self._condition:
+                if not self._pending and not self._batches:
+                    self._idle.set()
+
+    def _write_journal(self, batches: List[Tuple[str, str]]):
+        """把每批编辑的增量追加到日志"""
+        for date_str, content in batches:
+            previous = self._journaled.get(date_str)
+            if previous is None:
+                record, mode = {"base": content}, "wb"
+            elif previous == content:
+                continue
+            else:
+                start, deleted, inserted = _diff(previous, content)
+                record, mode = {"at": start, "del": deleted, "ins": inserted}, "ab"
+            data = json.dumps(record, ensure_ascii=False).encode("utf-8")
+            try:
+                data = self.crypto_manager.encrypt_data(data)
+                with self._journal_lock, open(self._journal_path(date_str), mode) as f:
+                    f.write(_LENGTH.pack(len(data)) + data)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except Exception as e:
+                print(f"写入自动保存日志失败: {e}")
+                # 下一批编辑重新写入完整内容
+                self._journaled.pop(date_str, None)
+                continue
+            self._journaled[date_str] = content
+
+    def _save(self, pending: Dict[str, Diary]):
+        """保存日记，成功后删除日志，失败时放回队列等待下次重试"""
+        for date_str, diary in pending.items():
+            try:
+                saved = self.diary_manager.save_diary(diary)
+            except Exception as e:
+                print(f"自动保存日记失败: {e}")
+                saved = False
+            with self._condition:
+                del self._saving[date_str]
+                if not saved:
+                    if self._running and date_str not in self._pending:
+                        self._pending[date_str] = diary
+                        # 至少等待一个防抖周期再重试
+                        self._last_event = time.monotonic()
+                    continue
+                self.saves += 1
+                self._clean[date_str] = _digest(diary.content or "")
+                if date_str in self._pending:
+                    # 保存期间又有新的编辑，日志仍然需要
+                    continue
+                self._journaled.pop(date_str, None)
+            self.discard_journal(date_str)
+
+    def discard_journal(self, date_str: str):
+        """删除日期的崩溃日志"""
+        with self._journal_lock:
+            try:
+                os.remove(self._journal_path(date_str))
+            except FileNotFoundError:
+                pass
+
+    def journal_dates(self) -> List[str]:
+        """列出有崩溃日志（即可能有未保存的编辑）的日期"""
+        return sorted(
+            name[: -len(".journal")]
+            for name in os.listdir(self.journal_dir)
+            if name.endswith(".journal")
+        )
+
+    def recover(self, date_str: str) -> Optional[str]:
+        """
+        重放崩溃日志，找回日期最后一次记录的内容
+
+        末尾不完整或无法解密的记录被忽略。
+
+        Returns:
+            日志中最后记录的内容，没有日志时返回 None
+        """
+        with self._journal_lock:
+            try:
+                with open(self._journal_path(date_str), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return None
+
+        content = None
+        offset = 0
+        while offset + _LENGTH.size <= len(data):
+            (length,) = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            if offset + length > len(data):
+                break
+            try:
+                record = json.loads(
+                    self.crypto_manager.decrypt_data(data[offset : offset + length])
+                )
+            except Exception as e:
+                print(f"自动保存日志 {date_str} 有损坏的记录: {e}")
+                break
+            offset += length
+            if "base" in record:
+                content = record["base"]
+            elif content is not None:
+                start = record["at"]
+                content = (
+                    content[:start] + record["ins"] + content[start + record["del"] :]
+                )
+        return content
@@ -0,0 +1,210 @@
+import json
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import deque
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# 每条记录的长度前缀：4 字节无符号大端整数
+_LENGTH = struct.Struct(">I")
+# 无法解密的记录在读取结果中的占位内容
+CORRUPTED_CONTENT = "（这条消息已损坏，无法读取）"
+
+
+class ChatLog:
+    """
+    加密的追加式聊天记录
+
+    每个会话一个文件，每条消息单独加密后加上长度前缀追加到文件末尾，已写入的内容从不改写，
+    程序崩溃时最多丢失最后一条没写完的记录（下次打开时截掉）。长度完整但无法解密的记录
+    不会被删除，读取时以 ``corrupted`` 为 True 的占位消息代替，消息序号保持不变。
+    内存中只保存每条记录的文件偏移（每条 8 字节）和最近 ``ring_size`` 条消息，
+    更早的消息按页从文件读取并解密，内存占用与会话长度基本无关。最新的聊天摘要单独保存在同名的 ``.summary`` 文件中。
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        log_dir: str = "./data/chat/",
+        crypto_manager=None,
+        ring_size: int = 50,
+    ):
+        """
+        打开（或新建）会话的聊天记录
+
+        Args:
+            session_id: 会话 ID，用作文件名
+            log_dir: 聊天记录目录
+            crypto_manager: 用于加密消息的 CryptoManager，为 None 时明文保存
+            ring_size: 内存中保留的最近消息条数
+        """
+        self.session_id = session_id
+        self.crypto_manager = crypto_manager
+        self.path = os.path.join(log_dir, f"{session_id}.log")
+        self.summary_path = os.path.join(log_dir, f"{session_id}.summary")
+        self._offsets = array("Q")  # 记录序号 -> 文件偏移
+        self._recent: deque = deque(maxlen=ring_size)
+        self._lock = threading.Lock()
+
+        os.makedirs(log_dir, exist_ok=True)
+        with ExitStack() as stack:
+            self._file = stack.enter_context(open(self.path, "a+b"))
+            self._scan()
+            self._load_recent(ring_size)
+            # 打开成功后才接管文件，构造过程中出错时文件会被关闭
+            self._exit_stack = stack.pop_all()
+
+    @staticmethod
+    def new_session_id() -> str:
+        """按当前时间生成会话 ID"""
+        return datetime.now().strftime("%Y%m%d-%H%M%S")
+
+    @staticmethod
+    def list_sessions(log_dir: str = "./data/chat/") -> List[str]:
+        """按时间顺序列出目录中的会话 ID"""
+        if not os.path.isdir(log_dir):
+            return []
+        return sorted(
+            name[: -len(".log")]
+            for name in os.listdir(log_dir)
+            if name.endswith(".log")
+        )
+
+    def _scan(self):
+        """读取各记录的偏移，截掉末尾不完整的记录"""
+        self._file.seek(0, os.SEEK_END)
+        size = self._file.tell()
+        offset = 0
+        while offset + _LENGTH.size <= size:
+            self._file.seek(offset)
+            (length,) = _LENGTH.unpack(self._file.read(_LENGTH.size))
+            if offset + _LENGTH.size + length > size:
+                break
+            self._offsets.append(offset)
+            offset += _LENGTH.size + length
+        if offset < size:
+            print(f"聊天记录 {self.path} 末尾有不完整的记录，已截断")
+            self._file.truncate(offset)
+
+    def _load_recent(self, ring_size: int):
+        """读取最近的消息，无法解密的记录以占位消息代替"""
+        start = max(0, len(self._offsets) - ring_size)
+        self._recent.extend(self._read_range(start, len(self._offsets)))
+
+    def _read_record(self, offset: int) -> Dict:
+        """读取并解密偏移处的一条记录"""
+        self._file.seek(offset)
+        (length,) = _LENGTH.unpack(self._file.read(_LENGTH.size))
+        data = self._file.read(length)
+        if self.crypto_manager is not None:
+            data = self.crypto_manager.decrypt_data(data)
+        return json.loads(data)
+
+    def _read_range(self, start: int, end: int) -> List[Dict]:
+        """读取并解密序号在 [start, end) 内的记录，无法解密的记录以占位消息代替"""
+        messages = []
+        for index in range(start, end):
+            try:
+                messages.append(self._read_record(self._offsets[index]))
+            except Exception as e:
+                print(f"聊天记录 {self.path} 第 {index} 条记录已损坏: {e}")
+                messages.append(
+                    {
+                        "role": "unknown",
+                        "content": CORRUPTED_CONTENT,
+                        "time": None,
+                        "corrupted": True,
+                    }
+                )
+        return messages
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def append(self, role: str, content: str) -> int:
+        """
+        追加一条消息
+
+        Args:
+            role: 消息角色，如 user、ai
+            content: 消息内容
+
+        Returns:
+            消息的序号
+        """
+        message = {"role": role, "content": content, "time": time.time()}
+        data = json.dumps(message, ensure_ascii=False).encode("utf-8")
+        if self.crypto_manager is not None:
+            data = self.crypto_manager.encrypt_data(data)
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            offset = self._file.tell()
+            self._file.write(_LENGTH.pack(len(data)) + data)
+            self._file.flush()
+            self._offsets.append(offset)
+            self._recent.append(message)
+            return len(self._offsets) - 1
+
+    def recent(self, count: Optional[int] = None) -> List[Dict]:
+        """获取内存中最近的 count 条消息，为 None 时返回全部"""
+        with self._lock:
+            messages = list(self._recent)
+        return messages if count is None else messages[-count:]
+
+    def load_page(self, before: Optional[int] = None, count: int = 30) -> List[Dict]:
+        """
+        分页读取更早的消息
+
+        Args:
+            before: 读取序号小于该值的消息，为 None 时从最新一条开始
+            count: 每页的消息条数
+
+        Returns:
+            按时间顺序排列的消息，第一条的序号为 max(0, before - count)；
+            无法解密的记录以占位消息代替
+        """
+        with self._lock:
+            end = (
+                len(self._offsets)
+                if before is None
+                else min(before, len(self._offsets))
+            )
+            start = max(0, end - count)
+            # 最近的消息直接从内存返回
+            ring_start = len(self._offsets) - len(self._recent)
+            if start >= ring_start:
+                return list(self._recent)[start - ring_start : end - ring_start]
+            return self._read_range(start, end)
+
+    def save_summary(self, summary: str):
+        """保存最新的聊天摘要，整体替换旧摘要"""
+        data = summary.encode("utf-8")
+        if self.crypto_manager is not None:
+            data = self.crypto_manager.encrypt_data(data)
+        temp_path = self.summary_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, self.summary_path)
+
+    def load_summary(self) -> Optional[str]:
+        """读取最新的聊天摘要，没有或无法解密时返回 None"""
+        if not os.path.exists(self.summary_path):
+            return None
+        try:
+            with open(self.summary_path, "rb") as f:
+                data = f.read()
+            if self.crypto_manager is not None:
+                data = self.crypto_manager.decrypt_data(data)
+            return data.decode("utf-8")
+        except Exception as e:
+            print(f"聊天摘要 {self.summary_path} 已损坏: {e}")
+            return None
+
+    def close(self):
+        """关闭聊天记录文件"""
+        with self._lock:
+            self._exit_stack.close()
@@ -1,4 +1,6 @@
 import os
+import threading
+from typing import Iterable
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import padding, rsa
 from cryptography.hazmat.primitives.serialization import (
@@ -6,9 +8,40 @@ from cryptography.hazmat.primitives.serialization import (
     load_pem_private_key,
 )
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives import padding as sym_padding
 from cryptography.hazmat.backends import default_backend
 from managers.config_manager import ConfigManager
+from managers.key_ring import key_ring
+
+
+# 保险库（vault）密文头：魔数 + 版本号
+VAULT_MAGIC = b"EDV"
+VAULT_VERSION = 1
+VAULT_HEADER = VAULT_MAGIC + bytes([VAULT_VERSION])
+VAULT_NONCE_SIZE = 12  # AES-GCM 推荐的 96 位 nonce
+VAULT_TAG_SIZE = 16  # AES-GCM 认证标签长度
+
+# 旧版密文布局：RSA 加密的对称密钥(256) + IV(16) + AES-CBC 密文
+LEGACY_KEY_SIZE = 256
+LEGACY_IV_SIZE = 16
+
+
+def write_file_atomic(path: str, data: bytes):
+    """
+    原子地写入文件：先写入同目录下的临时文件并落盘，再替换目标文件。
+    写入过程中崩溃或磁盘写满时，原文件保持不变。
+
+    Args:
+        path (str): 目标文件路径。
+        data (bytes): 文件内容。
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
 
 
 class CryptoManager:
@@ -16,8 +49,18 @@ class CryptoManager:
     RSA 加密工具类，支持混合加密
 
     提供生成密钥对、加载密钥、加密数据和解密数据的功能。
+
+    保险库模式下，一个长期有效的 AES 数据密钥（DEK）只用 RSA 包裹一次并保存，
+    每个会话只解包一次，之后每篇日记都用 AES-GCM 加密，不再逐条执行 RSA 运算。
+    旧版 ``.enc`` 密文（无版本头）仍可解密，并可通过 :meth:`needs_migration` 懒迁移。
     """
 
+    # 已解包的数据密钥，按包裹文件路径缓存，在同一进程的所有实例间共享
+    _session_data_keys = {}
+    _session_lock = threading.Lock()
+    # 串行化密钥文件的检查、生成、轮换和加载；需要同时持有时先取 _session_lock
+    _key_lock = threading.Lock()
+
     def __init__(self):
         """
         初始化 CryptoManager 类，确保密钥存储路径存在。
@@ -26,6 +69,7 @@ class CryptoManager:
         self.key_path = config.get_config_value("key_path")
         if not self.key_path:
             raise ValueError("Key path is not set in config file.")
+        self.vault_mode = config.get_config_value("vault_mode", True)
         os.makedirs(self.key_path, exist_ok=True)
 
     def _get_key_paths(self):
@@ -39,6 +83,35 @@ class CryptoManager:
         private_key_path = os.path.join(self.key_path, "private_key.pem")
         return public_key_path, private_key_path
 
+    def _get_data_key_path(self):
+        """
+        获取被 RSA 包裹的数据密钥文件路径，与私钥放在同一目录。
+
+        Returns:
+            str: 数据密钥文件路径。
+        """
+        _, private_key_path = self._get_key_paths()
+        return os.path.join(os.path.dirname(private_key_path), "data_key.bin")
+
+    def _get_rotation_marker_path(self):
+        """
+        获取密钥轮换提交标记的文件路径，与私钥放在同一目录。
+
+        Returns:
+            str: 提交标记文件路径。
+        """
+        _, private_key_path = self._get_key_paths()
+        return os.path.join(os.path.dirname(private_key_path), "rotation.commit")
+
+    def _get_rotation_paths(self):
+        """
+        获取密钥轮换时需要替换的文件路径。
+
+        Returns:
+            tuple: 公钥路径、私钥路径和数据密钥文件路径。
+        """
+        return self._get_key_paths() + (self._get_data_key_path(),)
+
     def generate_rsa_keys(self):
         """
         生成 RSA 公钥和私钥，并保存到指定路径。
@@ -52,48 +125,261 @@ class CryptoManager:
 
         # 生成密钥对
         private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
-        public_key = private_key.public_key()
-
-        # 保存公钥
-        with open(public_key_path, "wb") as f:
-            f.write(
-                public_key.public_bytes(
-                    encoding=serialization.Encoding.PEM,
-                    format=serialization.PublicFormat.SubjectPublicKeyInfo,
-                )
-            )
-
-        # 保存私钥
-        with open(private_key_path, "wb") as f:
-            f.write(
-                private_key.private_bytes(
-                    encoding=serialization.Encoding.PEM,
-                    format=serialization.PrivateFormat.TraditionalOpenSSL,
-                    encryption_algorithm=serialization.NoEncryption(),
-                )
-            )
+        self._save_rsa_keys(private_key)
+
+    def _save_rsa_keys(self, private_key):
+        """
+        将密钥对保存到指定路径，并使密钥环中的旧密钥失效。
+
+        Args:
+            private_key: RSA 私钥对象。
+        """
+        public_key_path, private_key_path = self._get_key_paths()
+        public_pem, private_pem = self._serialize_rsa_keys(private_key)
+        write_file_atomic(public_key_path, public_pem)
+        write_file_atomic(private_key_path, private_pem)
+        key_ring.invalidate((public_key_path, private_key_path))
+
+    @staticmethod
+    def _serialize_rsa_keys(private_key):
+        """
+        将密钥对序列化为 PEM 格式。
+
+        Args:
+            private_key: RSA 私钥对象。
+
+        Returns:
+            tuple: 公钥 PEM 和私钥 PEM。
+        """
+        public_pem = private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        private_pem = private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.TraditionalOpenSSL,
+            encryption_algorithm=serialization.NoEncryption(),
+        )
+        return public_pem, private_pem
 
     def load_rsa_keys(self):
         """
         加载 RSA 公钥和私钥。
 
+        密钥每个进程只从磁盘解析一次，之后从共享密钥环中获取。首次加载时的检查、
+        生成和保存在锁内进行，多个线程同时首次加载也只会生成一对密钥。
+
         Returns:
             tuple: 公钥对象和私钥对象。
         """
-        self.generate_rsa_keys()  # 确保密钥已生成
-        public_key_path, private_key_path = self._get_key_paths()
+        key_paths = self._get_key_paths()
+        keys = key_ring.get(key_paths)
+        if keys is not None:
+            return keys
+
+        with self._key_lock:
+            # 等待锁期间其他线程可能已经加载
+            keys = key_ring.get(key_paths)
+            if keys is not None:
+                return keys
+
+            self._recover_rotation()  # 完成或撤销上次中断的密钥轮换
+            self.generate_rsa_keys()  # 确保密钥已生成
+            public_key_path, private_key_path = key_paths
+
+            # 加载公钥
+            with open(public_key_path, "rb") as key_file:
+                public_key = load_pem_public_key(key_file.read())
 
-        # 加载公钥
-        with open(public_key_path, "rb") as key_file:
-            public_key = load_pem_public_key(key_file.read())
+            # 加载私钥
+            with open(private_key_path, "rb") as key_file:
+                private_key = load_pem_private_key(key_file.read(), password=None)
 
-        # 加载私钥
-        with open(private_key_path, "rb") as key_file:
-            private_key = load_pem_private_key(key_file.read(), password=None)
+            key_ring.put(key_paths, public_key, private_key)
+            return public_key, private_key
 
-        return public_key, private_key
+    def rotate_rsa_keys(self, ciphertexts: Iterable[bytes]):
+        """
+        轮换 RSA 密钥对：生成新密钥对，并用新公钥重新包裹保险库数据密钥。
+
+        新的公钥、私钥和数据密钥先全部写入 ``.new`` 文件并落盘，再写入提交标记，
+        最后逐个替换旧文件。替换中途崩溃时，下次加载密钥会根据提交标记继续完成替换；
+        标记写入前崩溃则丢弃新文件，旧密钥保持可用。
+
+        旧版格式（无版本头）的密文直接依赖旧 RSA 密钥，存在时拒绝轮换，需先完成迁移。
+
+        Args:
+            ciphertexts (Iterable[bytes]): 当前保存的所有密文，用于检查是否仍有旧版格式。
+
+        Raises:
+            ValueError: 仍有旧版格式的密文。
+        """
+        if any(not self.is_vault_ciphertext(c) for c in ciphertexts):
+            raise ValueError("存在旧版格式的密文，请先迁移为保险库格式再轮换密钥")
+
+        data_key = self.load_data_key()
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        public_pem, private_pem = self._serialize_rsa_keys(private_key)
+        wrapped_key = private_key.public_key().encrypt(data_key, self._oaep_padding())
+
+        with self._session_lock, self._key_lock:
+            contents = (public_pem, private_pem, wrapped_key)
+            for path, data in zip(self._get_rotation_paths(), contents):
+                write_file_atomic(path + ".new", data)
+            write_file_atomic(self._get_rotation_marker_path(), b"")
+            self._recover_rotation()
+
+    def _recover_rotation(self):
+        """
+        完成或撤销中断的密钥轮换。
+
+        提交标记存在说明新的密钥文件已全部落盘，用它们替换旧文件；
+        否则丢弃未写完的新文件，保留旧密钥。
+        """
+        marker_path = self._get_rotation_marker_path()
+        committed = os.path.exists(marker_path)
+        for path in self._get_rotation_paths():
+            new_path = path + ".new"
+            if not os.path.exists(new_path):
+                continue
+            if committed:
+                os.replace(new_path, path)
+            else:
+                os.remove(new_path)
+        if committed:
+            os.remove(marker_path)
+            key_ring.invalidate(self._get_key_paths())
+
+    def _oaep_padding(self):
+        """
+        获取 RSA-OAEP 填充方案。
+        """
+        return padding.OAEP(
+            mgf=padding.MGF1(algorithm=hashes.SHA256()),
+            algorithm=hashes.SHA256(),
+            label=None,
+        )
+
+    def load_data_key(self) -> bytes:
+        """
+        获取保险库数据密钥。首次调用时从磁盘读取并用 RSA 私钥解包，
+        若不存在则生成新的数据密钥并用公钥包裹保存。解包结果在本进程内缓存。
+
+        Returns:
+            bytes: 256 位 AES 数据密钥。
+        """
+        data_key_path = self._get_data_key_path()
+        with self._session_lock:
+            data_key = self._session_data_keys.get(data_key_path)
+            if data_key is not None:
+                return data_key
+
+            public_key, private_key = self.load_rsa_keys()
+            if os.path.exists(data_key_path):
+                with open(data_key_path, "rb") as f:
+                    wrapped_key = f.read()
+                data_key = private_key.decrypt(wrapped_key, self._oaep_padding())
+            else:
+                data_key = AESGCM.generate_key(bit_length=256)
+                wrapped_key = public_key.encrypt(data_key, self._oaep_padding())
+                write_file_atomic(data_key_path, wrapped_key)
+
+            self._session_data_keys[data_key_path] = data_key
+            return data_key
+
+    def lock(self):
+        """
+        丢弃本进程缓存的数据密钥，下次加解密时需重新用 RSA 私钥解包。
+        """
+        with self._session_lock:
+            self._session_data_keys.pop(self._get_data_key_path(), None)
+
+    @staticmethod
+    def is_vault_ciphertext(ciphertext: bytes) -> bool:
+        """
+        判断密文是否带有保险库版本头。
+
+        Args:
+            ciphertext (bytes): 密文数据。
+
+        Returns:
+            bool: 带有版本头返回 True。
+        """
+        return ciphertext[: len(VAULT_HEADER)] == VAULT_HEADER
+
+    def needs_migration(self, ciphertext: bytes) -> bool:
+        """
+        判断密文是否为旧版格式且应在保险库模式下重新加密。
+
+        Args:
+            ciphertext (bytes): 密文数据。
+
+        Returns:
+            bool: 需要迁移返回 True。
+        """
+        return bool(self.vault_mode) and not self.is_vault_ciphertext(ciphertext)
 
     def encrypt_data(self, data: bytes) -> bytes:
+        """
+        加密数据。保险库模式下使用数据密钥和 AES-GCM，否则使用旧版 RSA + AES-CBC 混合加密。
+
+        Args:
+            data (bytes): 要加密的明文数据。
+
+        Returns:
+            bytes: 加密后的数据。
+        """
+        if self.vault_mode:
+            return self._encrypt_vault(data)
+        return self._encrypt_legacy(data)
+
+    def decrypt_data(self, ciphertext: bytes) -> bytes:
+        """
+        解密数据，根据版本头自动识别保险库格式或旧版格式。
+
+        带版本头且长度足以容纳 nonce 和认证标签的密文只按保险库格式解密，
+        认证失败说明密文被篡改或数据密钥不匹配，不会回退到旧版解密。
+
+        Args:
+            ciphertext (bytes): 要解密的密文数据。
+
+        Returns:
+            bytes: 解密后的明文数据。
+
+        Raises:
+            InvalidTag: 保险库密文被篡改或数据密钥不匹配。
+        """
+        if (
+            self.is_vault_ciphertext(ciphertext)
+            and len(ciphertext) >= len(VAULT_HEADER) + VAULT_NONCE_SIZE + VAULT_TAG_SIZE
+        ):
+            return self._decrypt_vault(ciphertext)
+        return self._decrypt_legacy(ciphertext)
+
+    def _encrypt_vault(self, data: bytes) -> bytes:
+        """
+        使用数据密钥和 AES-GCM 加密数据，版本头作为附加认证数据。
+
+        Returns:
+            bytes: 版本头 + nonce + AES-GCM 密文（含认证标签）。
+        """
+        nonce = os.urandom(VAULT_NONCE_SIZE)
+        sealed = AESGCM(self.load_data_key()).encrypt(nonce, data, VAULT_HEADER)
+        return VAULT_HEADER + nonce + sealed
+
+    def _decrypt_vault(self, ciphertext: bytes) -> bytes:
+        """
+        解密保险库格式的密文。
+
+        Raises:
+            InvalidTag: 密文被篡改或数据密钥不匹配。
+        """
+        offset = len(VAULT_HEADER)
+        nonce = ciphertext[offset : offset + VAULT_NONCE_SIZE]
+        sealed = ciphertext[offset + VAULT_NONCE_SIZE :]
+        return AESGCM(self.load_data_key()).decrypt(nonce, sealed, VAULT_HEADER)
+
+    def _encrypt_legacy(self, data: bytes) -> bytes:
         """
         使用混合加密加密数据：RSA 加密对称密钥，AES 加密数据。
 
@@ -105,7 +391,7 @@ class CryptoManager:
         """
         # 生成随机对称密钥和 IV
         symmetric_key = os.urandom(32)  # 256 位对称密钥
-        iv = os.urandom(16)  # 128 位初始化向量
+        iv = os.urandom(LEGACY_IV_SIZE)  # 128 位初始化向量
 
         # 使用 AES 加密数据
         cipher = Cipher(
@@ -122,19 +408,12 @@ class CryptoManager:
 
         # 使用 RSA 加密对称密钥
         public_key, _ = self.load_rsa_keys()
-        encrypted_key = public_key.encrypt(
-            symmetric_key,
-            padding.OAEP(
-                mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None,
-            ),
-        )
+        encrypted_key = public_key.encrypt(symmetric_key, self._oaep_padding())
 
         # 返回组合后的加密数据
         return encrypted_key + iv + encrypted_data
 
-    def decrypt_data(self, ciphertext: bytes) -> bytes:
+    def _decrypt_legacy(self, ciphertext: bytes) -> bytes:
         """
         使用混合加密解密数据：RSA 解密对称密钥，AES 解密数据。
 
@@ -145,20 +424,14 @@ class CryptoManager:
             bytes: 解密后的明文数据。
         """
         # 提取 RSA 加密的对称密钥、IV 和 AES 加密的数据
-        encrypted_key = ciphertext[:256]  # RSA 加密的对称密钥长度为 256 字节
-        iv = ciphertext[256:272]  # IV 长度为 16 字节
-        encrypted_data = ciphertext[272:]  # 剩余部分为 AES 加密的数据
+        iv_end = LEGACY_KEY_SIZE + LEGACY_IV_SIZE
+        encrypted_key = ciphertext[:LEGACY_KEY_SIZE]  # RSA 加密的对称密钥
+        iv = ciphertext[LEGACY_KEY_SIZE:iv_end]  # IV 长度为 16 字节
+        encrypted_data = ciphertext[iv_end:]  # 剩余部分为 AES 加密的数据
 
         # 使用 RSA 解密对称密钥
         _, private_key = self.load_rsa_keys()
-        symmetric_key = private_key.decrypt(
-            encrypted_key,
-            padding.OAEP(
-                mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                algorithm=hashes.SHA256(),
-                label=None,
-            ),
-        )
+        symmetric_key = private_key.decrypt(encrypted_key, self._oaep_padding())
 
         # 使用 AES 解密数据
         cipher = Cipher(
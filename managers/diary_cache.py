@@ -0,0 +1,155 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from models import Diary
+
+
+def estimate_diary_size(diary: Diary) -> int:
+    """估算一篇日记在内存中占用的字节数"""
+    return sys.getsizeof(diary) + sum(
+        sys.getsizeof(value) for value in diary.model_dump().values()
+    )
+
+
+class DiaryCache:
+    """
+    已解密日记的 LRU 缓存
+
+    同时受条目数和内存预算限制，每个条目记录存储后端给出的版本号（如文件 mtime），
+    版本不一致时视为未命中。空闲超过 ``idle_timeout`` 秒后自动清空，
+    避免明文日记长时间驻留内存。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 64,
+        max_bytes: int = 8 * 1024 * 1024,
+        idle_timeout: float = 300,
+    ):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最大条目数，为 0 时禁用缓存
+            max_bytes: 内存预算（字节）
+            idle_timeout: 空闲多少秒后清空缓存，为 0 时不自动清空
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.idle_timeout = idle_timeout
+        self._entries: "OrderedDict[str, Tuple[Diary, Hashable, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._idle_timer: Optional[threading.Timer] = None
+        self._last_access = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, date_str: str, version: Hashable = None) -> Optional[Diary]:
+        """
+        获取缓存的日记
+
+        Args:
+            date_str: 日期字符串
+            version: 存储后端当前的版本号，与缓存记录不一致时视为未命中
+
+        Returns:
+            命中时返回日记副本，否则返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(date_str)
+            if entry is None or entry[1] != version:
+                if entry is not None:
+                    self._remove(date_str)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(date_str)
+            self.hits += 1
+            self._touch()
+            return entry[0].model_copy()
+
+    def put(self, date_str: str, diary: Diary, version: Hashable = None) -> None:
+        """
+        写入缓存，必要时按 LRU 顺序淘汰旧条目
+
+        Args:
+            date_str: 日期字符串
+            diary: 日记对象
+            version: 存储后端当前的版本号
+        """
+        if self.max_entries <= 0:
+            return
+        size = estimate_diary_size(diary)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(date_str)
+            self._entries[date_str] = (diary.model_copy(), version, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            self._touch()
+
+    def invalidate(self, date_str: str) -> None:
+        """使指定日期的缓存失效"""
+        with self._lock:
+            self._remove(date_str)
+
+    def clear(self) -> None:
+        """清空缓存中的所有明文日记"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            包含命中、未命中、淘汰次数及当前占用的字典
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+    def _remove(self, date_str: str) -> None:
+        entry = self._entries.pop(date_str, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _touch(self) -> None:
+        """记录一次访问；空闲计时器只在未运行时启动，到期后再检查是否真的空闲"""
+        self._last_access = time.monotonic()
+        if self.idle_timeout > 0 and self._idle_timer is None:
+            self._schedule_idle_expiry(self.idle_timeout)
+
+    def _schedule_idle_expiry(self, delay: float) -> None:
+        self._idle_timer = threading.Timer(delay, self._expire_idle)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _expire_idle(self) -> None:
+        with self._lock:
+            remaining = self._last_access + self.idle_timeout - time.monotonic()
+            if remaining > 0:
+                self._schedule_idle_expiry(remaining)
+                return
+            self._entries.clear()
+            self._bytes = 0
+            self._idle_timer = None
@@ -1,87 +1,69 @@
-import os
-import pickle
-from typing import Optional, List
-from abc import ABC, abstractmethod
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Callable
 
 from managers.crypto_manager import CryptoManager
 from managers.config_manager import ConfigManager
+from managers.diary_cache import DiaryCache
+from managers.diary_storage import IDiaryStorage, FileDiaryStorage
+from managers.sqlite_diary_storage import SqliteDiaryStorage
 from models import Diary
 
-
-class IDiaryStorage(ABC):
-    """日记存储接口，定义了日记存储的基本操作"""
-
-    @abstractmethod
-    def save_diary(self, diary: Diary) -> bool:
-        """保存日记"""
-        pass
-
-    @abstractmethod
-    def load_diary(self, date_str: str) -> Optional[Diary]:
-        """加载日记"""
-        pass
-
-    @abstractmethod
-    def delete_diary(self, date_str: str) -> bool:
-        """删除日记"""
-        pass
-
-    @abstractmethod
-    def get_all_dates(self) -> List[str]:
-        """获取所有日记日期"""
-        pass
+# 日记变更事件类型
+DIARY_SAVED = "saved"
+DIARY_DELETED = "deleted"
 
 
 class DiaryManager(IDiaryStorage):
     """
-    日记文件管理器
+    日记管理器
 
-    负责日记文件的存储、读取、删除等操作，并处理加密和解密逻辑。
+    负责日记的存储、读取、删除等操作。具体存储由配置项 ``storage_backend``
+    选择的后端完成：``file`` 为每天一个加密文件的目录存储，``sqlite`` 为单个 SQLite 数据库。
+    已解密的日记保存在 LRU 缓存中，保存/删除时同步更新，存储版本变化时自动失效。
+    保存/删除成功后会通知已注册的变更监听器。
     """
 
     def __init__(self):
         """
-        初始化日记文件管理器
-
-        Args:
-            crypto_manager: 加密管理器
-            config_manager: 配置管理器
+        初始化日记管理器，根据配置创建存储后端
         """
         self.crypto_manager = CryptoManager()
         self.config_manager = ConfigManager()
-
-        # 确保日记存储目录存在
-        self._ensure_diary_directory_exists()
-
-    def _ensure_diary_directory_exists(self) -> None:
-        """确保日记存储目录存在，不存在则创建"""
-        diary_path = self.config_manager.get_config_value("diary_path")
-        if not os.path.exists(diary_path):
-            try:
-                os.makedirs(diary_path)
-                print(f"创建日记存储目录: {diary_path}")
-            except Exception as e:
-                print(f"创建日记目录失败: {e}")
-
-    def _get_diary_path_from_date(self, date_str: str) -> str:
-        """
-        根据日期字符串获取日记文件路径
-
-        Args:
-            date_str: 日期字符串，格式为 YYYY-MM-DD，如果为 None 则使用当前日期
-
-        Returns:
-            日记文件的完整路径
-        """
-        date_str = date_str
-        # 确保只取日期部分，不包含时间
-        date_str = date_str.split()[0]
-        diary_path_dir = self.config_manager.get_config_value("diary_path")
-        return os.path.join(diary_path_dir, f"{date_str}.enc")
+        self.storage = self._create_storage()
+        self.cache = DiaryCache(
+            max_entries=self.config_manager.get_config_value("diary_cache_size", 64),
+            max_bytes=self.config_manager.get_config_value(
+                "diary_cache_max_bytes", 8 * 1024 * 1024
+            ),
+            idle_timeout=self.config_manager.get_config_value(
+                "diary_cache_idle_timeout", 300
+            ),
+        )
+        self.load_workers = self.config_manager.get_config_value(
+            "diary_load_workers", 4
+        )
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._listeners: List[Callable[[str, str, Optional[Diary]], None]] = []
+
+    def _create_storage(self) -> IDiaryStorage:
+        """根据配置创建存储后端"""
+        backend = self.config_manager.get_config_value("storage_backend", "file")
+        if backend == "sqlite":
+            return SqliteDiaryStorage(
+                self.crypto_manager,
+                self.config_manager.get_config_value("sqlite_path"),
+                self.config_manager.get_config_value("sqlite_plain_metadata", True),
+            )
+        return FileDiaryStorage(
+            self.crypto_manager, self.config_manager.get_config_value("diary_path")
+        )
 
     def save_diary(self, diary: Diary) -> bool:
         """
-        保存日记到文件
+        保存日记
 
         Args:
             diary: 日记条目对象
@@ -89,51 +71,33 @@ class DiaryManager(IDiaryStorage):
         Returns:
             保存成功返回True，否则返回False
         """
-        try:
-            # 序列化和加密数据
-            serialized_data = pickle.dumps(diary.model_dump())
-            encrypted_data = self.crypto_manager.encrypt_data(serialized_data)
-
-            # 确定文件路径
-            file_path = self._get_diary_path_from_date(diary.date)
-
-            # 写入文件
-            with open(file_path, "wb") as f:
-                f.write(encrypted_data)
-
-            print(f"日记已保存: {file_path}")
-            return True
-        except Exception as e:
-            print(f"保存日记失败: {e}")
+        if not self.storage.save_diary(diary):
             return False
+        date_str = diary.date.split()[0]
+        self.cache.put(date_str, diary, self.storage.get_version(date_str))
+        self._notify(DIARY_SAVED, date_str, diary)
+        return True
 
     def load_diary(self, date_str: str) -> Optional[Diary]:
         """
         加载指定日期的日记
 
         Args:
-            date_str: 日期字符串，格式为 YYYY-MM-DD，如果为 None 则使用当前日期
+            date_str: 日期字符串，格式为 YYYY-MM-DD
 
         Returns:
             成功返回日记条目对象，失败返回 None
         """
-        try:
-            file_path = self._get_diary_path_from_date(date_str)
-
-            if not os.path.exists(file_path):
-                print(f"日记文件不存在: {file_path}")
-                return None
-
-            with open(file_path, "rb") as f:
-                encrypted_data = f.read()
-
-            decrypted_data = self.crypto_manager.decrypt_data(encrypted_data)
-            diary_data = pickle.loads(decrypted_data)
+        date_str = date_str.split()[0]
+        diary = self.cache.get(date_str, self.storage.get_version(date_str))
+        if diary is not None:
+            return diary
 
-            return Diary(**diary_data)
-        except Exception as e:
-            print(f"加载日记失败: {e}")
-            return None
+        diary = self.storage.load_diary(date_str)
+        if diary is not None:
+            # 读取后再取版本号：懒迁移可能会改写文件
+            self.cache.put(date_str, diary, self.storage.get_version(date_str))
+        return diary
 
     def get_all_dates(self) -> List[str]:
         """
@@ -142,17 +106,19 @@ class DiaryManager(IDiaryStorage):
         Returns:
             日期字符串列表，按时间倒序排列
         """
-        try:
-            diary_path = self.config_manager.get_config_value("diary_path")
-            if not os.path.exists(diary_path):
-                return []
+        return self.storage.get_all_dates()
 
-            files = [f for f in os.listdir(diary_path) if f.endswith(".enc")]
-            dates = [f.replace(".enc", "") for f in files]
-            return sorted(dates, reverse=True)
-        except Exception as e:
-            print(f"获取日记日期列表失败: {e}")
-            return []
+    def get_dates_between(
+        self, start: Optional[str] = None, end: Optional[str] = None
+    ) -> List[str]:
+        """
+        获取日期范围内（闭区间）的日记日期，按时间倒序排列
+
+        Args:
+            start: 起始日期 YYYY-MM-DD，为 None 表示不限
+            end: 结束日期 YYYY-MM-DD，为 None 表示不限
+        """
+        return self.storage.get_dates_between(start, end)
 
     def delete_diary(self, date_str: str) -> bool:
         """
@@ -164,20 +130,142 @@ class DiaryManager(IDiaryStorage):
         Returns:
             删除成功返回True，否则返回False
         """
-        try:
-            file_path = self._get_diary_path_from_date(date_str)
-
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                print(f"已删除日记: {date_str}")
-                return True
-            else:
-                print(f"要删除的日记不存在: {date_str}")
-                return False
-
-        except Exception as e:
-            print(f"删除日记失败: {e}")
+        date_str = date_str.split()[0]
+        self.cache.invalidate(date_str)
+        if not self.storage.delete_diary(date_str):
             return False
+        self._notify(DIARY_DELETED, date_str)
+        return True
+
+    def add_listener(
+        self, listener: Callable[[str, str, Optional[Diary]], None]
+    ) -> None:
+        """
+        注册日记变更监听器
+
+        Args:
+            listener: 回调函数 listener(event, date_str, diary)，event 为
+                DIARY_SAVED 或 DIARY_DELETED，删除事件的 diary 为 None
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(
+        self, listener: Callable[[str, str, Optional[Diary]], None]
+    ) -> None:
+        """注销日记变更监听器"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, event: str, date_str: str, diary: Optional[Diary] = None):
+        """通知所有监听器，单个监听器出错不影响其他监听器"""
+        for listener in list(self._listeners):
+            try:
+                listener(event, date_str, diary)
+            except Exception as e:
+                print(f"日记变更监听器出错: {e}")
+
+    def lock(self) -> None:
+        """
+        锁定：清空缓存中的明文日记，并丢弃会话数据密钥
+        """
+        self.cache.clear()
+        self.crypto_manager.lock()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        获取已解密日记缓存的统计信息
+
+        Returns:
+            包含命中、未命中、淘汰次数及当前占用的字典
+        """
+        return self.cache.stats()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """懒加载用于批量解密的线程池"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.load_workers, thread_name_prefix="diary-load"
+                )
+            return self._executor
+
+    def _iter_load(
+        self, dates: Iterable[str], cancel_event: Optional[threading.Event] = None
+    ) -> Iterator[Diary]:
+        """
+        在线程池中并行加载日记，按传入日期的顺序逐篇产出
+
+        同时在途的任务数受限，结果以流的方式返回而不必一次性载入全部日记。
+        cancel_event 被置位或生成器被关闭时，尚未开始的任务会被取消。
+        """
+        if self.load_workers <= 1:
+            for date_str in dates:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                diary = self.load_diary(date_str)
+                if diary is not None:
+                    yield diary
+            return
+
+        executor = self._get_executor()
+        pending = deque()
+        dates = iter(dates)
+        try:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    return
+                while len(pending) < self.load_workers * 2:
+                    date_str = next(dates, None)
+                    if date_str is None:
+                        break
+                    pending.append(executor.submit(self.load_diary, date_str))
+                if not pending:
+                    return
+                diary = pending.popleft().result()
+                if diary is not None:
+                    yield diary
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def load_many(
+        self, dates: Iterable[str], cancel_event: Optional[threading.Event] = None
+    ) -> Dict[str, Diary]:
+        """
+        并行加载多篇日记
+
+        Args:
+            dates: 日期字符串列表
+            cancel_event: 取消事件，置位后停止加载并返回已加载的部分
+
+        Returns:
+            日期到日记对象的字典，按传入顺序排列，不存在或加载失败的日期会被跳过
+        """
+        return {diary.date: diary for diary in self._iter_load(dates, cancel_event)}
+
+    def iter_diaries(
+        self,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        reverse: bool = False,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Iterator[Diary]:
+        """
+        按日期顺序流式遍历日期范围内（闭区间）的日记，解密在线程池中并行进行
+
+        Args:
+            start: 起始日期 YYYY-MM-DD，为 None 表示不限
+            end: 结束日期 YYYY-MM-DD，为 None 表示不限
+            reverse: 为 True 时按时间倒序产出
+            cancel_event: 取消事件，置位后停止遍历
+
+        Yields:
+            日记条目对象
+        """
+        dates = self.get_dates_between(start, end)
+        if not reverse:
+            dates.reverse()
+        return self._iter_load(dates, cancel_event)
 
     def get_all_diaries_str(self) -> List[str]:
         """
@@ -186,9 +274,4 @@ class DiaryManager(IDiaryStorage):
         Returns:
             日记条目对象列表
         """
-        diaries = []
-        for date_str in self.get_all_dates():
-            diary = self.load_diary(date_str)
-            if diary:
-                diaries.append(str(diary))
-        return diaries
+        return [str(diary) for diary in self.iter_diaries(reverse=True)]
@@ -0,0 +1,237 @@
+import os
+import pickle
+from typing import Optional, List, Hashable
+from abc import ABC, abstractmethod
+
+from managers.crypto_manager import CryptoManager, write_file_atomic
+from models import Diary
+
+
+class IDiaryStorage(ABC):
+    """日记存储接口，定义了日记存储的基本操作"""
+
+    @abstractmethod
+    def save_diary(self, diary: Diary) -> bool:
+        """保存日记"""
+        pass
+
+    @abstractmethod
+    def load_diary(self, date_str: str) -> Optional[Diary]:
+        """加载日记"""
+        pass
+
+    @abstractmethod
+    def delete_diary(self, date_str: str) -> bool:
+        """删除日记"""
+        pass
+
+    @abstractmethod
+    def get_all_dates(self) -> List[str]:
+        """获取所有日记日期"""
+        pass
+
+    def get_dates_between(
+        self, start: Optional[str] = None, end: Optional[str] = None
+    ) -> List[str]:
+        """
+        获取日期范围内（闭区间）的日记日期，按时间倒序排列
+
+        默认实现基于 get_all_dates 过滤，支持索引的后端应覆盖此方法。
+
+        Args:
+            start: 起始日期 YYYY-MM-DD，为 None 表示不限
+            end: 结束日期 YYYY-MM-DD，为 None 表示不限
+        """
+        return [
+            date
+            for date in self.get_all_dates()
+            if (start is None or date >= start) and (end is None or date <= end)
+        ]
+
+    def get_version(self, date_str: str) -> Hashable:
+        """
+        获取日记在存储中的版本标识，内容在外部被修改后版本会变化
+
+        默认实现返回 None，表示后端不支持变更检测。
+
+        Args:
+            date_str: 日期字符串，格式为 YYYY-MM-DD
+        """
+        return None
+
+
+class FileDiaryStorage(IDiaryStorage):
+    """
+    基于目录的日记存储
+
+    每天一个加密的 ``YYYY-MM-DD.enc`` 文件，内容为 pickle 序列化后加密的日记数据。
+    """
+
+    def __init__(self, crypto_manager: CryptoManager, diary_path: str):
+        """
+        初始化目录存储
+
+        Args:
+            crypto_manager: 加密管理器
+            diary_path: 日记存储目录
+        """
+        self.crypto_manager = crypto_manager
+        self.diary_path = diary_path
+
+        # 确保日记存储目录存在
+        self._ensure_diary_directory_exists()
+
+    def _ensure_diary_directory_exists(self) -> None:
+        """确保日记存储目录存在，不存在则创建"""
+        if not os.path.exists(self.diary_path):
+            try:
+                os.makedirs(self.diary_path)
+                print(f"创建日记存储目录: {self.diary_path}")
+            except Exception as e:
+                print(f"创建日记目录失败: {e}")
+
+    def _get_diary_path_from_date(self, date_str: str) -> str:
+        """
+        根据日期字符串获取日记文件路径
+
+        Args:
+            date_str: 日期字符串，格式为 YYYY-MM-DD
+
+        Returns:
+            日记文件的完整路径
+        """
+        # 确保只取日期部分，不包含时间
+        date_str = date_str.split()[0]
+        return os.path.join(self.diary_path, f"{date_str}.enc")
+
+    def get_version(self, date_str: str) -> Hashable:
+        """
+        以文件的修改时间和大小作为版本标识，文件不存在时返回 None
+
+        Args:
+            date_str: 日期字符串，格式为 YYYY-MM-DD
+        """
+        try:
+            stat = os.stat(self._get_diary_path_from_date(date_str))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def save_diary(self, diary: Diary) -> bool:
+        """
+        保存日记到文件
+
+        Args:
+            diary: 日记条目对象
+
+        Returns:
+            保存成功返回True，否则返回False
+        """
+        try:
+            # 序列化和加密数据
+            serialized_data = pickle.dumps(diary.model_dump())
+            encrypted_data = self.crypto_manager.encrypt_data(serialized_data)
+
+            # 确定文件路径
+            file_path = self._get_diary_path_from_date(diary.date)
+
+            # 写入文件
+            with open(file_path, "wb") as f:
+                f.write(encrypted_data)
+
+            print(f"日记已保存: {file_path}")
+            return True
+        except Exception as e:
+            print(f"保存日记失败: {e}")
+            return False
+
+    def load_diary(self, date_str: str) -> Optional[Diary]:
+        """
+        加载指定日期的日记
+
+        Args:
+            date_str: 日期字符串，格式为 YYYY-MM-DD
+
+        Returns:
+            成功返回日记条目对象，失败返回 None
+        """
+        try:
+            file_path = self._get_diary_path_from_date(date_str)
+
+            if not os.path.exists(file_path):
+                print(f"日记文件不存在: {file_path}")
+                return None
+
+            with open(file_path, "rb") as f:
+                encrypted_data = f.read()
+
+            decrypted_data = self.crypto_manager.decrypt_data(encrypted_data)
+            diary_data = pickle.loads(decrypted_data)
+
+            # 懒迁移：旧版密文在读取时重新以保险库格式写回
+            if self.crypto_manager.needs_migration(encrypted_data):
+                self._migrate_diary_file(file_path, decrypted_data)
+
+            return Diary(**diary_data)
+        except Exception as e:
+            print(f"加载日记失败: {e}")
+            return None
+
+    def _migrate_diary_file(self, file_path: str, decrypted_data: bytes) -> None:
+        """
+        将旧版格式的日记文件重新加密为保险库格式
+
+        Args:
+            file_path: 日记文件路径
+            decrypted_data: 已解密的日记数据
+        """
+        try:
+            encrypted_data = self.crypto_manager.encrypt_data(decrypted_data)
+            # 先写临时文件再替换，迁移中途崩溃时原文件保持完整
+            write_file_atomic(file_path, encrypted_data)
+            print(f"日记已迁移为保险库格式: {file_path}")
+        except Exception as e:
+            print(f"迁移日记失败: {e}")
+
+    def get_all_dates(self) -> List[str]:
+        """
+        获取所有可用的日记日期列表
+
+        Returns:
+            日期字符串列表，按时间倒序排列
+        """
+        try:
+            if not os.path.exists(self.diary_path):
+                return []
+
+            files = [f for f in os.listdir(self.diary_path) if f.endswith(".enc")]
+            dates = [f.replace(".enc", "") for f in files]
+            return sorted(dates, reverse=True)
+        except Exception as e:
+            print(f"获取日记日期列表失败: {e}")
+            return []
+
+    def delete_diary(self, date_str: str) -> bool:
+        """
+        删除指定日期的日记
+
+        Args:
+            date_str: 要删除的日记日期
+
+        Returns:
+            删除成功返回True，否则返回False
+        """
+        try:
+            file_path = self._get_diary_path_from_date(date_str)
+
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                print(f"已删除日记: {date_str}")
+                return True
+            else:
+                print(f"要删除的日记不存在: {date_str}")
+                return False
+
+        except Exception as e:
+            print(f"删除日记失败: {e}")
+            return False
@@ -0,0 +1,71 @@
+import threading
+from typing import Dict, Optional, Tuple
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+
+class KeyRing:
+    """
+    进程内 RSA 密钥环
+
+    按公钥/私钥文件路径缓存已解析的密钥对象，使所有 CryptoManager 实例共享同一份密钥，
+    避免每次加解密都重新读取并解析 PEM 文件。密钥路径变化时自然未命中，
+    密钥重新生成或轮换时需调用 :meth:`invalidate`。
+    """
+
+    def __init__(self):
+        self._keys: Dict[
+            Tuple[str, str], Tuple[rsa.RSAPublicKey, rsa.RSAPrivateKey]
+        ] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self, key_paths: Tuple[str, str]
+    ) -> Optional[Tuple[rsa.RSAPublicKey, rsa.RSAPrivateKey]]:
+        """
+        获取缓存的密钥对。
+
+        Args:
+            key_paths (tuple): 公钥路径和私钥路径。
+
+        Returns:
+            tuple: 公钥对象和私钥对象，未缓存时返回 None。
+        """
+        with self._lock:
+            return self._keys.get(key_paths)
+
+    def put(
+        self,
+        key_paths: Tuple[str, str],
+        public_key: rsa.RSAPublicKey,
+        private_key: rsa.RSAPrivateKey,
+    ) -> None:
+        """
+        缓存密钥对。
+
+        Args:
+            key_paths (tuple): 公钥路径和私钥路径。
+            public_key: 公钥对象。
+            private_key: 私钥对象。
+        """
+        with self._lock:
+            self._keys[key_paths] = (public_key, private_key)
+
+    def invalidate(self, key_paths: Tuple[str, str]) -> None:
+        """
+        使指定路径的密钥对失效，下次访问时重新从磁盘加载。
+
+        Args:
+            key_paths (tuple): 公钥路径和私钥路径。
+        """
+        with self._lock:
+            self._keys.pop(key_paths, None)
+
+    def clear(self) -> None:
+        """清空所有缓存的密钥。"""
+        with self._lock:
+            self._keys.clear()
+
+
+# 进程级共享的密钥环
+key_ring = KeyRing()
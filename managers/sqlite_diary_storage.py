@@ -0,0 +1,298 @@
+import os
+import pickle
+import re
+import sqlite3
+import threading
+from typing import Optional, List, Dict, Any, Hashable
+
+from managers.crypto_manager import CryptoManager
+from managers.diary_storage import IDiaryStorage
+from models import Diary
+
+# 统计字数：每个中日韩字符算一个字，连续的字母数字算一个词
+_WORD_PATTERN = re.compile(
+    r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]|[A-Za-z0-9]+"
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS diaries (
+    date TEXT PRIMARY KEY,
+    content BLOB NOT NULL,
+    create_time BLOB,
+    update_time BLOB,
+    size BLOB,
+    word_count BLOB
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS diaries_create_time ON diaries (create_time);
+CREATE INDEX IF NOT EXISTS diaries_update_time ON diaries (update_time);
+CREATE INDEX IF NOT EXISTS diaries_size ON diaries (size);
+CREATE INDEX IF NOT EXISTS diaries_word_count ON diaries (word_count);
+"""
+
+_METADATA_COLUMNS = ("create_time", "update_time", "size", "word_count")
+
+
+def count_words(text: Optional[str]) -> int:
+    """统计日记字数"""
+    return len(_WORD_PATTERN.findall(text or ""))
+
+
+class SqliteDiaryStorage(IDiaryStorage):
+    """
+    基于 SQLite 的日记存储
+
+    所有日记保存在单个数据库中：日记内容为加密后的二进制块，日期为主键（带索引），
+    创建/更新时间、大小、字数等元数据按配置以明文或加密形式单独成列。
+    列出日期、范围查询都走主键索引，无需扫描目录；元数据列各有索引，
+    明文保存时可以按时间、大小、字数排序和筛选（加密保存时索引只是密文，不起作用）。
+    """
+
+    def __init__(
+        self,
+        crypto_manager: CryptoManager,
+        db_path: str,
+        plain_metadata: bool = True,
+    ):
+        """
+        初始化 SQLite 存储
+
+        Args:
+            crypto_manager: 加密管理器
+            db_path: 数据库文件路径
+            plain_metadata: 元数据列是否以明文保存，False 时元数据列同样加密
+        """
+        self.crypto_manager = crypto_manager
+        self.db_path = db_path
+        self.plain_metadata = plain_metadata
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    def _encode_metadata(self, value):
+        """按配置将元数据编码为明文或密文"""
+        if value is None or self.plain_metadata:
+            return value
+        return self.crypto_manager.encrypt_data(pickle.dumps(value))
+
+    def _decode_metadata(self, value):
+        """将元数据列的值解码为明文"""
+        if isinstance(value, bytes):
+            return pickle.loads(self.crypto_manager.decrypt_data(value))
+        return value
+
+    def save_diary(self, diary: Diary) -> bool:
+        """
+        保存日记到数据库
+
+        Args:
+            diary: 日记条目对象
+
+        Returns:
+            保存成功返回True，否则返回False
+        """
+        try:
+            date_str = diary.date.split()[0]
+            serialized_data = pickle.dumps(diary.model_dump())
+            encrypted_data = self.crypto_manager.encrypt_data(serialized_data)
+            content = diary.content or ""
+            metadata = (
+                diary.create_time,
+                diary.update_time,
+                len(content.encode("utf-8")),
+                count_words(content),
+            )
+
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO diaries "
+                    "(date, content, create_time, update_time, size, word_count) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (date_str, encrypted_data)
+                    + tuple(self._encode_metadata(value) for value in metadata),
+                )
+
+            print(f"日记已保存: {date_str}")
+            return True
+        except Exception as e:
+            print(f"保存日记失败: {e}")
+            return False
+
+    def load_diary(self, date_str: str) -> Optional[Diary]:
+        """
+        加载指定日期的日记
+
+        Args:
+            date_str: 日期字符串，格式为 YYYY-MM-DD
+
+        Returns:
+            成功返回日记条目对象，失败返回 None
+        """
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT content FROM diaries WHERE date = ?",
+                    (date_str.split()[0],),
+                ).fetchone()
+
+            if row is None:
+                print(f"日记不存在: {date_str}")
+                return None
+
+            decrypted_data = self.crypto_manager.decrypt_data(row[0])
+            return Diary(**pickle.loads(decrypted_data))
+        except Exception as e:
+            print(f"加载日记失败: {e}")
+            return None
+
+    def delete_diary(self, date_str: str) -> bool:
+        """
+        删除指定日期的日记
+
+        Args:
+            date_str: 要删除的日记日期
+
+        Returns:
+            删除成功返回True，否则返回False
+        """
+        try:
+            with self._lock, self._conn:
+                cursor = self._conn.execute(
+                    "DELETE FROM diaries WHERE date = ?", (date_str.split()[0],)
+                )
+
+            if cursor.rowcount:
+                print(f"已删除日记: {date_str}")
+                return True
+            print(f"要删除的日记不存在: {date_str}")
+            return False
+        except Exception as e:
+            print(f"删除日记失败: {e}")
+            return False
+
+    def get_all_dates(self) -> List[str]:
+        """
+        获取所有可用的日记日期列表
+
+        Returns:
+            日期字符串列表，按时间倒序排列
+        """
+        return self.get_dates_between()
+
+    def get_dates_between(
+        self, start: Optional[str] = None, end: Optional[str] = None
+    ) -> List[str]:
+        """
+        通过主键索引获取日期范围内（闭区间）的日记日期，按时间倒序排列
+
+        Args:
+            start: 起始日期 YYYY-MM-DD，为 None 表示不限
+            end: 结束日期 YYYY-MM-DD，为 None 表示不限
+        """
+        conditions, params = [], []
+        if start is not None:
+            conditions.append("date >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("date <= ?")
+            params.append(end)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        try:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT date FROM diaries{where} ORDER BY date DESC", params
+                ).fetchall()
+            return [row[0] for row in rows]
+        except Exception as e:
+            print(f"获取日记日期列表失败: {e}")
+            return []
+
+    def get_version(self, date_str: str) -> Hashable:
+        """
+        以数据库的 data_version 作为版本标识
+
+        本连接的写入由 DiaryManager 直接维护缓存，其他连接（如另一个进程）提交修改后
+        data_version 会变化，从而使所有缓存条目失效。
+
+        Args:
+            date_str: 日期字符串，格式为 YYYY-MM-DD
+        """
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def get_metadata(self, date_str: str) -> Optional[Dict[str, Any]]:
+        """
+        获取日记元数据（创建/更新时间、大小、字数），无需解密日记内容
+
+        Args:
+            date_str: 日期字符串，格式为 YYYY-MM-DD
+
+        Returns:
+            元数据字典，日记不存在时返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_METADATA_COLUMNS)} FROM diaries WHERE date = ?",
+                (date_str.split()[0],),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            column: self._decode_metadata(value)
+            for column, value in zip(_METADATA_COLUMNS, row)
+        }
+
+
+def migrate_to_sqlite(
+    source: IDiaryStorage, target: SqliteDiaryStorage, overwrite: bool = False
+) -> int:
+    """
+    将已有存储（如目录存储）中的日记迁移到 SQLite 存储
+
+    Args:
+        source: 源存储
+        target: 目标 SQLite 存储
+        overwrite: 目标中已存在同日期日记时是否覆盖
+
+    Returns:
+        成功迁移的日记数量
+    """
+    existing = set() if overwrite else set(target.get_all_dates())
+    migrated = 0
+    for date_str in source.get_all_dates():
+        if date_str in existing:
+            continue
+        diary = source.load_diary(date_str)
+        if diary and target.save_diary(diary):
+            migrated += 1
+    return migrated
+
+
+if __name__ == "__main__":
+    # 将配置中的日记目录迁移到配置中的 SQLite 数据库
+    from managers.config_manager import ConfigManager
+    from managers.diary_storage import FileDiaryStorage
+
+    config_manager = ConfigManager()
+    crypto_manager = CryptoManager()
+    source = FileDiaryStorage(
+        crypto_manager, config_manager.get_config_value("diary_path")
+    )
+    target = SqliteDiaryStorage(
+        crypto_manager,
+        config_manager.get_config_value("sqlite_path"),
+        config_manager.get_config_value("sqlite_plain_metadata", True),
+    )
+    count = migrate_to_sqlite(source, target)
+    target.close()
+    print(f"已迁移 {count} 篇日记到 {target.db_path}")
@@ -0,0 +1,290 @@
+import codecs
+import json
+import random
+import re
+import socket
+import struct
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Tuple
+
+# 长度前缀分帧：4 字节无符号大端整数
+_LENGTH = struct.Struct(">I")
+# 句末标点（中英文），其后紧跟的引号、括号归入同一句
+_SENTENCE_END = re.compile(r"[。！？!?；;…]+[”’」』）)\"']*")
+
+
+class TranscriptDecoder:
+    """
+    将字节流解码为转写片段
+
+    支持三种分帧方式：
+    - ``line``：每行一条消息（默认）
+    - ``length``：每条消息前有 4 字节大端长度前缀
+    - ``stream``：没有分帧的连续文本，收到多少解码多少
+
+    行和流模式使用增量 UTF-8 解码器，被拆到两次读取中的多字节字符不会被解坏。
+    每条消息可以是纯文本，也可以是 ``{"text": ..., "final": true/false}`` 形式的 JSON，
+    后者区分识别中的临时结果和最终结果。
+    """
+
+    def __init__(self, framing: str = "line"):
+        if framing not in ("line", "length", "stream"):
+            raise ValueError(f"不支持的分帧方式: {framing}")
+        self.framing = framing
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._text = ""  # 行模式下尚未遇到换行的文本
+        self._bytes = b""  # 长度前缀模式下尚未收齐的字节
+
+    def reset(self):
+        """丢弃未完成的数据，重新连接后调用"""
+        self._decoder.reset()
+        self._text = ""
+        self._bytes = b""
+
+    def feed(self, data: bytes) -> List[Tuple[str, Optional[bool]]]:
+        """
+        输入收到的字节
+
+        Returns:
+            (文本, 是否为最终结果) 列表，纯文本消息的第二项为 None
+        """
+        if self.framing == "stream":
+            text = self._decoder.decode(data)
+            return [(text, None)] if text else []
+
+        messages = []
+        if self.framing == "line":
+            self._text += self._decoder.decode(data)
+            *lines, self._text = self._text.split("\n")
+            messages = [line.rstrip("\r") for line in lines]
+        else:
+            self._bytes += data
+            while len(self._bytes) >= _LENGTH.size:
+                (length,) = _LENGTH.unpack_from(self._bytes)
+                if len(self._bytes) < _LENGTH.size + length:
+                    break
+                frame = self._bytes[_LENGTH.size : _LENGTH.size + length]
+                self._bytes = self._bytes[_LENGTH.size + length :]
+                messages.append(frame.decode("utf-8", errors="replace"))
+        return [self._parse(message) for message in messages if message.strip()]
+
+    @staticmethod
+    def _parse(message: str) -> Tuple[str, Optional[bool]]:
+        if message.lstrip().startswith("{"):
+            try:
+                payload = json.loads(message)
+            except json.JSONDecodeError:
+                return message, None
+            if isinstance(payload, dict) and "text" in payload:
+                final = payload.get("final", payload.get("is_final"))
+                return str(payload["text"]), None if final is None else bool(final)
+        return message, None
+
+
+class UtteranceAssembler:
+    """
+    将转写片段合并为完整的句子
+
+    - 临时结果（final 为 False）只替换当前未定稿的部分，不单独发出
+    - 最终结果（final 为 True）连同之前缓存的文本作为一句话发出
+    - 纯文本片段持续拼接，遇到句末标点时发出到最后一个句末标点为止的部分
+
+    超过 ``utterance_timeout`` 秒没有新片段时，缓存的文本也作为一句话发出。
+    匹配 ``ignore_patterns`` 中任一正则的句子被丢弃（如服务端的状态提示）。
+    """
+
+    def __init__(
+        self, utterance_timeout: float = 1.2, ignore_patterns: Iterable[str] = ()
+    ):
+        self.utterance_timeout = utterance_timeout
+        self.ignore_patterns = [re.compile(pattern) for pattern in ignore_patterns]
+        self._buffer = ""  # 已确定但尚未发出的文本
+        self._partial = ""  # 最新的临时结果
+        self._last_time = 0.0
+
+    def reset(self):
+        self._buffer = ""
+        self._partial = ""
+
+    def feed(self, text: str, final: Optional[bool], now: float) -> List[str]:
+        """
+        输入一个片段
+
+        Returns:
+            合并完成的句子列表
+        """
+        self._last_time = now
+        if final is False:
+            self._partial = text
+            return []
+        if final:
+            self._buffer += text
+            self._partial = ""
+            return self._emit(len(self._buffer))
+
+        self._buffer += text
+        ends = list(_SENTENCE_END.finditer(self._buffer))
+        return self._emit(ends[-1].end()) if ends else []
+
+    def poll(self, now: float) -> List[str]:
+        """超时后发出缓存的文本（包括临时结果）"""
+        if not (self._buffer or self._partial):
+            return []
+        if now - self._last_time < self.utterance_timeout:
+            return []
+        self._buffer += self._partial
+        self._partial = ""
+        return self._emit(len(self._buffer))
+
+    def _emit(self, end: int) -> List[str]:
+        utterance = self._buffer[:end].strip()
+        self._buffer = self._buffer[end:]
+        if not utterance:
+            return []
+        if any(pattern.search(utterance) for pattern in self.ignore_patterns):
+            print(f"忽略转写消息: {utterance}")
+            return []
+        return [utterance]
+
+
+class TranscriptionClient:
+    """
+    语音转写客户端
+
+    连接转写服务，按分帧方式解码消息并合并为完整的句子后回调 ``on_utterance``。
+    连接失败或断开后按指数退避重连。回调一句话后进入忙碌状态（对应一次 LLM 请求），
+    调用方处理完毕后调用 ``set_busy(False)``，没有发起请求（如忽略了这句话）时也要调用；
+    忙碌期间合并完成的句子暂存起来，空闲后合并为一条消息再回调，不会同时触发多个请求。
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 5000,
+        on_utterance: Optional[Callable[[str], None]] = None,
+        framing: str = "line",
+        utterance_timeout: float = 1.2,
+        ignore_patterns: Iterable[str] = (),
+        reconnect_delay: float = 1.0,
+        max_reconnect_delay: float = 30.0,
+        max_pending_chars: int = 2000,
+        poll_interval: float = 0.2,
+    ):
+        """
+        初始化转写客户端
+
+        Args:
+            host: 转写服务地址
+            port: 转写服务端口
+            on_utterance: 回调函数 on_utterance(text)，在客户端线程中调用
+            framing: 分帧方式，line、length 或 stream
+            utterance_timeout: 多少秒没有新片段时视为一句话结束
+            ignore_patterns: 需要丢弃的句子的正则表达式
+            reconnect_delay: 第一次重连前的等待时间（秒），之后每次翻倍
+            max_reconnect_delay: 重连等待时间的上限（秒）
+            max_pending_chars: 忙碌期间最多暂存的字符数，超出时丢弃最早的内容
+            poll_interval: 读取超时时间（秒），决定检查超时和停止请求的频率
+        """
+        self.host = host
+        self.port = port
+        self.on_utterance = on_utterance
+        self.decoder = TranscriptDecoder(framing)
+        self.assembler = UtteranceAssembler(utterance_timeout, ignore_patterns)
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.max_pending_chars = max_pending_chars
+        self.poll_interval = poll_interval
+        self.connected = threading.Event()
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._busy = False
+        self._enabled = True
+        self._pending: List[str] = []
+
+    def stop(self):
+        """停止客户端，run 将在 poll_interval 内返回"""
+        self._stop_event.set()
+
+    def set_enabled(self, enabled: bool):
+        """关闭时收到的句子直接丢弃，如非语音模式下；关闭时同时解除忙碌状态"""
+        with self._lock:
+            self._enabled = enabled
+            if not enabled:
+                self._pending.clear()
+                self._busy = False
+
+    def set_busy(self, busy: bool):
+        """设置是否有请求正在进行，空闲后暂存的句子在下次轮询时发出"""
+        with self._lock:
+            self._busy = busy
+
+    def run(self):
+        """连接并持续接收，直到调用 stop；应在后台线程中运行"""
+        attempt = 0
+        while not self._stop_event.is_set():
+            try:
+                with socket.create_connection(
+                    (self.host, self.port), timeout=self.poll_interval * 5
+                ) as sock:
+                    print(f"已连接转写服务 {self.host}:{self.port}")
+                    attempt = 0
+                    self.connected.set()
+                    self._receive(sock)
+                    print("转写服务已断开连接")
+            except OSError as e:
+                print(f"转写服务连接失败: {e}")
+            finally:
+                self.connected.clear()
+                self.decoder.reset()
+                for utterance in self.assembler.poll(float("inf")):
+                    self._deliver(utterance)
+
+            if self._stop_event.is_set():
+                break
+            delay = min(self.reconnect_delay * 2**attempt, self.max_reconnect_delay)
+            delay *= random.uniform(0.5, 1.0)  # 抖动，避免多个客户端同时重连
+            attempt += 1
+            self._stop_event.wait(delay)
+
+    def _receive(self, sock: socket.socket):
+        sock.settimeout(self.poll_interval)
+        while not self._stop_event.is_set():
+            try:
+                data = sock.recv(4096)
+            except socket.timeout:
+                data = None
+            now = time.monotonic()
+            if data == b"":
+                return
+            utterances = []
+            if data:
+                for text, final in self.decoder.feed(data):
+                    utterances.extend(self.assembler.feed(text, final, now))
+            utterances.extend(self.assembler.poll(now))
+            for utterance in utterances:
+                self._deliver(utterance)
+            self._flush_pending()
+
+    def _deliver(self, utterance: str):
+        with self._lock:
+            if not self._enabled:
+                return
+            self._pending.append(utterance)
+            # 暂存过多时丢弃最早的句子，至少保留最新的一句
+            while (
+                len(self._pending) > 1
+                and sum(map(len, self._pending)) > self.max_pending_chars
+            ):
+                self._pending.pop(0)
+        self._flush_pending()
+
+    def _flush_pending(self):
+        with self._lock:
+            if self._busy or not self._pending:
+                return
+            message = "".join(self._pending)
+            self._pending.clear()
+            self._busy = True
+        if self.on_utterance is not None:
+            self.on_utterance(message)
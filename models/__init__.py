@@ -1,7 +1,9 @@
 from .diary import Diary
 from .config import Config
+from .diary_filter import DiaryFilter
 
 __all__ = [
     "Diary",
     "Config",
+    "DiaryFilter",
 ]
@@ -1,3 +1,5 @@
+from typing import List, Literal
+
 from pydantic import BaseModel  # 新增
 
 
@@ -5,3 +7,47 @@ class Config(BaseModel):  # 新增
     key_path: str = "./data/keys/"
     password: str = ""
     diary_path: str = "./data/diary/"
+    vault_mode: bool = True  # 保险库模式：数据密钥 + AES-GCM 加密日记
+    storage_backend: Literal["file", "sqlite"] = "file"  # 日记存储后端
+    sqlite_path: str = "./data/diary.db"
+    sqlite_plain_metadata: bool = True  # SQLite 元数据列是否明文保存
+    diary_cache_size: int = 64  # 已解密日记缓存的最大条目数，0 表示禁用
+    diary_cache_max_bytes: int = 8 * 1024 * 1024  # 已解密日记缓存的内存预算
+    diary_cache_idle_timeout: int = 300  # 空闲多少秒后清空缓存，0 表示不清空
+    diary_load_workers: int = 4  # 批量加载日记时的解密线程数
+    rag_index_path: str = "./data/rag/index.enc"  # 加密保存的检索索引
+    rag_index_debounce: float = 2.0  # 日记变更后等待多少秒再增量更新索引
+    rag_chunk_size: int = 300  # 日记切分为检索段落时每段的最大字符数
+    rag_chunk_overlap: int = 80  # 相邻段落最多重叠的字符数
+    embedding_backend: Literal["openai", "hashing"] = "openai"  # hashing 为本地离线嵌入
+    hashing_embedding_dim: int = 1024  # 本地哈希嵌入的向量维度
+    embedding_cache_path: str = "./data/rag/embeddings.db"  # 加密的嵌入向量缓存
+    embedding_cache_size: int = 50000  # 嵌入缓存最多保存的向量条数
+    llm_cache_enabled: bool = False  # 是否缓存确定性 LLM 调用的回答
+    llm_cache_path: str = "./data/rag/llm_cache.db"  # 加密的 LLM 回答缓存
+    llm_cache_ttl: int = 7 * 24 * 3600  # 回答缓存的有效期（秒），0 表示永不过期
+    llm_cache_size: int = 1000  # 回答缓存最多保存的条数
+    llm_cache_methods: List[str] = ["qa_context_predict", "diary_generate_predict"]
+    chat_prompt_max_tokens: int = 3000  # 聊天提示词的 token 预算
+    chat_log_dir: str = "./data/chat/"  # 加密的聊天记录目录，每个会话一个文件
+    chat_resume_session: bool = True  # 启动时续接最近的会话，否则新建会话
+    chat_history_size: int = 50  # 内存中保留的最近消息条数
+    chat_page_size: int = 30  # 向上滚动时每次加载的历史消息条数
+    chat_max_visible_messages: int = 10000  # 聊天列表中最多保留的消息条数
+    transcription_host: str = "127.0.0.1"  # 语音转写服务地址
+    transcription_port: int = 5000
+    transcription_framing: Literal["line", "length", "stream"] = (
+        "line"  # 转写消息的分帧方式
+    )
+    transcription_utterance_timeout: float = 1.2  # 多少秒没有新片段时视为一句话结束
+    transcription_ignore_patterns: List[str] = ["转写", "林黛玉"]  # 丢弃匹配的转写消息
+    preview_debounce_ms: int = 300  # 停止输入多少毫秒后刷新 Markdown 预览
+    autosave_enabled: bool = True  # 编辑后自动保存日记
+    autosave_debounce: float = 2.0  # 最后一次编辑后等待多少秒再保存
+    autosave_batch_ms: int = 500  # 编辑合并为一批写入崩溃日志的间隔（毫秒）
+    autosave_journal_dir: str = "./data/journal/"  # 加密的崩溃日志目录
+    export_backend: Literal["webengine", "pillow"] = (
+        "webengine"  # 导出图片/PDF 的渲染方式
+    )
+    export_width: int = 800  # 导出图片的宽度
+    export_warm_up: bool = False  # 启动时预先创建离屏渲染器
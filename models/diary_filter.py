@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+
+class DiaryFilter(BaseModel):
+    """检索时按日记元数据预过滤的条件，未设置的条件不参与过滤"""
+
+    start_date: Optional[str] = None  # 起始日期 YYYY-MM-DD（含）
+    end_date: Optional[str] = None  # 结束日期 YYYY-MM-DD（含）
+    weekdays: Optional[List[int]] = None  # 星期几，0 为周一，6 为周日
+    weather: Optional[List[str]] = None  # 天气关键词，包含任一关键词即匹配，如 "晴"
+    has_note: Optional[bool] = None  # 是否有备注
+
+    def is_empty(self) -> bool:
+        """是否没有设置任何过滤条件"""
+        return all(value is None for value in self.model_dump().values())
@@ -1,11 +1,26 @@
 from .llm_chat_with_history import LlmChatWithHistory
 from .llm_generator import LLMGenerator
 from .rag_pipeline import RagPipeline
-from .rag_retriever import RagRetriever
+from .rag_retriever import RagRetriever, RetrievalHit, create_embedding_model
+from .rag_indexer import RagIndexer
+from .embedding_cache import CachedEmbeddings
+from .hashing_embeddings import HashingEmbeddings
+from .diary_chunker import DiaryChunker
+from .llm_response_cache import LlmResponseCache
+from .prompt_packer import PromptPacker, PackedPrompt
 
 __all__ = [
     "LLMGenerator",
     "RagRetriever",
+    "RetrievalHit",
+    "RagIndexer",
+    "CachedEmbeddings",
+    "HashingEmbeddings",
+    "DiaryChunker",
+    "LlmResponseCache",
+    "PromptPacker",
+    "PackedPrompt",
+    "create_embedding_model",
     "RagPipeline",
     "LlmChatWithHistory",
 ]
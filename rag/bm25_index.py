@@ -0,0 +1,156 @@
+import re
+from collections import Counter
+
+import numpy as np
+
+# 连续的中日韩汉字，或连续的字母数字
+_TOKEN_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[a-z0-9]+")
+
+
+def tokenize(text):
+    """
+    CJK 友好的分词：汉字切分为单字和相邻二字组，字母数字按整词切分并转为小写。
+    不依赖分词词典，人名地名（如“张总”“王阿姨”）总能以二字组精确命中。
+    """
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(text.lower()):
+        if run[0].isascii():
+            tokens.append(run)
+            continue
+        tokens.extend(run)
+        tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25Index:
+    """
+    内存中的 BM25 倒排索引
+
+    支持按文档 ID 增量添加和删除。每个词的倒排表在查询时按需转为 NumPy 数组并缓存，
+    打分只遍历查询词的倒排表，不扫描全部文档，可作为向量检索前的第一阶段过滤。
+    本类不是线程安全的，由调用方加锁。
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        """
+        初始化索引。
+        :param k1: 词频饱和参数。
+        :param b: 文档长度归一化参数。
+        """
+        self.k1 = k1
+        self.b = b
+        self._slots = {}  # 文档 ID -> 槽位
+        self._doc_ids = []  # 槽位 -> 文档 ID，空槽位为 None
+        self._free_slots = []
+        self._doc_terms = {}  # 槽位 -> 词频 Counter，删除文档时使用
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._total_length = 0
+        self._postings = {}  # 词 -> {槽位: 词频}
+        self._arrays = {}  # 词 -> (槽位数组, 词频数组)，倒排表的只读缓存
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._slots
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_arrays"] = {}
+        return state
+
+    def add(self, doc_id, text):
+        """
+        添加文档，已存在的同 ID 文档会被替换。
+        """
+        if doc_id in self._slots:
+            self.remove(doc_id)
+
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._doc_ids[slot] = doc_id
+        else:
+            slot = len(self._doc_ids)
+            self._doc_ids.append(doc_id)
+            if slot >= len(self._lengths):
+                self._lengths = np.resize(self._lengths, max(16, slot * 2))
+        self._slots[doc_id] = slot
+
+        terms = Counter(tokenize(text))
+        length = sum(terms.values())
+        self._doc_terms[slot] = terms
+        self._lengths[slot] = length
+        self._total_length += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[slot] = tf
+            self._arrays.pop(term, None)
+
+    def remove(self, doc_id):
+        """
+        删除文档，不存在时忽略。
+        """
+        slot = self._slots.pop(doc_id, None)
+        if slot is None:
+            return
+        terms = self._doc_terms.pop(slot)
+        for term in terms:
+            postings = self._postings[term]
+            del postings[slot]
+            if not postings:
+                del self._postings[term]
+            self._arrays.pop(term, None)
+        self._total_length -= int(self._lengths[slot])
+        self._lengths[slot] = 0
+        self._doc_ids[slot] = None
+        self._free_slots.append(slot)
+
+    def _posting_arrays(self, term):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings[term]
+            arrays = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings)),
+            )
+            self._arrays[term] = arrays
+        return arrays
+
+    def search(self, query, k=None, doc_ids=None):
+        """
+        检索与查询词汇重合的文档。
+        :param query: 查询文本。
+        :param k: 返回的文档数量，为 None 时返回所有得分为正的文档。
+        :param doc_ids: 只在这些文档中检索，为 None 时检索全部文档。
+        :return: 按得分降序排列的 (文档 ID, 得分) 列表。
+        """
+        count = len(self._slots)
+        terms = [term for term in set(tokenize(query)) if term in self._postings]
+        if not count or not terms:
+            return []
+
+        avg_length = self._total_length / count
+        norms = self.k1 * (
+            1 - self.b + self.b * self._lengths[: len(self._doc_ids)] / avg_length
+        )
+        scores = np.zeros(len(self._doc_ids), dtype=np.float32)
+        mask = None
+        if doc_ids is not None:
+            # 只为候选打分：倒排表中的非候选槽位被跳过
+            selected = [self._slots[d] for d in doc_ids if d in self._slots]
+            mask = np.zeros(len(self._doc_ids), dtype=bool)
+            mask[selected] = True
+        for term in terms:
+            slots, tfs = self._posting_arrays(term)
+            if mask is not None:
+                selected = mask[slots]
+                slots, tfs = slots[selected], tfs[selected]
+            df = len(self._postings[term])
+            idf = np.log1p((count - df + 0.5) / (df + 0.5))
+            scores[slots] += idf * tfs * (self.k1 + 1) / (tfs + norms[slots])
+
+        candidates = np.flatnonzero(scores > 0)
+        if k is not None and len(candidates) > k:
+            top = np.argpartition(-scores[candidates], k - 1)[:k]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self._doc_ids[slot], float(scores[slot])) for slot in candidates]
@@ -0,0 +1,120 @@
+import re
+
+from langchain_core.documents import Document
+
+# 中文句末标点及其后可能紧跟的引号、括号
+_CJK_ENDINGS = "。！？；…”’」』）"
+# 按句末标点（中英文）或换行切分，标点后紧跟的引号、括号归入同一句
+_SENTENCE_END = re.compile(
+    r"[^。！？!?；;…\n]*(?:[。！？!?；;…]+[”’」』）)\"']*|\n+|$)"
+)
+
+
+def _join(sentences):
+    """
+    拼接句子：中文句子直接相连，英文句子之间加空格，
+    没有句末标点的行（如标题）后保留换行。
+    """
+    parts = []
+    for sentence in sentences:
+        if sentence[-1] in _CJK_ENDINGS:
+            parts.append(sentence)
+        elif sentence[-1] in "!?;.)\"'":
+            parts.append(sentence + " ")
+        else:
+            parts.append(sentence + "\n")
+    return "".join(parts).rstrip()
+
+
+def split_sentences(text):
+    """
+    按中英文句末标点和换行切分句子，保留标点，去掉空白句。
+    """
+    return [s.strip() for s in _SENTENCE_END.findall(text) if s.strip()]
+
+
+class DiaryChunker:
+    """
+    日记分段器
+
+    将日记正文按句子切分，再把相邻句子拼成不超过 ``max_chars`` 个字符的段落，
+    相邻段落重叠末尾的若干句，避免答案恰好落在段落边界上。每个段落带有日期和天气元数据，
+    并以“日期 天气”开头，检索结果直接放入提示词时模型也能知道段落出自哪天。
+    创建/修改时间与内容无关，不参与索引。实例可直接作为 RagIndexer 的 ``document_builder``。
+    """
+
+    def __init__(self, max_chars=300, overlap_chars=80):
+        """
+        初始化分段器。
+        :param max_chars: 每个段落正文的最大字符数。
+        :param overlap_chars: 相邻段落最多重叠的字符数，必须小于 max_chars。
+        """
+        if not 0 <= overlap_chars < max_chars:
+            raise ValueError(
+                f"overlap_chars 必须满足 0 <= overlap_chars < max_chars，"
+                f"当前为 {overlap_chars}，max_chars 为 {max_chars}"
+            )
+        self.max_chars = max_chars
+        self.overlap_chars = overlap_chars
+
+    def split_text(self, text):
+        """
+        将文本切分为有重叠的段落列表。
+        """
+        sentences = []
+        for sentence in split_sentences(text or ""):
+            # 超长的句子按字符硬切分
+            step = self.max_chars - self.overlap_chars
+            while len(sentence) > self.max_chars:
+                sentences.append(sentence[: self.max_chars])
+                sentence = sentence[step:]
+            sentences.append(sentence)
+
+        passages = []
+        current = []
+        length = 0
+        for sentence in sentences:
+            if current and length + len(sentence) > self.max_chars:
+                passages.append(_join(current))
+                # 从上一段末尾取不超过 overlap_chars 的整句作为重叠部分
+                overlap = []
+                overlap_length = 0
+                for previous in reversed(current):
+                    if overlap_length + len(previous) > self.overlap_chars:
+                        break
+                    overlap.insert(0, previous)
+                    overlap_length += len(previous)
+                if overlap_length + len(sentence) > self.max_chars:
+                    overlap, overlap_length = [], 0
+                current, length = overlap, overlap_length
+            current.append(sentence)
+            length += len(sentence)
+        if current:
+            passages.append(_join(current))
+        return passages
+
+    def __call__(self, diary):
+        """
+        将日记切分为带元数据的段落文档。
+        :param diary: 日记对象。
+        :return: Document 列表，metadata 包含 source（日记 ID）、date、weather、has_note 和 chunk 序号。
+        """
+        date = (diary.date or "").split()[0]
+        header = " ".join(part for part in (date, diary.weather) if part)
+        passages = self.split_text(diary.content)
+        if diary.note:
+            passages.append(f"备注：{diary.note}")
+
+        return [
+            Document(
+                page_content=f"{header}\n{passage}" if header else passage,
+                metadata={
+                    "source": date,
+                    "date": date,
+                    "weather": diary.weather,
+                    "has_note": bool(diary.note),
+                    "chunk": i,
+                },
+            )
+            for i, passage in enumerate(passages)
+        ]
@@ -0,0 +1,180 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# SQLite 单条语句的参数个数上限较低，批量查询时分段
+_SQLITE_BATCH = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    带内容哈希缓存的嵌入模型包装器
+
+    可包装任意 LangChain ``Embeddings``。以“模型名 + 用途 + 文本哈希”为键，
+    将向量以 float32 二进制保存在 SQLite 中（可选用 CryptoManager 加密），
+    条目数超过上限时淘汰最久未使用的向量。相同文本不会被重复嵌入。
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache_path=":memory:",
+        max_entries=50000,
+        crypto_manager=None,
+    ):
+        """
+        初始化嵌入缓存。
+        :param embeddings: 被包装的嵌入模型。
+        :param cache_path: SQLite 缓存文件路径，默认只缓存在内存中。
+        :param max_entries: 最多缓存的向量条数。
+        :param crypto_manager: 用于加密向量的 CryptoManager，为 None 时明文保存。
+        """
+        self.embeddings = embeddings
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.crypto_manager = crypto_manager
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if cache_path != ":memory:":
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used "
+                "ON embeddings(last_used)"
+            )
+
+    @property
+    def model(self):
+        """被包装模型的名称，供检索器识别嵌入模型是否变化。"""
+        return getattr(self.embeddings, "model", None) or type(self.embeddings).__name__
+
+    def _key(self, kind, text):
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model}:{kind}:{digest}"
+
+    def _encode(self, vector):
+        data = np.asarray(vector, dtype=np.float32).tobytes()
+        if self.crypto_manager is not None:
+            data = self.crypto_manager.encrypt_data(data)
+        return data
+
+    def _decode(self, data):
+        if self.crypto_manager is not None:
+            data = self.crypto_manager.decrypt_data(data)
+        return np.frombuffer(data, dtype=np.float32).tolist()
+
+    def _lookup(self, keys):
+        """批量查询缓存并刷新命中条目的使用时间。"""
+        found = {}
+        now = time.time()
+        with self._lock, self._conn:
+            for i in range(0, len(keys), _SQLITE_BATCH):
+                batch = keys[i : i + _SQLITE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                found.update(rows)
+                self._conn.execute(
+                    f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})",
+                    [now, *batch],
+                )
+        return {key: self._decode(data) for key, data in found.items()}
+
+    def _store(self, items):
+        """写入新向量，超过上限时淘汰最久未使用的条目。"""
+        now = time.time()
+        rows = [(key, self._encode(vector), now) for key, vector in items]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) "
+                "VALUES (?, ?, ?)",
+                rows,
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    "SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def _embed_cached(self, kind, texts, embed):
+        keys = [self._key(kind, text) for text in texts]
+        cached = self._lookup(list(dict.fromkeys(keys)))
+
+        # 同一批次中的重复文本只嵌入一次
+        missing = {key: text for key, text in zip(keys, texts) if key not in cached}
+        if missing:
+            # 统一为 float32 精度，保证命中与未命中时返回的向量一致
+            vectors = [
+                np.asarray(vector, dtype=np.float32).tolist()
+                for vector in embed(list(missing.values()))
+            ]
+            new_items = list(zip(missing, vectors))
+            self._store(new_items)
+            cached.update(new_items)
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+        return [list(cached[key]) for key in keys]
+
+    def embed_documents(self, texts):
+        """
+        嵌入文档列表，只对未缓存的文本调用底层模型，且合并为一次调用。
+        """
+        return self._embed_cached("doc", list(texts), self.embeddings.embed_documents)
+
+    def embed_query(self, text):
+        """
+        嵌入查询文本，重复的查询直接命中缓存。
+        """
+        return self._embed_cached(
+            "query", [text], lambda texts: [self.embeddings.embed_query(texts[0])]
+        )[0]
+
+    def embed_queries(self, texts):
+        """
+        批量嵌入查询文本。未命中的查询优先交给底层模型的 ``embed_queries`` 一次嵌入，
+        模型不支持时逐条调用 ``embed_query``。
+        """
+        embed = getattr(self.embeddings, "embed_queries", None) or (
+            lambda texts: [self.embeddings.embed_query(text) for text in texts]
+        )
+        return self._embed_cached("query", list(texts), embed)
+
+    def stats(self):
+        """
+        获取缓存统计信息。
+        :return: 包含命中数、未命中数、命中率和缓存条数的字典。
+        """
+        with self._lock:
+            (entries,) = self._conn.execute(
+                "SELECT COUNT(*) FROM embeddings"
+            ).fetchone()
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries,
+            }
+
+    def close(self):
+        """关闭缓存数据库连接。"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,117 @@
+import re
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# 多项式滚动哈希与混合用的 64 位常数（uint64 运算自然溢出回绕）
+_PRIME = np.uint64(0x100000001B3)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_SEED = np.uint64(0xCBF29CE484222325)
+
+# 标点和空白统一替换为单个空格；中文字符属于 \w，会被保留
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    本地离线嵌入模型：字符 n-gram + 哈希技巧
+
+    文本按字符切分为 n-gram（中文无需分词），每个 n-gram 用 NumPy 向量化的
+    滚动哈希映射到固定维度，词频取 log1p 后做 L2 归一化。模型无状态、结果确定，
+    不需要网络，适合离线使用、CI 测试和延迟基准；同一文本任何时候得到的向量都相同，
+    因此可与持久化索引和嵌入缓存配合使用。
+    """
+
+    def __init__(self, dim=1024, ngram_range=(1, 2), batch_size=256):
+        """
+        初始化哈希嵌入模型。
+        :param dim: 向量维度。
+        :param ngram_range: 字符 n-gram 的最小和最大长度。
+        :param batch_size: 每批同时向量化的文本数量。
+        """
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.batch_size = batch_size
+
+    @property
+    def model(self):
+        """模型标识，参数变化时已保存的向量不再可用。"""
+        low, high = self.ngram_range
+        return f"hashing-{self.dim}-{low}-{high}"
+
+    def _bucket_ids(self, text):
+        """
+        计算文本所有字符 n-gram 落入的哈希桶编号。
+        """
+        text = _NON_WORD.sub(" ", text.lower()).strip()
+        codepoints = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+        codepoints = codepoints.astype(np.uint64)
+
+        buckets = []
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            count = len(codepoints) - n + 1
+            if count <= 0:
+                continue
+            hashes = np.full(count, _SEED + np.uint64(n), dtype=np.uint64)
+            for offset in range(n):
+                hashes = hashes * _PRIME + codepoints[offset : offset + count]
+            # 混合高低位，使取模后的分布更均匀
+            hashes ^= hashes >> np.uint64(29)
+            hashes *= _MIX
+            hashes ^= hashes >> np.uint64(32)
+            buckets.append((hashes % np.uint64(self.dim)).astype(np.int64))
+
+        if not buckets:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(buckets)
+
+    def _embed_batch(self, texts):
+        """
+        将一批文本向量化：所有文本的哈希桶拼接后一次 bincount 得到词频矩阵。
+        """
+        bucket_ids = [self._bucket_ids(text) for text in texts]
+        offsets = np.repeat(
+            np.arange(len(texts), dtype=np.int64) * self.dim,
+            [len(ids) for ids in bucket_ids],
+        )
+        counts = np.bincount(
+            np.concatenate(bucket_ids) + offsets, minlength=len(texts) * self.dim
+        ).reshape(len(texts), self.dim)
+
+        vectors = np.log1p(counts, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+    def embed_array(self, texts):
+        """
+        批量嵌入文本，返回 float32 矩阵，形状为 (len(texts), dim)。
+        """
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack(
+            [
+                self._embed_batch(texts[i : i + self.batch_size])
+                for i in range(0, len(texts), self.batch_size)
+            ]
+        )
+
+    def embed_documents(self, texts):
+        """
+        嵌入文档列表。
+        """
+        return self.embed_array(texts).tolist()
+
+    def embed_queries(self, texts):
+        """
+        批量嵌入查询文本，与逐条调用 embed_query 的结果相同。
+        """
+        return self.embed_array(texts).tolist()
+
+    def embed_query(self, text):
+        """
+        嵌入查询文本。
+        """
+        return self.embed_array([text])[0].tolist()
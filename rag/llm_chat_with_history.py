@@ -1,5 +1,11 @@
+import threading
+import time
+from collections import deque
+from itertools import islice
+
 from rag.llm_generator import LLMGenerator
-from prompts import CHAT_SYSTEM_PROMPT, CHAT_SUMMARIZATION_PROMPT
+from rag.prompt_packer import PromptPacker
+from prompts import CHAT_SUMMARIZATION_PROMPT
 from dotenv import load_dotenv
 
 load_dotenv(".env/.env")
@@ -10,23 +16,68 @@ class LlmChatWithHistory:
     聊天管理类，封装聊天逻辑、历史管理和自动摘要功能。
     """
 
-    def __init__(self, llm_generator: LLMGenerator, summary_interval=10):
+    def __init__(
+        self,
+        llm_generator: LLMGenerator,
+        summary_interval=10,
+        prompt_packer: PromptPacker = None,
+        chat_log=None,
+        max_history=50,
+    ):
+        """
+        :param chat_log: ChatLog 实例，传入时消息和摘要写入加密的聊天记录文件，
+            并从中恢复最近的消息和摘要。
+        :param max_history: 内存中保留的最近消息条数，更早的消息只保存在 chat_log 中。
+        """
         self.llm_generator = llm_generator
-        self.chat_history = []  # 无限增长的聊天记录列表
-        self.summaries = []  # 存储摘要的列表
+        # 按 token 预算组装提示词，默认预算 3000
+        self.prompt_packer = prompt_packer or PromptPacker()
+        self.last_prompt_usage = {}  # 最近一次提示词各部分的 token 数
+        self.chat_log = chat_log
+        self.chat_history = deque(maxlen=max_history)  # 最近消息的环形缓冲区
+        self.summaries = deque(maxlen=1)  # 只保留最新的一条摘要
+        self.message_count = 0  # 累计的消息条数，包括已移出缓冲区的消息
+        # 保护 chat_history、message_count 和 chat_log 的写入，可重入以便一轮对话的两条消息一起写入
+        self._history_lock = threading.RLock()
         self.summary_interval = summary_interval  # 每隔多少条消息触发一次摘要
+        if chat_log is not None:
+            # 无法解密的消息只是占位，不放进提示词
+            self.chat_history.extend(
+                m for m in chat_log.recent(max_history) if not m.get("corrupted")
+            )
+            self.message_count = len(chat_log)
+            summary = chat_log.load_summary()
+            if summary is not None:
+                self.summaries.append({"role": "summary", "content": summary})
+        self._summarized_upto = self.message_count  # 已发起摘要时的消息条数
+        self._summary_thread = None  # 正在后台生成摘要的线程
+        self._summary_lock = threading.Lock()
+
+    def _add_message(self, role, message):
+        """
+        添加消息到内存缓冲区，并写入 chat_log。
+        :return: 消息在 chat_log 中的序号，没有 chat_log 时返回 None。
+        """
+        with self._history_lock:
+            self.chat_history.append({"role": role, "content": message})
+            self.message_count += 1
+            if self.chat_log is not None:
+                return self.chat_log.append(role, message)
+            return None
 
     def add_user_message(self, message):
-        self.chat_history.append({"role": "user", "content": message})
+        return self._add_message("user", message)
 
     def add_ai_message(self, message):
-        self.chat_history.append({"role": "ai", "content": message})
+        return self._add_message("ai", message)
 
     def get_recent_messages(self, count=10):
         """
         获取最近的 count 条消息。
         """
-        return self.chat_history[-count:]
+        with self._history_lock:
+            start = max(0, len(self.chat_history) - count)
+            return list(islice(self.chat_history, start, None))
 
     def get_last_summary(self):
         """
@@ -36,48 +87,119 @@ class LlmChatWithHistory:
 
     def _summarize_recent_messages(self):
         """
-        摘要最近的 summary_interval 条消息。
+        自上次摘要以来新增的消息达到 summary_interval 条时，在后台线程中摘要最近的消息。
+        上一次摘要仍在生成时跳过本次，不阻塞当前对话。
         """
-        if (
-            len(self.chat_history) % self.summary_interval == 0
-            and len(self.chat_history) > 0
-        ):
+        with self._summary_lock:
+            if self.message_count - self._summarized_upto < self.summary_interval:
+                return
+            if self._summary_thread is not None and self._summary_thread.is_alive():
+                return
+            self._summarized_upto = self.message_count
             # 获取最近的 summary_interval 条消息
             recent_messages = self.get_recent_messages(self.summary_interval)
-            # 格式化摘要提示
-            prompt = CHAT_SUMMARIZATION_PROMPT.format(chat_history=recent_messages)
+            self._summary_thread = threading.Thread(
+                target=self._summarize, args=(recent_messages,), daemon=True
+            )
+            self._summary_thread.start()
+
+    def _summarize(self, messages):
+        """
+        生成摘要并存入 summaries，失败时只打印错误，下一个间隔再重试。
+        """
+        # 格式化摘要提示
+        prompt = CHAT_SUMMARIZATION_PROMPT.format(chat_history=messages)
+        try:
             # 调用 LLM 生成摘要
             summary_message = self.llm_generator.prompt_predict(prompt)
-            # 将摘要存储到 summaries 列表中
-            self.summaries.append({"role": "summary", "content": summary_message})
-
-    def process_input(self, input, diary_content="", context=""):
+        except Exception as e:
+            print(f"生成聊天摘要失败: {e}")
+            return
+        # 将摘要存储到 summaries 列表中
+        self.summaries.append({"role": "summary", "content": summary_message})
+        if self.chat_log is not None:
+            self.chat_log.save_summary(summary_message)
+
+    def wait_for_summary(self, timeout=None):
+        """
+        等待正在后台生成的摘要完成。
+        :return: 没有摘要在生成或已完成时返回 True，超时返回 False。
+        """
+        thread = self._summary_thread
+        if thread is None:
+            return True
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def process_input(
+        self,
+        input,
+        diary_content="",
+        context="",
+        cancel_event=None,
+        timings=None,
+        on_delta=None,
+        recorded=None,
+    ):
         """
         处理用户输入，返回 AI 响应。
+        :param context: 检索到的日记段落，可以是按相关度降序的段落列表或已拼接的字符串。
+        :param cancel_event: 取消事件，置位后不再调用 LLM，也不写入聊天记录，返回 None。
+        :param timings: 字典，传入时记录构造提示词（prompt）和 LLM 调用（llm）的耗时（秒），
+            流式生成时还记录首个增量到达的时间（first_token）。
+        :param on_delta: 回调函数 on_delta(text)，传入时流式生成并逐段回调；
+            聊天记录中仍保存完整的回答。
+        :param recorded: 字典，传入时记录本轮写入 chat_log 的用户消息序号（user）
+            和 AI 消息序号（ai）；被取消时不写入聊天记录，也不记录序号。
         """
-        # 自动摘要最近的消息（在添加用户消息之前）
-        self._summarize_recent_messages()
-
-        # 准备聊天系统提示，包含最近 10 条消息和最近一条摘要
+        timings = {} if timings is None else timings
+        recorded = {} if recorded is None else recorded
+        start = time.perf_counter()
+        # 准备聊天系统提示，包含最近 10 条消息和最近一条已完成的摘要，
+        # 超出 token 预算时依次舍弃摘要、较早的消息、编辑框内容和靠后的段落
         recent_messages = self.get_recent_messages(10)  # 不包含当前用户输入
         last_summary = self.get_last_summary()
-        prompt_context = recent_messages
-        if last_summary:
-            prompt_context = [last_summary] + recent_messages
-
-        # 格式化聊天系统提示（不包含当前用户输入）
-        prompt = CHAT_SYSTEM_PROMPT.format(
-            chat_history=prompt_context,
-            input=input,
+        packed = self.prompt_packer.pack(
+            input,
+            passages=[context] if isinstance(context, str) else context,
             diary_content=diary_content,
-            context=context,
+            messages=recent_messages,
+            summary=last_summary["content"] if last_summary else None,
         )
-        # 调用 LLM 生成响应
-        response = self.llm_generator.prompt_predict(prompt)
+        prompt = packed.prompt
+        self.last_prompt_usage = packed.usage
+        print(f"提示词 token 用量: {packed.usage}，截断: {sorted(packed.truncated)}")
+        timings["prompt"] = time.perf_counter() - start
+        if cancel_event is not None and cancel_event.is_set():
+            return None
 
-        # 添加用户消息和 AI 消息到历史记录
-        self.add_user_message(input)
-        self.add_ai_message(response)
+        # 调用 LLM 生成响应
+        start = time.perf_counter()
+        if on_delta is None:
+            response = self.llm_generator.prompt_predict(prompt)
+        else:
+            deltas = []
+            for delta in self.llm_generator.prompt_stream(prompt):
+                if cancel_event is not None and cancel_event.is_set():
+                    return None
+                if not deltas:
+                    timings["first_token"] = time.perf_counter() - start
+                deltas.append(delta)
+                on_delta(delta)
+            response = "".join(deltas)
+        timings["llm"] = time.perf_counter() - start
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+
+        # 添加用户消息和 AI 消息到历史记录；加锁后再检查一次取消，
+        # 已取消的对话不会在检查之后写入，并发的对话也不会交错写入
+        with self._history_lock:
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            recorded["user"] = self.add_user_message(input)
+            recorded["ai"] = self.add_ai_message(response)
+        # 回答已生成，在后台摘要最近的消息，供之后的对话使用
+        self._summarize_recent_messages()
 
         return response
 
@@ -1,5 +1,23 @@
+import asyncio
+import random
+import weakref
+
+import openai
 from langchain_openai import ChatOpenAI
 from prompts import QA_CONTEXT_PROMPT, DIARY_GENERATE_PROMPT
+from rag.llm_response_cache import normalize_prompt
+
+# 异步请求遇到这些错误时退避重试
+_RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, TimeoutError)
+
+
+def _retry_after(error):
+    """读取限流响应的 Retry-After 头（秒），没有时返回 None。"""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
 
 
 class LLMGenerator:
@@ -7,17 +25,58 @@ class LLMGenerator:
     LLM 生成器类，用于根据上下文生成回答。
     """
 
-    def __init__(self, model_name="gpt-4-turbo-preview"):
+    def __init__(
+        self,
+        model_name="gpt-4-turbo-preview",
+        response_cache=None,
+        cache_methods=("qa_context_predict", "diary_generate_predict"),
+        base_url=None,
+        max_concurrency=4,
+        request_timeout=60.0,
+        max_retries=3,
+        backoff_base=1.0,
+        backoff_max=30.0,
+    ):
         """
         初始化 LLM 生成器。
         :param model_name: 使用的 LLM 模型名称。
+        :param response_cache: LlmResponseCache 实例，为 None 时不缓存回答。
+        :param cache_methods: 启用回答缓存的方法名，只应包含结果确定的调用。
+        :param base_url: OpenAI 兼容服务的地址，为 None 时使用默认地址。
+        :param max_concurrency: 异步接口同时进行的最大请求数。
+        :param request_timeout: 单次请求的超时时间（秒）。
+        :param max_retries: 异步请求遇到限流或超时时的最大重试次数。
+        :param backoff_base: 第一次重试前的等待时间（秒），之后每次翻倍。
+        :param backoff_max: 重试等待时间的上限（秒）。
         """
         print("LLMGenerator init")
+        self.model_name = model_name
+        self.temperature = 0
         self.llm = ChatOpenAI(
             model_name=model_name,  # 或您使用的其他聊天模型
-            temperature=0,
+            temperature=self.temperature,
+            base_url=base_url,
+            timeout=request_timeout,
             # 其他参数...
         )
+        # 异步接口自行退避重试，客户端内部不再重试
+        self.async_llm = ChatOpenAI(
+            model_name=model_name,
+            temperature=self.temperature,
+            base_url=base_url,
+            timeout=request_timeout,
+            max_retries=0,
+        )
+        self.response_cache = response_cache
+        self.cache_methods = set(cache_methods)
+        self.max_concurrency = max_concurrency
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # asyncio 的信号量和任务只能在创建它们的事件循环中使用，按事件循环分别保存
+        self._semaphores = weakref.WeakKeyDictionary()  # 事件循环 -> 信号量
+        self._inflight = {}  # (事件循环, 规范化提示词) -> 进行中的请求任务
         print("LLMGenerator init done")
 
     def prompt_predict(self, prompt):
@@ -26,6 +85,110 @@ class LLMGenerator:
         print("response:\n", response)
         return response.content
 
+    def _cached_predict(self, method, prompt):
+        """
+        对启用了缓存的方法先查询回答缓存，未命中时调用 LLM 并写入缓存。
+        :param method: 调用方法名，决定是否走缓存并用于分别统计命中率。
+        :param prompt: 提示词。
+        """
+        if self.response_cache is None or method not in self.cache_methods:
+            return self.prompt_predict(prompt)
+
+        key = self.response_cache.make_key(
+            self.model_name, {"temperature": self.temperature}, prompt
+        )
+        response = self.response_cache.get(key, method)
+        if response is None:
+            response = self.prompt_predict(prompt)
+            self.response_cache.put(key, response)
+        return response
+
+    def cache_stats(self):
+        """
+        获取回答缓存的命中统计，未启用缓存时返回 None。
+        """
+        if self.response_cache is None:
+            return None
+        return self.response_cache.stats()
+
+    async def aprompt_predict(self, prompt):
+        """
+        异步生成回答。
+        相同提示词的并发调用合并为一次请求，共享同一个结果。
+        :param prompt: 提示词。
+        :return: LLM 生成的回答。
+        """
+        loop = asyncio.get_running_loop()
+        key = (loop, normalize_prompt(prompt))
+        task = self._inflight.get(key)
+        if task is None:
+            task = loop.create_task(self._arequest(prompt))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._request_done(key, t))
+        # 某个调用方被取消时不影响其他等待同一请求的调用方
+        return await asyncio.shield(task)
+
+    def _request_done(self, key, task):
+        self._inflight.pop(key, None)
+        # 所有调用方都已取消时也要取走异常，避免“异常未被获取”的警告
+        if not task.cancelled():
+            task.exception()
+
+    async def _arequest(self, prompt):
+        """
+        在并发上限内发送请求，限流或超时时按指数退避重试。
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+
+        async with semaphore:
+            print("prompt:\n", prompt)
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await asyncio.wait_for(
+                        self.async_llm.ainvoke(prompt), self.request_timeout
+                    )
+                    print("response:\n", response)
+                    return response.content
+                except _RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = _retry_after(e)
+                    if delay is None:
+                        delay = min(self.backoff_base * 2**attempt, self.backoff_max)
+                        delay *= random.uniform(0.5, 1.0)  # 抖动，避免同时重试
+                    print(f"LLM 请求失败（{type(e).__name__}），{delay:.1f} 秒后重试")
+                    await asyncio.sleep(delay)
+
+    async def _acached_predict(self, method, prompt):
+        """
+        _cached_predict 的异步版本。
+        """
+        if self.response_cache is None or method not in self.cache_methods:
+            return await self.aprompt_predict(prompt)
+
+        key = self.response_cache.make_key(
+            self.model_name, {"temperature": self.temperature}, prompt
+        )
+        response = self.response_cache.get(key, method)
+        if response is None:
+            response = await self.aprompt_predict(prompt)
+            self.response_cache.put(key, response)
+        return response
+
+    def prompt_stream(self, prompt):
+        """
+        流式生成回答，逐段产出新生成的文本。
+        :param prompt: 提示词。
+        :return: 文本增量的生成器，拼接起来即完整回答。
+        """
+        print("prompt:\n", prompt)
+        for chunk in self.llm.stream(prompt):
+            if chunk.content:
+                yield chunk.content
+
     def qa_context_predict(self, query, context):
         """
         根据上下文和查询生成回答。
@@ -37,7 +200,7 @@ class LLMGenerator:
         prompt = QA_CONTEXT_PROMPT.format(query=query, context=context)
 
         # 调用 LLM 并返回响应
-        response = self.prompt_predict(prompt)
+        response = self._cached_predict("qa_context_predict", prompt)
         return response
 
     def diary_generate_predict(self, input_text):
@@ -51,5 +214,24 @@ class LLMGenerator:
         prompt = DIARY_GENERATE_PROMPT.format(input_text=input_text)
 
         # 调用 LLM 并返回响应
-        response = self.prompt_predict(prompt)
+        response = self._cached_predict("diary_generate_predict", prompt)
         return response
+
+    async def aqa_context_predict(self, query, context):
+        """
+        qa_context_predict 的异步版本。
+        :param query: 用户查询。
+        :param context: 检索到的上下文。
+        :return: LLM 生成的回答。
+        """
+        prompt = QA_CONTEXT_PROMPT.format(query=query, context=context)
+        return await self._acached_predict("qa_context_predict", prompt)
+
+    async def adiary_generate_predict(self, input_text):
+        """
+        diary_generate_predict 的异步版本。
+        :param input_text: 日记草稿。
+        :return: LLM 扩写后的日记。
+        """
+        prompt = DIARY_GENERATE_PROMPT.format(input_text=input_text)
+        return await self._acached_predict("diary_generate_predict", prompt)
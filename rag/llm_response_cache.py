@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+
+def normalize_prompt(prompt):
+    """
+    规范化提示词：统一 Unicode 形式和换行符，去掉行尾与首尾空白。
+    只有这些不影响语义的差异会被抹平，内容不同的提示词仍得到不同的键。
+    """
+    prompt = unicodedata.normalize("NFC", prompt).replace("\r\n", "\n")
+    return "\n".join(line.rstrip() for line in prompt.split("\n")).strip()
+
+
+class LlmResponseCache:
+    """
+    LLM 回答的磁盘缓存
+
+    以“模型名 + 调用参数 + 规范化提示词哈希”为键，将回答保存在 SQLite 中
+    （可选用 CryptoManager 加密）。条目超过有效期后失效，条数超过上限时淘汰最久未使用的条目。
+    只适合 temperature=0 等结果确定的调用，由 LLMGenerator 按方法开启。
+    """
+
+    def __init__(
+        self,
+        cache_path=":memory:",
+        crypto_manager=None,
+        ttl=7 * 24 * 3600,
+        max_entries=1000,
+    ):
+        """
+        初始化回答缓存。
+        :param cache_path: SQLite 缓存文件路径，默认只缓存在内存中。
+        :param crypto_manager: 用于加密回答的 CryptoManager，为 None 时明文保存。
+        :param ttl: 有效期（秒），为 0 表示永不过期。
+        :param max_entries: 最多缓存的回答条数。
+        """
+        self.cache_path = cache_path
+        self.crypto_manager = crypto_manager
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = Counter()  # 调用方法 -> 命中次数
+        self.misses = Counter()  # 调用方法 -> 未命中次数
+        self._lock = threading.Lock()
+
+        if cache_path != ":memory:":
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response BLOB NOT NULL, "
+                "created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_responses_last_used "
+                "ON responses(last_used)"
+            )
+
+    @staticmethod
+    def make_key(model, params, prompt):
+        """
+        计算缓存键。
+        :param model: 模型名称。
+        :param params: 影响输出的调用参数，如 temperature。
+        :param prompt: 提示词。
+        """
+        digest = hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+        params = json.dumps(params, sort_keys=True, default=str)
+        return f"{model}:{params}:{digest}"
+
+    def get(self, key, method="prompt_predict"):
+        """
+        查询缓存，过期的条目视为未命中并被删除。
+        :param method: 调用方法名，用于分别统计命中率。
+        :return: 缓存的回答，未命中时返回 None。
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses[method] += 1
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self.hits[method] += 1
+        data = row[0]
+        if self.crypto_manager is not None:
+            data = self.crypto_manager.decrypt_data(data)
+        return data.decode("utf-8")
+
+    def put(self, key, response):
+        """
+        写入回答，超过上限时淘汰最久未使用的条目。
+        """
+        data = response.encode("utf-8")
+        if self.crypto_manager is not None:
+            data = self.crypto_manager.encrypt_data(data)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (key, data, now, now),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def clear(self):
+        """清空缓存。"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        """
+        获取缓存统计信息。
+        :return: 包含命中数、未命中数、命中率、缓存条数以及各方法命中情况的字典。
+        """
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            hits = sum(self.hits.values())
+            misses = sum(self.misses.values())
+            return {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "entries": entries,
+                "methods": {
+                    method: {"hits": self.hits[method], "misses": self.misses[method]}
+                    for method in sorted(set(self.hits) | set(self.misses))
+                },
+            }
+
+    def close(self):
+        """关闭缓存数据库连接。"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,103 @@
+import bisect
+from datetime import date as Date
+
+from models import DiaryFilter
+
+
+class MetadataIndex:
+    """
+    文档元数据索引
+
+    按日期（有序列表）、星期、天气和是否有备注分别建立索引，
+    将 :class:`DiaryFilter` 解析为匹配的文档 ID 集合。日期范围用二分查找定位，
+    各条件的结果从小到大求交集，耗时与匹配的文档数成正比，而不是与文档总数成正比。
+    本类不是线程安全的，由调用方加锁。
+    """
+
+    def __init__(self):
+        self._metadata = {}  # 文档 ID -> 元数据
+        self._dates = []  # 按日期排序的 (日期, 文档 ID)
+        self._weekdays = {}  # 星期 -> 文档 ID 集合
+        self._weather = {}  # 天气 -> 文档 ID 集合
+        self._with_note = set()
+        self._without_note = set()
+
+    def __len__(self):
+        return len(self._metadata)
+
+    def add(self, doc_id, metadata):
+        """
+        添加或替换文档的元数据，需要包含 date，可选 weather、has_note。
+        没有合法日期的文档不会被索引，任何过滤条件都不会匹配它。
+        """
+        self.remove(doc_id)
+        try:
+            date_str = metadata["date"]
+            weekday = Date.fromisoformat(date_str).weekday()
+        except (KeyError, TypeError, ValueError):
+            return
+
+        self._metadata[doc_id] = metadata
+        bisect.insort(self._dates, (date_str, doc_id))
+        self._weekdays.setdefault(weekday, set()).add(doc_id)
+        self._weather.setdefault(metadata.get("weather") or "", set()).add(doc_id)
+        if metadata.get("has_note"):
+            self._with_note.add(doc_id)
+        else:
+            self._without_note.add(doc_id)
+
+    def remove(self, doc_id):
+        """
+        删除文档的元数据，不存在时忽略。
+        """
+        metadata = self._metadata.pop(doc_id, None)
+        if metadata is None:
+            return
+        date_str = metadata["date"]
+        i = bisect.bisect_left(self._dates, (date_str, doc_id))
+        del self._dates[i]
+        self._weekdays[Date.fromisoformat(date_str).weekday()].discard(doc_id)
+        weather = metadata.get("weather") or ""
+        self._weather[weather].discard(doc_id)
+        if not self._weather[weather]:
+            del self._weather[weather]
+        self._with_note.discard(doc_id)
+        self._without_note.discard(doc_id)
+
+    def resolve(self, filters: DiaryFilter):
+        """
+        解析过滤条件。
+        :param filters: 过滤条件。
+        :return: 匹配的文档 ID 集合。
+        """
+        subsets = []
+        if filters.start_date is not None or filters.end_date is not None:
+            low = bisect.bisect_left(self._dates, (filters.start_date or "",))
+            high = (
+                bisect.bisect_right(self._dates, (filters.end_date, "\U0010ffff"))
+                if filters.end_date is not None
+                else len(self._dates)
+            )
+            subsets.append({doc_id for _, doc_id in self._dates[low:high]})
+        if filters.weekdays is not None:
+            subsets.append(
+                set().union(*(self._weekdays.get(day, ()) for day in filters.weekdays))
+            )
+        if filters.weather is not None:
+            # 不同的天气取值很少，逐个判断是否包含关键词
+            subsets.append(
+                set().union(
+                    *(
+                        doc_ids
+                        for weather, doc_ids in self._weather.items()
+                        if any(keyword in weather for keyword in filters.weather)
+                    )
+                )
+            )
+        if filters.has_note is not None:
+            subsets.append(self._with_note if filters.has_note else self._without_note)
+
+        if not subsets:
+            return set(self._metadata)
+        subsets.sort(key=len)
+        return subsets[0].intersection(*subsets[1:])
@@ -0,0 +1,189 @@
+import re
+from typing import Dict, NamedTuple, Set
+
+import tiktoken
+
+from prompts import CHAT_SYSTEM_PROMPT
+
+# 汉字、连续的字母数字（每 4 个字符一组）、其余单个非空白字符，各算一个近似 token
+_APPROX_TOKEN = re.compile(r"[㐀-䶿一-鿿豈-﫿]|\w{1,4}|\s+|.")
+_ROLE_NAMES = {"user": "用户", "ai": "AI", "summary": "摘要"}
+_ELLIPSIS = "…"
+
+_encodings = {}  # 模型名 -> 编码，加载失败时缓存近似编码，避免反复尝试下载
+
+
+class ApproximateEncoding:
+    """
+    与 tiktoken 编码接口相同的近似编码：汉字按一个 token 计，英文约每 4 个字符一个 token。
+    tiktoken 的词表需要联网下载，离线时用它估算，误差对预算控制来说可以接受。
+    """
+
+    name = "approximate"
+
+    def encode(self, text):
+        return _APPROX_TOKEN.findall(text)
+
+    def decode(self, tokens):
+        return "".join(tokens)
+
+
+def get_encoding(model_name):
+    """
+    获取模型对应的 tiktoken 编码，未知模型使用 cl100k_base，加载失败时退回近似编码。
+    """
+    encoding = _encodings.get(model_name)
+    if encoding is None:
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"加载 tiktoken 编码失败，使用近似 token 计数: {e}")
+            encoding = ApproximateEncoding()
+        _encodings[model_name] = encoding
+    return encoding
+
+
+class PackedPrompt(NamedTuple):
+    """打包后的提示词及各部分的 token 用量"""
+
+    prompt: str
+    usage: Dict[str, int]  # 部分名 -> token 数，另含 template（模板本身）和 total
+    truncated: Set[str]  # 被截断或部分丢弃的部分
+
+
+class PromptPacker:
+    """
+    按 token 预算组装聊天提示词
+
+    按优先级依次填充：用户输入、检索到的日记段落、最近的聊天记录、编辑框中的日记、
+    历史摘要。段落和聊天记录以整条为单位加入（聊天记录从最新的一条往前），
+    放不下时截断最后一条并在末尾加省略号，剩余预算不足 ``min_section_tokens`` 时直接丢弃。
+    编辑框中的日记可能很长，放在聊天记录之后，不会挤掉最近的对话。
+    """
+
+    def __init__(
+        self,
+        max_tokens=3000,
+        model_name="gpt-4-turbo-preview",
+        template=CHAT_SYSTEM_PROMPT,
+        encoding=None,
+        min_section_tokens=32,
+    ):
+        """
+        初始化提示词打包器。
+        :param max_tokens: 整个提示词的 token 预算。
+        :param model_name: 模型名称，用于选择 tiktoken 编码。
+        :param template: 提示词模板，需要包含 input、context、diary_content 和 chat_history 字段。
+        :param encoding: 自定义编码，需提供 encode/decode，为 None 时按模型名加载。
+        :param min_section_tokens: 截断后至少保留的 token 数，不足时整条丢弃。
+        """
+        self.max_tokens = max_tokens
+        self.model_name = model_name
+        self.template = template
+        self.min_section_tokens = min_section_tokens
+        self._encoding = encoding
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            self._encoding = get_encoding(self.model_name)
+        return self._encoding
+
+    def count_tokens(self, text):
+        return len(self.encoding.encode(text))
+
+    def truncate(self, text, max_tokens):
+        """
+        截断文本至不超过 max_tokens 个 token，被截断时以省略号结尾，省略号也计入预算。
+        """
+        tokens = self.encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        keep = max_tokens - self.count_tokens(_ELLIPSIS)
+        while keep > 0:
+            # 截断处可能切开多字节字符，去掉解码出的替换字符
+            head = self.encoding.decode(tokens[:keep]).rstrip("�") + _ELLIPSIS
+            # 与省略号拼接后重新编码的 token 数可能变多，超出时再少保留一个
+            if self.count_tokens(head) <= max_tokens:
+                return head
+            keep -= 1
+        return ""
+
+    @staticmethod
+    def format_message(message):
+        role = _ROLE_NAMES.get(message["role"], message["role"])
+        return f"{role}：{message['content']}"
+
+    def pack(self, input, passages=(), diary_content="", messages=(), summary=None):
+        """
+        组装提示词。
+        :param input: 用户当前输入。
+        :param passages: 检索到的日记段落，按相关度降序。
+        :param diary_content: 编辑框中的日记内容。
+        :param messages: 最近的聊天记录，按时间顺序，元素为 {"role", "content"} 字典。
+        :param summary: 历史摘要文本。
+        :return: PackedPrompt。
+        """
+        usage = {}
+        truncated = set()
+        empty = self.template.format(
+            input="", context="", diary_content="", chat_history=""
+        )
+        usage["template"] = self.count_tokens(empty)
+        remaining = self.max_tokens - usage["template"]
+
+        def fill(name, texts, separator, min_tokens=self.min_section_tokens):
+            """按顺序加入整条文本，放不下时截断一条后停止，返回加入的文本列表"""
+            nonlocal remaining
+            kept = []
+            budget = remaining
+            separator_tokens = self.count_tokens(separator)
+            for text in texts:
+                cost = self.count_tokens(text) + (separator_tokens if kept else 0)
+                if cost > budget:
+                    truncated.add(name)
+                    budget -= separator_tokens if kept else 0
+                    if budget >= min_tokens:
+                        kept.append(self.truncate(text, budget))
+                    break
+                kept.append(text)
+                budget -= cost
+            usage[name] = self.count_tokens(separator.join(kept))
+            remaining -= usage[name]
+            return kept
+
+        input_text = "".join(fill("input", [input], "", min_tokens=1))
+        context = "\n\n".join(fill("context", [p for p in passages if p], "\n\n"))
+        history = fill(
+            "chat_history",
+            [self.format_message(m) for m in reversed(list(messages))],
+            "\n",
+        )
+        history.reverse()
+        diary = "".join(
+            fill("diary_content", [diary_content] if diary_content else [], "")
+        )
+        # 摘要放在聊天记录之前，预留分隔的换行
+        remaining -= self.count_tokens("\n") if history else 0
+        summary_text = "".join(
+            fill(
+                "summary",
+                [self.format_message({"role": "summary", "content": summary})]
+                if summary
+                else [],
+                "",
+            )
+        )
+        chat_history = "\n".join(([summary_text] if summary_text else []) + history)
+
+        prompt = self.template.format(
+            input=input_text,
+            context=context,
+            diary_content=diary,
+            chat_history=chat_history,
+        )
+        usage["total"] = self.count_tokens(prompt)
+        return PackedPrompt(prompt, usage, truncated)
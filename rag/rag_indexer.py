@@ -0,0 +1,151 @@
+import threading
+import time
+
+from managers.diary_manager import DIARY_SAVED
+from rag.diary_chunker import DiaryChunker
+from rag.rag_retriever import RagRetriever
+
+
+class RagIndexer:
+    """
+    后台增量索引器
+
+    监听 DiaryManager 的日记变更事件，在后台线程中只更新或删除对应日记的向量。
+    连续的变更会在防抖窗口内合并，例如自动保存的一连串写入只会触发一次嵌入调用。
+    启动时的全量同步也通过 :meth:`bootstrap` 交给后台线程，界面不必等待解密整个日记库。
+    """
+
+    def __init__(self, retriever: RagRetriever, debounce=2.0, document_builder=None):
+        """
+        初始化索引器并启动后台线程。
+        :param retriever: 要维护的 RagRetriever。
+        :param debounce: 防抖时间（秒），最后一次变更后等待这么久再更新索引。
+        :param document_builder: 将日记对象转换为索引文本或段落列表的函数，
+            默认使用 DiaryChunker 切分为段落。
+        """
+        self.retriever = retriever
+        self.debounce = debounce
+        self.document_builder = document_builder or DiaryChunker()
+        self._pending = {}  # 文档 ID -> 文本或段落列表，None 表示删除
+        self._bootstrap = None  # 尚未执行的全量同步
+        self._last_event = 0.0
+        self._running = True
+        self._condition = threading.Condition()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread = threading.Thread(
+            target=self._run, name="rag-indexer", daemon=True
+        )
+        self._thread.start()
+
+    def on_diary_changed(self, event, date_str, diary=None):
+        """
+        日记变更回调，可直接注册为 DiaryManager 的监听器。
+        :param event: DIARY_SAVED 或 DIARY_DELETED。
+        :param date_str: 日记日期，即文档 ID。
+        :param diary: 保存后的日记对象，删除时为 None。
+        """
+        text = None
+        if event == DIARY_SAVED and diary is not None:
+            text = self.document_builder(diary)
+        with self._condition:
+            self._pending[date_str] = text
+            self._last_event = time.monotonic()
+            self._idle.clear()
+            self._condition.notify()
+
+    def bootstrap(self, load_documents):
+        """
+        在后台线程中用全部文档同步索引：删除已不存在的文档，只嵌入新增或变化的文档。
+        同步先于尚未处理的变更执行，同步期间到达的变更会在同步完成后再应用。
+        :param load_documents: 返回文档 ID 到文本或段落列表字典的函数，在后台线程中调用。
+        """
+        with self._condition:
+            self._bootstrap = load_documents
+            self._idle.clear()
+            self._condition.notify()
+
+    def flush(self, timeout=None):
+        """
+        跳过防抖等待，立即处理所有待更新的变更。
+        :param timeout: 最长等待时间（秒）。
+        :return: 是否在超时前处理完毕。
+        """
+        with self._condition:
+            self._last_event = 0.0
+            self._condition.notify()
+        return self._idle.wait(timeout)
+
+    def stop(self, timeout=None):
+        """
+        处理完剩余变更后停止后台线程，尚未开始的全量同步被跳过。
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            self._process()
+        finally:
+            # 线程退出后不再处理任何变更（包括停止时跳过的全量同步），唤醒等待中的 flush
+            self._idle.set()
+
+    def _process(self):
+        """处理变更和全量同步，直到停止且没有剩余变更"""
+        while True:
+            with self._condition:
+                while self._running and not self._pending and not self._bootstrap:
+                    self._condition.wait()
+                bootstrap, self._bootstrap = self._bootstrap, None
+                if not self._running:
+                    bootstrap = None
+                if bootstrap is None:
+                    if not self._pending:
+                        return
+                    # 防抖：直到最后一次变更后 debounce 秒内没有新变更才开始处理
+                    while self._running:
+                        remaining = self._last_event + self.debounce - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._condition.wait(remaining)
+                    pending, self._pending = self._pending, {}
+
+            if bootstrap is not None:
+                self._sync(bootstrap)
+            else:
+                self._apply(pending)
+
+            with self._condition:
+                if not self._pending and not self._bootstrap:
+                    self._idle.set()
+
+    def _sync(self, load_documents):
+        """
+        执行全量同步，失败时保留已加载的索引，之后的变更仍会增量应用。
+        """
+        try:
+            if self.retriever.sync(load_documents()):
+                self.retriever.save_index()
+        except Exception as e:
+            print(f"同步索引失败: {e}")
+
+    def _apply(self, pending):
+        """
+        将一批合并后的变更应用到检索器并保存索引，失败时放回队列等待下次重试。
+        """
+        upserts = {doc_id: text for doc_id, text in pending.items() if text is not None}
+        removals = [doc_id for doc_id, text in pending.items() if text is None]
+        try:
+            if self.retriever.update_documents(upserts, removals):
+                self.retriever.save_index()
+        except Exception as e:
+            print(f"增量更新索引失败: {e}")
+            with self._condition:
+                if not self._running:
+                    return
+                for doc_id, text in pending.items():
+                    self._pending.setdefault(doc_id, text)
+                # 至少等待一个防抖周期再重试
+                self._last_event = time.monotonic()
@@ -16,16 +16,17 @@ class RagPipeline:
         self.retriever = retriever
         self.generator = generator
 
-    def run(self, query, k=5):
+    def run(self, query, k=5, filters=None):
         """
         执行 RAG 流程。
         :param query: 用户查询。
-        :param k: 检索的文档数量。
+        :param k: 检索的段落数量。
+        :param filters: DiaryFilter 或等价的字典，只在元数据匹配的日记中检索。
         :return: 最终生成的回答。
         """
-        # 检索相关文档
-        docs = self.retriever.retrieve(query, k)
+        # 检索相关段落
+        docs = self.retriever.retrieve(query, k, filters=filters)
         # 生成回答
-        context = "\n".join([doc.page_content for doc in docs])
+        context = "\n\n".join([doc.page_content for doc in docs])
         answer = self.generator.qa_context_predict(query, context)
         return answer
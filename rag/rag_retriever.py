@@ -1,30 +1,540 @@
+import hashlib
+import json
+import os
+import pickle
+import threading
+from typing import NamedTuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
 
+from models import DiaryFilter
+from rag.bm25_index import BM25Index
+from rag.embedding_cache import CachedEmbeddings
+from rag.hashing_embeddings import HashingEmbeddings
+from rag.metadata_index import MetadataIndex
+
+# 持久化索引文件格式版本，格式变化时递增以丢弃旧索引
+INDEX_FORMAT_VERSION = 2
+
+# 候选段落不超过该数量时直接取出向量计算距离，否则由 FAISS 扫描时跳过非候选向量
+_RECONSTRUCT_LIMIT = 4096
+
+
+class RetrievalHit(NamedTuple):
+    """
+    轻量的检索结果，不含段落正文。score 越大越相关：混合检索为 RRF 得分，
+    ``lexical`` 为 BM25 得分，``vector`` 为 L2 距离的相反数。
+    """
+
+    passage_id: str
+    doc_id: str
+    score: float
+
+
+def create_embedding_model(backend="openai", dim=1024):
+    """
+    根据配置创建嵌入模型。
+    :param backend: ``openai`` 使用 OpenAIEmbeddings，``hashing`` 使用本地离线的哈希嵌入。
+    :param dim: 本地哈希嵌入的向量维度。
+    """
+    if backend == "hashing":
+        return HashingEmbeddings(dim=dim)
+    return OpenAIEmbeddings()
+
+
+def content_hash(text):
+    """
+    计算文本内容的哈希，用于判断文档是否需要重新嵌入。
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def passages_hash(passages):
+    """
+    计算一篇文档所有段落（内容和元数据）的哈希。
+    """
+    return content_hash(
+        json.dumps(
+            [[doc.page_content, doc.metadata] for doc in passages],
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+    )
+
 
 class RagRetriever:
     """
     RAG 检索器类，用于管理文档嵌入和检索。
+
+    指定 ``index_path`` 和 ``crypto_manager`` 时，FAISS 索引和文档库会加密保存到磁盘。
+    下次启动时先加载已保存的索引，只对内容哈希发生变化的文档重新嵌入。
+    一篇文档可以切分为多个段落（见 :class:`DiaryChunker`），索引和检索都以段落为单位，
+    段落 ID 为 ``文档 ID#序号``。
+    文档和查询的嵌入都经过 :class:`CachedEmbeddings` 缓存，相同文本不会重复嵌入。
+    向量索引旁维护一个 BM25 倒排索引，默认以倒数排名融合（RRF）合并两路结果，
+    保证人名地名等精确词汇能被检索到。
+    检索可指定 :class:`DiaryFilter`，先在元数据索引中解析出匹配的日记，
+    两路检索都只在这些日记的段落中进行。
     """
 
-    def __init__(self, texts, embedding_model=None):
+    def __init__(
+        self,
+        texts,
+        embedding_model=None,
+        ids=None,
+        index_path=None,
+        crypto_manager=None,
+        embedding_cache_path=None,
+        embedding_cache_size=50000,
+        candidate_pool=50,
+        prefilter_threshold=2000,
+    ):
         """
         初始化 RAG 检索器。
-        :param texts: 文本列表，每个文本为一个文档。
+        :param texts: 文档列表，每个元素为文档全文，或该文档切分出的段落 Document 列表；
+            为 None 时只加载已保存的索引，之后再通过 :meth:`sync` 同步。
         :param embedding_model: 嵌入模型，默认为 OpenAIEmbeddings。
+        :param ids: 与 texts 一一对应的文档 ID（如日记日期），默认使用内容哈希。
+        :param index_path: 加密索引文件路径，为 None 时不持久化。
+        :param crypto_manager: 用于加解密索引文件的 CryptoManager。
+        :param embedding_cache_path: 嵌入缓存文件路径，为 None 时只缓存在内存中。
+        :param embedding_cache_size: 嵌入缓存最多保存的向量条数。
+        :param candidate_pool: 混合检索时每一路召回的候选数量。
+        :param prefilter_threshold: 文档数超过该值时，向量检索只对 BM25 候选打分。
+        """
+        embedding_model = embedding_model or OpenAIEmbeddings()
+        if not isinstance(embedding_model, CachedEmbeddings):
+            embedding_model = CachedEmbeddings(
+                embedding_model,
+                cache_path=embedding_cache_path or ":memory:",
+                max_entries=embedding_cache_size,
+                crypto_manager=crypto_manager if embedding_cache_path else None,
+            )
+        self.embedding_model = embedding_model
+        self.index_path = index_path
+        self.crypto_manager = crypto_manager
+        self.vectorstore = None
+        self.content_hashes = {}  # 文档 ID -> 内容哈希
+        self.passage_ids = {}  # 文档 ID -> 段落 ID 列表
+        self.bm25 = BM25Index()
+        self.metadata_index = MetadataIndex()  # 文档 ID -> 日期、天气等元数据
+        self.candidate_pool = candidate_pool
+        self.prefilter_threshold = prefilter_threshold
+        self._positions = None  # 段落 ID -> FAISS 向量位置，索引变化时重建
+        self._lock = threading.RLock()  # 保护 vectorstore 的读写
+        self._write_lock = threading.Lock()  # 串行化索引更新
+
+        if self._persistent:
+            self._load_index()
+        if texts is None:
+            return
+
+        texts = list(texts)
+        if ids is None:
+            ids = [content_hash(text) for text in texts]
+        if self.sync(dict(zip(ids, texts))) and self._persistent:
+            self.save_index()
+
+    @property
+    def _persistent(self):
+        return bool(self.index_path) and self.crypto_manager is not None
+
+    def _embedding_model_id(self):
+        """
+        嵌入模型标识，模型变化时已保存的向量不再可用。
+        """
+        embeddings = self.embedding_model.embeddings
+        model = getattr(embeddings, "model", None)
+        return f"{type(embeddings).__name__}:{model}"
+
+    def sync(self, documents):
+        """
+        将索引与给定文档同步：删除已不存在的文档，只嵌入新增或内容变化的文档。
+        :param documents: 文档 ID 到文本或段落列表的字典。
+        :return: 索引是否发生了变化。
+        """
+        removed = [doc_id for doc_id in self.content_hashes if doc_id not in documents]
+        return self.update_documents(documents, removed)
+
+    @staticmethod
+    def _to_passages(doc_id, document):
+        """
+        将文本或段落列表统一为段落 Document 列表，并在元数据中记录所属文档 ID。
+        """
+        if isinstance(document, str):
+            document = [Document(page_content=document)]
+        return [
+            Document(
+                page_content=passage.page_content,
+                metadata={**passage.metadata, "source": doc_id},
+            )
+            for passage in document
+        ]
+
+    def update_documents(self, upserts, removals=()):
+        """
+        增量更新索引：插入或替换 upserts 中内容变化的文档，删除 removals 中的文档。
+        替换文档时先删除它原有的全部段落。所有需要嵌入的段落在一次调用中批量嵌入，
+        嵌入期间不阻塞检索。
+        :param upserts: 文档 ID 到文本或段落列表的字典。
+        :param removals: 要删除的文档 ID 列表。
+        :return: 索引是否发生了变化。
+        """
+        with self._write_lock:
+            passages = {
+                doc_id: self._to_passages(doc_id, document)
+                for doc_id, document in upserts.items()
+            }
+            hashes = {doc_id: passages_hash(docs) for doc_id, docs in passages.items()}
+            passages = {
+                doc_id: docs
+                for doc_id, docs in passages.items()
+                if self.content_hashes.get(doc_id) != hashes[doc_id]
+            }
+            removals = [
+                doc_id
+                for doc_id in removals
+                if doc_id in self.content_hashes and doc_id not in passages
+            ]
+            if not passages and not removals:
+                return False
+
+            new_ids = [
+                f"{doc_id}#{i}"
+                for doc_id, docs in passages.items()
+                for i in range(len(docs))
+            ]
+            new_docs = [doc for docs in passages.values() for doc in docs]
+            embeddings = (
+                self.embedding_model.embed_documents(
+                    [doc.page_content for doc in new_docs]
+                )
+                if new_docs
+                else []
+            )
+
+            with self._lock:
+                stale = [
+                    passage_id
+                    for doc_id in removals + list(passages)
+                    for passage_id in self.passage_ids.get(doc_id, [])
+                ]
+                if stale:
+                    self.vectorstore.delete(stale)
+                    for passage_id in stale:
+                        self.bm25.remove(passage_id)
+                if new_docs:
+                    text_embeddings = [
+                        (doc.page_content, embedding)
+                        for doc, embedding in zip(new_docs, embeddings)
+                    ]
+                    metadatas = [doc.metadata for doc in new_docs]
+                    if self.vectorstore is None:
+                        self.vectorstore = FAISS.from_embeddings(
+                            text_embeddings,
+                            self.embedding_model,
+                            metadatas=metadatas,
+                            ids=new_ids,
+                        )
+                    else:
+                        self.vectorstore.add_embeddings(
+                            text_embeddings, metadatas=metadatas, ids=new_ids
+                        )
+                for doc_id in removals:
+                    del self.content_hashes[doc_id]
+                    del self.passage_ids[doc_id]
+                    self.metadata_index.remove(doc_id)
+                ids = iter(new_ids)
+                for doc_id, docs in passages.items():
+                    self.content_hashes[doc_id] = hashes[doc_id]
+                    if docs:
+                        self.metadata_index.add(doc_id, docs[0].metadata)
+                    else:
+                        self.metadata_index.remove(doc_id)
+                    self.passage_ids[doc_id] = []
+                    for doc in docs:
+                        passage_id = next(ids)
+                        self.passage_ids[doc_id].append(passage_id)
+                        self.bm25.add(passage_id, doc.page_content)
+                self._positions = None
+
+        print(
+            f"索引已更新: 嵌入 {len(passages)} 篇 {len(new_docs)} 段, "
+            f"删除 {len(removals)} 篇"
+        )
+        return True
+
+    def _load_index(self):
+        """
+        从磁盘加载并解密已保存的索引，文件不存在、损坏或嵌入模型变化时忽略。
+        """
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "rb") as f:
+                payload = pickle.loads(self.crypto_manager.decrypt_data(f.read()))
+            if payload.get("version") != INDEX_FORMAT_VERSION:
+                return
+            if payload.get("embedding_model") != self._embedding_model_id():
+                print("嵌入模型已变化，重建索引")
+                return
+            # 索引文件经过认证加密，反序列化的数据只可能来自本应用自己
+            self.vectorstore = FAISS.deserialize_from_bytes(
+                payload["faiss"],
+                self.embedding_model,
+                allow_dangerous_deserialization=True,
+            )
+            self.content_hashes = payload["content_hashes"]
+            self.passage_ids = payload["passage_ids"]
+            self.bm25 = pickle.loads(payload["bm25"])
+            self.metadata_index = self._build_metadata_index()
+        except Exception as e:
+            print(f"加载索引失败，将重建索引: {e}")
+            self.vectorstore = None
+            self.content_hashes = {}
+            self.passage_ids = {}
+            self.bm25 = BM25Index()
+            self.metadata_index = MetadataIndex()
+
+    def _build_metadata_index(self):
+        """
+        从文档库中各文档首个段落的元数据重建元数据索引。
+        """
+        metadata_index = MetadataIndex()
+        for doc_id, passage_ids in self.passage_ids.items():
+            if passage_ids:
+                passage = self.vectorstore.docstore.search(passage_ids[0])
+                metadata_index.add(doc_id, passage.metadata)
+        return metadata_index
+
+    def save_index(self):
+        """
+        将索引、文档库和内容哈希加密后保存到磁盘。
+        """
+        if not self._persistent or self.vectorstore is None:
+            return
+        with self._lock:
+            payload = {
+                "version": INDEX_FORMAT_VERSION,
+                "embedding_model": self._embedding_model_id(),
+                "content_hashes": dict(self.content_hashes),
+                "passage_ids": {
+                    doc_id: list(ids) for doc_id, ids in self.passage_ids.items()
+                },
+                "bm25": pickle.dumps(self.bm25),
+                "faiss": self.vectorstore.serialize_to_bytes(),
+            }
+        encrypted_data = self.crypto_manager.encrypt_data(pickle.dumps(payload))
+
+        os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(encrypted_data)
+        os.replace(tmp_path, self.index_path)
+
+    def search(self, query, k=5, **kwargs):
         """
-        self.embedding_model = embedding_model or OpenAIEmbeddings()
-        self.vectorstore = FAISS.from_texts(texts, self.embedding_model)
+        检索最相关的段落，只返回 ID 和得分，不读取段落正文。
+        参数同 :meth:`search_batch`。
+        :return: RetrievalHit 列表。
+        """
+        return self.search_batch([query], k, **kwargs)[0]
 
-    def retrieve(self, query, k=5):
+    def search_batch(
+        self,
+        queries,
+        k=5,
+        mode="hybrid",
+        lexical_weight=1.0,
+        vector_weight=1.0,
+        rrf_k=60,
+        filters=None,
+    ):
+        """
+        批量检索。所有查询的嵌入经过缓存后一次取得，未过滤的向量检索在一次 FAISS 调用中完成。
+        :param queries: 查询列表。
+        :param k: 每个查询检索的段落数量。
+        :param mode: ``hybrid`` 融合 BM25 与向量检索，``vector`` 只用向量检索，
+            ``lexical`` 只用 BM25。
+        :param lexical_weight: 融合时 BM25 排名的权重。
+        :param vector_weight: 融合时向量排名的权重。
+        :param rrf_k: 倒数排名融合的平滑常数，越大排名靠后的结果影响越大。
+        :param filters: DiaryFilter 或等价的字典，只检索元数据匹配的日记。
+        :return: 与 queries 一一对应的 RetrievalHit 列表。
         """
-        根据查询检索最相关的文档。
+        queries = list(queries)
+        if not queries:
+            return []
+        if isinstance(filters, dict):
+            filters = DiaryFilter(**filters)
+        if filters is not None and filters.is_empty():
+            filters = None
+
+        pool = k if mode == "vector" else max(self.candidate_pool, k)
+        # 查询嵌入可能需要调用远程模型，不在锁内进行
+        query_vectors = None
+        if mode != "lexical":
+            query_vectors = np.asarray(
+                self.embedding_model.embed_queries(queries), dtype=np.float32
+            )
+
+        with self._lock:
+            if self.vectorstore is None:
+                return [[] for _ in queries]
+            candidates = None
+            if filters is not None:
+                candidates = [
+                    passage_id
+                    for doc_id in sorted(self.metadata_index.resolve(filters))
+                    for passage_id in self.passage_ids[doc_id]
+                ]
+                if not candidates:
+                    return [[] for _ in queries]
+
+            lexical = [[] for _ in queries]
+            if mode != "vector":
+                lexical = [
+                    self.bm25.search(query, pool, candidates) for query in queries
+                ]
+            if mode == "lexical":
+                return [self._hits(hits[:k]) for hits in lexical]
+
+            use_prefilter = [
+                candidates is None
+                and mode == "hybrid"
+                and len(self.bm25) > self.prefilter_threshold
+                and len(hits) >= k
+                for hits in lexical
+            ]
+            full_search = [
+                i
+                for i in range(len(queries))
+                if candidates is None and not use_prefilter[i]
+            ]
+            vector = {}
+            if full_search:
+                vector.update(
+                    zip(
+                        full_search,
+                        self._search_vectors(query_vectors[full_search], pool),
+                    )
+                )
+
+            results = []
+            for i, query_vector in enumerate(query_vectors):
+                if candidates is not None:
+                    vector[i] = self._rank_candidates(query_vector, candidates, pool)
+                elif use_prefilter[i]:
+                    # 大型日记库中 BM25 候选足够时，向量检索只对候选打分
+                    passage_ids = [passage_id for passage_id, _ in lexical[i]]
+                    vector[i] = self._rank_candidates(query_vector, passage_ids)
+                if mode == "vector":
+                    hits = [(pid, -distance) for pid, distance in vector[i][:k]]
+                else:
+                    hits = self._fuse(
+                        [(lexical[i], lexical_weight), (vector[i], vector_weight)],
+                        rrf_k,
+                    )[:k]
+                results.append(self._hits(hits))
+            return results
+
+    def retrieve(self, query, k=5, **kwargs):
+        """
+        根据查询检索最相关的段落。参数同 :meth:`search_batch`。
         :param query: 用户查询。
-        :param k: 检索的文档数量。
-        :return: 检索到的文档列表。
+        :param k: 检索的段落数量。
+        :return: 检索到的段落 Document 列表，metadata 中的 source 为所属文档 ID。
+        """
+        return self.retrieve_batch([query], k, **kwargs)[0]
+
+    def retrieve_batch(self, queries, k=5, **kwargs):
+        """
+        批量检索段落正文。参数同 :meth:`search_batch`。
+        :return: 与 queries 一一对应的段落 Document 列表。
+        """
+        results = self.search_batch(queries, k, **kwargs)
+        with self._lock:
+            if self.vectorstore is None:
+                return [[] for _ in results]
+            docstore = self.vectorstore.docstore
+            # 检索与读取之间段落可能已被并发更新删除，跳过找不到的段落
+            return [
+                [
+                    doc
+                    for doc in (docstore.search(hit.passage_id) for hit in hits)
+                    if isinstance(doc, Document)
+                ]
+                for hits in results
+            ]
+
+    @staticmethod
+    def _hits(ranked):
+        """将 (段落 ID, 得分) 列表转换为 RetrievalHit 列表。"""
+        return [
+            RetrievalHit(passage_id, passage_id.rsplit("#", 1)[0], float(score))
+            for passage_id, score in ranked
+        ]
+
+    def _search_vectors(self, query_vectors, k, params=None):
         """
-        retriever = self.vectorstore.as_retriever(
-            search_type="similarity", search_kwargs={"k": k}
+        在 FAISS 索引中批量检索。
+        :param query_vectors: 查询向量矩阵，每行一个查询。
+        :return: 每个查询按距离升序排列的 (段落 ID, L2 距离) 列表。
+        """
+        distances, positions = self.vectorstore.index.search(
+            query_vectors, k, params=params
+        )
+        mapping = self.vectorstore.index_to_docstore_id
+        return [
+            [
+                (mapping[int(pos)], float(distance))
+                for pos, distance in zip(row_positions, row_distances)
+                if pos >= 0
+            ]
+            for row_positions, row_distances in zip(positions, distances)
+        ]
+
+    def _rank_candidates(self, query_vector, passage_ids, k=None):
+        """
+        只对候选段落计算与查询向量的 L2 距离。
+        :param k: 返回的数量，为 None 时返回全部候选。
+        :return: 按距离升序排列的 (段落 ID, L2 距离) 列表。
+        """
+        if self._positions is None:
+            self._positions = {
+                passage_id: pos
+                for pos, passage_id in self.vectorstore.index_to_docstore_id.items()
+            }
+        positions = np.array(
+            [self._positions[passage_id] for passage_id in passage_ids], dtype=np.int64
         )
-        docs = retriever.invoke(query)
-        return docs
+        if k is not None and len(positions) > _RECONSTRUCT_LIMIT:
+            selector = faiss.IDSelectorBatch(positions)
+            return self._search_vectors(
+                query_vector[None, :], k, faiss.SearchParameters(sel=selector)
+            )[0]
+
+        vectors = self.vectorstore.index.reconstruct_batch(positions)
+        distances = ((vectors - query_vector) ** 2).sum(axis=1)
+        order = np.argsort(distances, kind="stable")[:k]
+        return [(passage_ids[i], float(distances[i])) for i in order]
+
+    @staticmethod
+    def _fuse(rankings, rrf_k):
+        """
+        倒数排名融合：段落得分为各路排名 ``weight / (rrf_k + rank)`` 之和。
+        :param rankings: (按相关度排列的 (段落 ID, 得分) 列表, 权重) 的列表，只使用排名。
+        :return: 按融合得分降序排列的 (段落 ID, 融合得分) 列表。
+        """
+        scores = {}
+        for ranked, weight in rankings:
+            for rank, (passage_id, _) in enumerate(ranked, start=1):
+                scores[passage_id] = scores.get(passage_id, 0.0) + weight / (
+                    rrf_k + rank
+                )
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
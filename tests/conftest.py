@@ -0,0 +1,63 @@
+import os
+import shutil
+from typing import List
+from unittest.mock import patch
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from pydantic import Field
+
+from managers.crypto_manager import CryptoManager
+
+TEST_KEYS_DIR = os.path.join(os.path.dirname(__file__), "mock_data", "test_keys")
+
+
+class RecordingEmbedding(DeterministicFakeEmbedding):
+    """记录被嵌入文本和每次批量嵌入调用的假嵌入模型"""
+
+    # 每个实例各自的记录，不在实例间共享
+    embedded: List[str] = Field(default_factory=list)
+    batches: List[List[str]] = Field(default_factory=list)
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        self.batches.append(list(texts))
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.embedded.append(text)
+        return super().embed_query(text)
+
+
+@pytest.fixture
+def recording_embedding():
+    """
+    创建 RecordingEmbedding 的工厂，参数同 DeterministicFakeEmbedding，如 ``size=16``
+    """
+    return RecordingEmbedding
+
+
+@pytest.fixture
+def test_keys(tmp_path):
+    """
+    让 CryptoManager 使用测试密钥。
+
+    测试密钥对复制到临时目录，测试中生成的 data_key.bin 也写在那里，
+    不会留在共享的 mock_data 目录中。
+
+    Returns:
+        测试密钥所在的临时目录
+    """
+    key_dir = tmp_path / "keys"
+    key_dir.mkdir()
+    for name in ("public_key.pem", "private_key.pem"):
+        shutil.copy(os.path.join(TEST_KEYS_DIR, name), key_dir / name)
+    with patch.object(
+        CryptoManager,
+        "_get_key_paths",
+        return_value=(
+            str(key_dir / "public_key.pem"),
+            str(key_dir / "private_key.pem"),
+        ),
+    ):
+        yield key_dir
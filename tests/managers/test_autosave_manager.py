@@ -0,0 +1,88 @@
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from managers.autosave_manager import AutosaveManager
+from managers.config_manager import ConfigManager
+from managers.diary_manager import DiaryManager
+from models import Config, Diary
+
+DATE = "2025-03-15"
+
+
+def wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.mark.usefixtures("test_keys")
+class TestAutosaveManager:
+    """
+    测试自动保存引擎的防抖合并、崩溃日志和异步刷新。
+    """
+
+    def _make_manager(self, tmp_path):
+        config = Config(diary_path=str(tmp_path / "diary")).model_dump()
+        with patch.object(ConfigManager, "_load_config", return_value=config):
+            return DiaryManager()
+
+    def test_bursts_are_coalesced(self, tmp_path):
+        """
+        测试连续的编辑只保存一次，保存后日志被删除，与已保存内容相同的编辑被忽略。
+        """
+        diary_manager = self._make_manager(tmp_path)
+        autosave = AutosaveManager(diary_manager, str(tmp_path / "journal"), 0.2)
+        autosave.mark_clean(DATE, "")
+        assert not autosave.update(Diary(date=DATE, content=""))
+
+        for i in range(1, 6):
+            assert autosave.update(Diary(date=DATE, content="今天" * i))
+        assert autosave.is_dirty(DATE)
+        assert autosave.flush(timeout=3)
+        assert autosave.saves == 1
+        assert not autosave.is_dirty(DATE)
+        assert diary_manager.load_diary(DATE).content == "今天" * 5
+        assert autosave.journal_dates() == []
+        assert not autosave.update(Diary(date=DATE, content="今天" * 5))
+        autosave.stop()
+
+    def test_recover_from_journal(self, tmp_path):
+        """
+        测试未保存的编辑可以从加密日志中恢复，日志末尾不完整的记录被忽略。
+        """
+        diary_manager = self._make_manager(tmp_path)
+        journal_dir = str(tmp_path / "journal")
+        autosave = AutosaveManager(diary_manager, journal_dir, debounce=60)
+        edits = ["今天去了公园", "今天去了公园，看到了花", "今天去了西湖，看到了花"]
+        for content in edits:
+            autosave.update(Diary(date=DATE, content=content))
+            time.sleep(0.05)
+        assert wait_for(lambda: autosave.recover(DATE) == edits[-1])
+
+        # 模拟崩溃：另一个实例读取日志
+        path = os.path.join(journal_dir, f"{DATE}.journal")
+        with open(path, "rb") as f:
+            assert "公园".encode("utf-8") not in f.read()
+        with open(path, "ab") as f:
+            f.write(b"\x00\x00\x01\x00partial")
+        recovered = AutosaveManager(diary_manager, journal_dir)
+        assert recovered.journal_dates() == [DATE]
+        assert recovered.recover(DATE) == edits[-1]
+        assert recovered.recover("2025-01-01") is None
+        recovered.stop()
+
+        # 切换日期时不等待保存完成，保存前仍可取回待保存的内容
+        assert autosave.flush(wait=False)
+        assert autosave.get_pending(DATE) is None or (
+            autosave.get_pending(DATE).content == edits[-1]
+        )
+        assert wait_for(lambda: not autosave.is_dirty(DATE))
+        assert diary_manager.load_diary(DATE).content == edits[-1]
+        assert autosave.journal_dates() == []
+        autosave.stop()
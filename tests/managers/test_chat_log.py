@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+from managers.chat_log import CORRUPTED_CONTENT, ChatLog
+from managers.crypto_manager import CryptoManager
+
+
+class TestChatLog:
+    """
+    测试 ChatLog 的加密追加写入、环形缓冲区、分页读取和崩溃恢复。
+    """
+
+    @pytest.fixture(autouse=True)
+    def _setup(self, test_keys):
+        """让 CryptoManager 使用测试密钥"""
+        self.crypto_manager = CryptoManager()
+
+    def test_append_and_page(self, tmp_path):
+        """
+        测试消息加密写入，内存只保留最近几条，更早的消息按页读取。
+        """
+        log = ChatLog("s1", str(tmp_path), self.crypto_manager, ring_size=3)
+        for i in range(10):
+            assert log.append("user" if i % 2 == 0 else "ai", f"消息{i}") == i
+        assert len(log) == 10
+        assert [m["content"] for m in log.recent()] == ["消息7", "消息8", "消息9"]
+        assert [m["content"] for m in log.load_page(before=7, count=4)] == [
+            "消息3",
+            "消息4",
+            "消息5",
+            "消息6",
+        ]
+        assert [m["content"] for m in log.load_page(before=2, count=4)] == [
+            "消息0",
+            "消息1",
+        ]
+        assert [m["content"] for m in log.load_page(count=2)] == ["消息8", "消息9"]
+        log.close()
+        with open(log.path, "rb") as f:
+            assert "消息".encode("utf-8") not in f.read()
+
+    def test_reopen_and_truncated_tail(self, tmp_path):
+        """
+        测试重新打开后恢复最近消息和摘要，末尾写了一半的记录被截掉。
+        """
+        log = ChatLog("s1", str(tmp_path), self.crypto_manager, ring_size=2)
+        log.append("user", "你好")
+        log.append("ai", "你好呀")
+        log.save_summary("打了招呼")
+        log.close()
+        with open(log.path, "ab") as f:
+            f.write(b"\x00\x00\x01\x00partial")
+
+        log = ChatLog("s1", str(tmp_path), self.crypto_manager, ring_size=2)
+        assert len(log) == 2
+        assert [m["content"] for m in log.recent()] == ["你好", "你好呀"]
+        assert log.load_summary() == "打了招呼"
+        assert log.append("user", "在吗") == 2
+        log.close()
+        assert ChatLog.list_sessions(str(tmp_path)) == ["s1"]
+
+    def test_corrupted_recent_record_is_kept(self, tmp_path):
+        """
+        测试最近的记录中有无法解密的记录时打开不会失败，也不会删除任何记录，
+        该条以占位消息代替。
+        """
+        log = ChatLog("s1", str(tmp_path), self.crypto_manager, ring_size=5)
+        log.append("user", "你好")
+        log.append("ai", "你好呀")
+        log.close()
+        with open(log.path, "ab") as f:
+            f.write(b"\x00\x00\x00\x07garbage")
+        size = os.path.getsize(log.path)
+
+        log = ChatLog("s1", str(tmp_path), self.crypto_manager, ring_size=5)
+        assert len(log) == 3
+        assert os.path.getsize(log.path) == size
+        recent = log.recent()
+        assert [m["content"] for m in recent[:2]] == ["你好", "你好呀"]
+        assert recent[2]["corrupted"] is True
+        assert recent[2]["content"] == CORRUPTED_CONTENT
+        assert log.append("user", "在吗") == 3
+        log.close()
+
+    def test_corrupted_old_record_is_replaced_by_placeholder(self, tmp_path):
+        """
+        测试分页读取较早的消息时无法解密的记录以占位消息代替，序号保持对齐。
+        """
+        log = ChatLog("s1", str(tmp_path), self.crypto_manager, ring_size=1)
+        for i in range(3):
+            log.append("user", f"消息{i}")
+        offset = log._offsets[1]
+        log.close()
+        with open(log.path, "r+b") as f:
+            f.seek(offset + 20)
+            f.write(b"\xff\xff")
+
+        log = ChatLog("s1", str(tmp_path), self.crypto_manager, ring_size=1)
+        assert len(log) == 3
+        page = log.load_page(before=2)
+        assert [m["content"] for m in page] == ["消息0", CORRUPTED_CONTENT]
+        assert page[1]["corrupted"] is True
+        log.close()
+
+    def test_corrupted_summary_returns_none(self, tmp_path):
+        """
+        测试摘要无法解密时 load_summary 返回 None 而不是抛出异常。
+        """
+        log = ChatLog("s1", str(tmp_path), self.crypto_manager)
+        log.save_summary("摘要")
+        with open(log.summary_path, "wb") as f:
+            f.write(b"garbage")
+        assert log.load_summary() is None
+        log.close()
@@ -1,8 +1,13 @@
 import os
 import pickle
+import threading
 from unittest.mock import patch
+
+import pytest
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives.asymmetric import rsa
-from managers.crypto_manager import CryptoManager
+from managers.crypto_manager import CryptoManager, VAULT_HEADER
+from managers.key_ring import key_ring
 
 
 class TestCryptoManager:
@@ -10,35 +15,14 @@ class TestCryptoManager:
     测试 CryptoManager 类的功能，包括密钥生成、加载、加密和解密。
     """
 
-    def setup_method(self):
+    @pytest.fixture(autouse=True)
+    def _setup(self, test_keys):
         """
         测试前的初始化操作。
-        创建测试密钥存储目录，并初始化 CryptoManager 实例。
-        如果密钥不存在，则生成密钥。
-        """
-        self.test_dir = os.path.abspath("./tests/mock_data/test_keys")
-        print(f"Test directory: {self.test_dir}")  # 打印路径，确认是否正确
-
-        os.makedirs(self.test_dir, exist_ok=True)
-
-        # Mock _get_key_paths 方法以使用测试路径
-        patcher = patch.object(
-            CryptoManager,
-            "_get_key_paths",
-            return_value=(
-                os.path.join(self.test_dir, "public_key.pem"),
-                os.path.join(self.test_dir, "private_key.pem"),
-            ),
-        )
-        self._patcher = patcher
-        patcher.start()
+        让 CryptoManager 使用临时目录中的测试密钥。
+        """
         self.crypto_manager = CryptoManager()
 
-        # 如果密钥不存在，则生成密钥
-        public_key_path, private_key_path = self.crypto_manager._get_key_paths()
-        if not (os.path.exists(public_key_path) and os.path.exists(private_key_path)):
-            self.crypto_manager.generate_rsa_keys()
-
     def test_generate_rsa_keys(self):
         """
         测试生成 RSA 密钥对。
@@ -84,3 +68,132 @@ class TestCryptoManager:
         ciphertext = self.crypto_manager.encrypt_data(serialized_data)
         plaintext = pickle.loads(self.crypto_manager.decrypt_data(ciphertext))
         assert plaintext == data
+
+    def test_vault_ciphertext_has_header(self):
+        """
+        测试保险库模式下的密文格式。
+        验证密文带有版本头，且不再需要迁移。
+        """
+        self.crypto_manager.vault_mode = True
+        ciphertext = self.crypto_manager.encrypt_data(b"vault data")
+        assert ciphertext.startswith(VAULT_HEADER)
+        assert not self.crypto_manager.needs_migration(ciphertext)
+        assert self.crypto_manager.decrypt_data(ciphertext) == b"vault data"
+
+    def test_vault_ciphertext_tampered(self):
+        """
+        测试保险库密文被篡改时解密失败。
+        """
+        self.crypto_manager.vault_mode = True
+        ciphertext = bytearray(self.crypto_manager.encrypt_data(b"vault data"))
+        ciphertext[-1] ^= 0x01
+        with pytest.raises(InvalidTag):
+            self.crypto_manager.decrypt_data(bytes(ciphertext))
+
+    def test_decrypt_legacy_ciphertext(self):
+        """
+        测试旧版密文（RSA 密钥 + IV + CBC 密文）仍可解密，并被识别为需要迁移。
+        """
+        legacy = self.crypto_manager._encrypt_legacy(b"legacy data")
+        assert not legacy.startswith(VAULT_HEADER)
+        assert self.crypto_manager.needs_migration(legacy)
+        assert self.crypto_manager.decrypt_data(legacy) == b"legacy data"
+
+    def test_data_key_survives_lock(self):
+        """
+        测试丢弃会话数据密钥后，重新解包得到的仍是同一个数据密钥。
+        """
+        ciphertext = self.crypto_manager._encrypt_vault(b"locked data")
+        data_key = self.crypto_manager.load_data_key()
+        self.crypto_manager.lock()
+        assert self.crypto_manager.load_data_key() == data_key
+        assert self.crypto_manager.decrypt_data(ciphertext) == b"locked data"
+
+    def test_key_ring_shared_across_instances(self):
+        """
+        测试密钥环在多个 CryptoManager 实例间共享已解析的密钥。
+        """
+        public_key, private_key = self.crypto_manager.load_rsa_keys()
+        other_public_key, other_private_key = CryptoManager().load_rsa_keys()
+        assert other_public_key is public_key
+        assert other_private_key is private_key
+
+    def test_concurrent_first_load_generates_one_key_pair(self, test_keys):
+        """
+        测试多个线程同时首次加载密钥时只生成一对密钥，所有线程得到同一对密钥。
+        """
+        for name in ("public_key.pem", "private_key.pem"):
+            os.remove(test_keys / name)
+        key_ring.invalidate(self.crypto_manager._get_key_paths())
+
+        barrier = threading.Barrier(4)
+        results = []
+
+        def load():
+            barrier.wait()
+            results.append(CryptoManager().load_rsa_keys())
+
+        with patch.object(
+            rsa, "generate_private_key", wraps=rsa.generate_private_key
+        ) as generate:
+            threads = [threading.Thread(target=load) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert generate.call_count == 1
+        assert len(results) == 4
+        assert all(keys[1] is results[0][1] for keys in results)
+
+    def test_rotate_rsa_keys(self, test_keys):
+        """
+        测试轮换 RSA 密钥对后，密钥环失效且保险库密文仍可解密。
+        """
+        self.crypto_manager.vault_mode = True
+        ciphertext = self.crypto_manager.encrypt_data(b"rotated data")
+        _, old_private_key = self.crypto_manager.load_rsa_keys()
+
+        self.crypto_manager.rotate_rsa_keys([ciphertext])
+        self.crypto_manager.lock()
+
+        _, new_private_key = self.crypto_manager.load_rsa_keys()
+        assert new_private_key is not old_private_key
+        assert self.crypto_manager.decrypt_data(ciphertext) == b"rotated data"
+        assert sorted(os.listdir(test_keys)) == [
+            "data_key.bin",
+            "private_key.pem",
+            "public_key.pem",
+        ]
+
+    def test_rotate_rsa_keys_refuses_legacy(self, test_keys):
+        """
+        测试仍有旧版格式的密文时拒绝轮换，密钥保持不变。
+        """
+        legacy = self.crypto_manager._encrypt_legacy(b"legacy data")
+        _, private_key = self.crypto_manager.load_rsa_keys()
+
+        with pytest.raises(ValueError):
+            self.crypto_manager.rotate_rsa_keys([legacy])
+        assert self.crypto_manager.load_rsa_keys()[1] is private_key
+        assert self.crypto_manager.decrypt_data(legacy) == b"legacy data"
+
+    @pytest.mark.parametrize("committed", [True, False])
+    def test_rotate_rsa_keys_interrupted(self, test_keys, committed):
+        """
+        测试轮换在替换文件中途崩溃后，下次加载密钥时完成（已提交）或撤销（未提交）轮换。
+        """
+        self.crypto_manager.vault_mode = True
+        ciphertext = self.crypto_manager.encrypt_data(b"rotated data")
+
+        # 模拟崩溃：已提交时只有私钥完成了替换，未提交时还没有写入提交标记
+        with patch.object(self.crypto_manager, "_recover_rotation"):
+            self.crypto_manager.rotate_rsa_keys([ciphertext])
+        if committed:
+            os.replace(test_keys / "private_key.pem.new", test_keys / "private_key.pem")
+        else:
+            os.remove(test_keys / "rotation.commit")
+
+        key_ring.invalidate(self.crypto_manager._get_key_paths())
+        self.crypto_manager.lock()
+        assert self.crypto_manager.decrypt_data(ciphertext) == b"rotated data"
+        assert not any(name.endswith(".new") for name in os.listdir(test_keys))
@@ -0,0 +1,62 @@
+import time
+
+from managers.diary_cache import DiaryCache, estimate_diary_size
+from models import Diary
+
+
+class TestDiaryCache:
+    """
+    测试 DiaryCache 类的功能，包括 LRU 淘汰、内存预算、版本校验和空闲清空。
+    """
+
+    def test_hit_miss_and_version(self):
+        """
+        测试命中、未命中计数，版本号变化时视为未命中。
+        """
+        cache = DiaryCache(idle_timeout=0)
+        diary = Diary(date="2025-03-23", content="内容")
+        assert cache.get("2025-03-23", 1) is None
+        cache.put("2025-03-23", diary, 1)
+        assert cache.get("2025-03-23", 1) == diary
+        assert cache.get("2025-03-23", 2) is None
+        assert cache.get("2025-03-23", 1) is None
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 3, 0)
+
+    def test_returns_copies(self):
+        """
+        测试缓存返回副本，调用方修改不会污染缓存。
+        """
+        cache = DiaryCache(idle_timeout=0)
+        cache.put("2025-03-23", Diary(date="2025-03-23", content="原文"))
+        cache.get("2025-03-23").content = "被修改"
+        assert cache.get("2025-03-23").content == "原文"
+
+    def test_lru_eviction_by_entries_and_bytes(self):
+        """
+        测试按条目数和内存预算淘汰最久未使用的条目。
+        """
+        diaries = [Diary(date=f"2025-03-0{i}", content="x" * 100) for i in range(1, 5)]
+        cache = DiaryCache(max_entries=2, idle_timeout=0)
+        for diary in diaries[:3]:
+            cache.put(diary.date, diary)
+            cache.get(diaries[0].date)
+        assert cache.get(diaries[1].date) is None
+        assert cache.get(diaries[0].date) is not None
+        assert cache.stats()["evictions"] == 1
+
+        size = estimate_diary_size(diaries[0])
+        cache = DiaryCache(max_bytes=size * 2, idle_timeout=0)
+        for diary in diaries:
+            cache.put(diary.date, diary)
+        assert cache.stats()["entries"] == 2
+        assert cache.stats()["bytes"] <= size * 2
+
+    def test_idle_timeout_clears_plaintext(self):
+        """
+        测试空闲超时后自动清空缓存。
+        """
+        cache = DiaryCache(idle_timeout=0.05)
+        cache.put("2025-03-23", Diary(date="2025-03-23", content="内容"))
+        time.sleep(0.2)
+        assert cache.stats()["entries"] == 0
@@ -0,0 +1,65 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from managers.config_manager import ConfigManager
+from managers.diary_manager import DiaryManager
+from models import Config, Diary
+
+DATES = ["2025-01-05", "2025-02-24", "2025-03-15", "2025-03-30", "2025-04-03"]
+
+
+@pytest.mark.usefixtures("test_keys")
+class TestDiaryManager:
+    """
+    测试 DiaryManager 类的功能，包括缓存和批量加载。
+    """
+
+    def _make_manager(self, tmp_path, **config):
+        """使用临时日记目录创建 DiaryManager，并写入几篇日记"""
+        config = Config(diary_path=str(tmp_path / "diary"), **config).model_dump()
+        with patch.object(ConfigManager, "_load_config", return_value=config):
+            diary_manager = DiaryManager()
+        for date in DATES:
+            diary_manager.save_diary(Diary(date=date, content=f"内容 {date}"))
+        return diary_manager
+
+    def test_load_hits_cache_after_save(self, tmp_path):
+        """
+        测试保存后的日记直接从缓存读取，删除后缓存失效。
+        """
+        diary_manager = self._make_manager(tmp_path)
+        assert diary_manager.load_diary(DATES[0]).content == f"内容 {DATES[0]}"
+        assert diary_manager.cache_stats()["hits"] == 1
+
+        assert diary_manager.delete_diary(DATES[0])
+        assert diary_manager.load_diary(DATES[0]) is None
+
+    def test_iter_diaries_in_date_order(self, tmp_path):
+        """
+        测试流式遍历按日期顺序产出，并支持日期范围和倒序。
+        """
+        diary_manager = self._make_manager(tmp_path, diary_cache_size=0)
+        assert [d.date for d in diary_manager.iter_diaries()] == DATES
+        assert [
+            d.date for d in diary_manager.iter_diaries("2025-02-01", "2025-03-30", True)
+        ] == ["2025-03-30", "2025-03-15", "2025-02-24"]
+        assert diary_manager.get_all_diaries_str() == [
+            str(diary_manager.load_diary(date)) for date in reversed(DATES)
+        ]
+
+    def test_load_many_and_cancel(self, tmp_path):
+        """
+        测试批量加载保持传入顺序、跳过不存在的日期，并可通过事件取消。
+        """
+        diary_manager = self._make_manager(tmp_path, diary_cache_size=0)
+        dates = [DATES[3], "2024-01-01", DATES[1]]
+        assert list(diary_manager.load_many(dates)) == [DATES[3], DATES[1]]
+
+        cancel_event = threading.Event()
+        loaded = []
+        for diary in diary_manager.iter_diaries(cancel_event=cancel_event):
+            loaded.append(diary.date)
+            cancel_event.set()
+        assert loaded == DATES[:1]
@@ -0,0 +1,108 @@
+import pytest
+
+from managers.crypto_manager import CryptoManager
+from managers.diary_storage import FileDiaryStorage
+from managers.sqlite_diary_storage import (
+    SqliteDiaryStorage,
+    count_words,
+    migrate_to_sqlite,
+)
+from models import Diary
+
+
+class TestSqliteDiaryStorage:
+    """
+    测试 SqliteDiaryStorage 类的功能，包括保存、加载、删除、范围查询和迁移。
+    """
+
+    @pytest.fixture(autouse=True)
+    def _setup(self, test_keys):
+        """让 CryptoManager 使用测试密钥"""
+        self.crypto_manager = CryptoManager()
+
+    def _make_storage(self, tmp_path, plain_metadata=True):
+        return SqliteDiaryStorage(
+            self.crypto_manager, str(tmp_path / "diary.db"), plain_metadata
+        )
+
+    def test_save_load_delete(self, tmp_path):
+        """
+        测试保存、加载和删除日记。
+        """
+        storage = self._make_storage(tmp_path)
+        diary = Diary(date="2025-03-23", content="今天天气很好", weather="晴")
+        assert storage.save_diary(diary)
+        assert storage.load_diary("2025-03-23") == diary
+        assert storage.delete_diary("2025-03-23")
+        assert storage.load_diary("2025-03-23") is None
+        assert not storage.delete_diary("2025-03-23")
+
+    def test_dates_use_index_order_and_range(self, tmp_path):
+        """
+        测试日期列表按时间倒序排列，范围查询为闭区间。
+        """
+        storage = self._make_storage(tmp_path)
+        for date in ["2025-01-05", "2025-03-15", "2025-02-24", "2025-04-03"]:
+            storage.save_diary(Diary(date=date, content=date))
+        assert storage.get_all_dates() == [
+            "2025-04-03",
+            "2025-03-15",
+            "2025-02-24",
+            "2025-01-05",
+        ]
+        assert storage.get_dates_between("2025-02-24", "2025-03-15") == [
+            "2025-03-15",
+            "2025-02-24",
+        ]
+        assert storage.get_dates_between(start="2025-03-16") == ["2025-04-03"]
+
+    def test_metadata_columns_indexed(self, tmp_path):
+        """
+        测试按元数据列排序时使用索引，不需要全表扫描。
+        """
+        storage = self._make_storage(tmp_path)
+        for column in ("create_time", "update_time", "size", "word_count"):
+            plan = storage._conn.execute(
+                f"EXPLAIN QUERY PLAN SELECT date FROM diaries ORDER BY {column}"
+            ).fetchall()
+            assert any(f"diaries_{column}" in row[-1] for row in plan)
+
+    def test_metadata_plain_and_encrypted(self, tmp_path):
+        """
+        测试元数据列以明文或加密形式保存时都能正确读取。
+        """
+        diary = Diary(
+            date="2025-03-23",
+            content="今天 read 了 2 本书",
+            create_time="2025-03-23 08:00:00",
+            update_time="2025-03-23 09:00:00",
+        )
+        expected = {
+            "create_time": "2025-03-23 08:00:00",
+            "update_time": "2025-03-23 09:00:00",
+            "size": len(diary.content.encode("utf-8")),
+            "word_count": count_words(diary.content),
+        }
+        for plain_metadata in (True, False):
+            storage = SqliteDiaryStorage(
+                self.crypto_manager,
+                str(tmp_path / f"diary_{plain_metadata}.db"),
+                plain_metadata,
+            )
+            storage.save_diary(diary)
+            assert storage.get_metadata("2025-03-23") == expected
+        assert count_words(diary.content) == 7
+
+    def test_migrate_from_directory(self, tmp_path):
+        """
+        测试从目录存储迁移到 SQLite 存储，已存在的日期不会重复迁移。
+        """
+        source = FileDiaryStorage(self.crypto_manager, str(tmp_path / "diary"))
+        for date in ["2025-03-15", "2025-02-24"]:
+            source.save_diary(Diary(date=date, content=f"内容 {date}"))
+
+        target = self._make_storage(tmp_path)
+        assert migrate_to_sqlite(source, target) == 2
+        assert migrate_to_sqlite(source, target) == 0
+        assert target.get_all_dates() == source.get_all_dates()
+        assert target.load_diary("2025-03-15") == source.load_diary("2025-03-15")
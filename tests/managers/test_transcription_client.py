@@ -0,0 +1,194 @@
+import json
+import socket
+import struct
+import threading
+import time
+
+from managers.transcription_client import (
+    TranscriptDecoder,
+    TranscriptionClient,
+    UtteranceAssembler,
+)
+
+
+class StubTranscriptionServer:
+    """
+    本地假转写服务：接受连接后依次发送给定的字节块，每块之间稍作停顿，
+    发送完毕后按 close_after_send 决定是否断开连接。
+    """
+
+    def __init__(self, chunks, close_after_send=False, port=0):
+        self.chunks = list(chunks)
+        self.close_after_send = close_after_send
+        self.connections = 0
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", port))
+        self._sock.listen()
+        self._sock.settimeout(0.1)
+        self.port = self._sock.getsockname()[1]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+        self._sock.close()
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._sock.accept()
+            except socket.timeout:
+                continue
+            self.connections += 1
+            with conn:
+                for chunk in self.chunks:
+                    conn.sendall(chunk)
+                    time.sleep(0.02)
+                if self.close_after_send:
+                    continue
+                while not self._stop.is_set():
+                    time.sleep(0.02)
+
+
+def run_client(client):
+    thread = threading.Thread(target=client.run, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestTranscriptDecoder:
+    """
+    测试分帧和增量解码。
+    """
+
+    def test_split_multibyte_characters(self):
+        """
+        测试被拆到两次读取中的多字节字符能正确解码。
+        """
+        data = "今天很开心\n".encode("utf-8")
+        decoder = TranscriptDecoder("line")
+        assert decoder.feed(data[:4]) == []
+        assert decoder.feed(data[4:]) == [("今天很开心", None)]
+
+        decoder = TranscriptDecoder("stream")
+        text = "".join(
+            t for chunk in (data[:4], data[4:]) for t, _ in decoder.feed(chunk)
+        )
+        assert text == "今天很开心\n"
+
+    def test_length_framing_and_json(self):
+        """
+        测试长度前缀分帧和 JSON 消息中的临时/最终结果。
+        """
+        payload = json.dumps({"text": "你好", "final": False}).encode("utf-8")
+        frame = struct.pack(">I", len(payload)) + payload
+        decoder = TranscriptDecoder("length")
+        assert decoder.feed(frame[:3]) == []
+        assert decoder.feed(frame[3:] + frame) == [("你好", False), ("你好", False)]
+
+
+class TestUtteranceAssembler:
+    """
+    测试片段合并为句子。
+    """
+
+    def test_fragments_are_coalesced(self):
+        """
+        测试纯文本片段在句末标点处合并成句，剩余部分超时后发出，匹配忽略规则的句子被丢弃。
+        """
+        assembler = UtteranceAssembler(utterance_timeout=1.0, ignore_patterns=["转写"])
+        assert assembler.feed("今天天气", None, 0.0) == []
+        assert assembler.feed("很好。我们去", None, 0.1) == ["今天天气很好。"]
+        assert assembler.poll(0.5) == []
+        assert assembler.poll(1.2) == ["我们去"]
+        assert assembler.feed("开始转写。", None, 2.0) == []
+
+    def test_partial_results_are_replaced(self):
+        """
+        测试临时结果只保留最新的一条，最终结果到达时发出。
+        """
+        assembler = UtteranceAssembler()
+        assert assembler.feed("今天", False, 0.0) == []
+        assert assembler.feed("今天天气", False, 0.1) == []
+        assert assembler.feed("今天天气很好", True, 0.2) == ["今天天气很好"]
+
+
+class TestTranscriptionClient:
+    """
+    使用本地假转写服务测试客户端的合并、背压和重连。
+    """
+
+    def test_backpressure_and_reconnect(self):
+        """
+        测试忙碌期间的句子被合并为一条，在空闲后发出；服务断开后客户端自动重连。
+        """
+        data = "第一句。第二句。".encode("utf-8")
+        chunks = [data[:5], data[5:13], data[13:] + "第三句！\n".encode("utf-8")]
+        received = []
+        with StubTranscriptionServer(chunks, close_after_send=True) as server:
+            client = TranscriptionClient(
+                port=server.port,
+                on_utterance=received.append,
+                framing="stream",
+                reconnect_delay=0.05,
+                poll_interval=0.05,
+            )
+            thread = run_client(client)
+            assert wait_for(lambda: received)
+            assert received[0] == "第一句。"
+            assert wait_for(lambda: server.connections >= 2)
+            assert received == ["第一句。"]
+
+            client.set_busy(False)
+            assert wait_for(lambda: len(received) == 2)
+            assert received[1].startswith("第二句。第三句！")
+            client.stop()
+            thread.join(2)
+        assert not thread.is_alive()
+
+    def test_disabled_client_drops_utterances(self):
+        """
+        测试关闭后收到的句子被直接丢弃。
+        """
+        received = []
+        with StubTranscriptionServer(["你好。\n".encode("utf-8")]) as server:
+            client = TranscriptionClient(
+                port=server.port, on_utterance=received.append, poll_interval=0.05
+            )
+            client.set_enabled(False)
+            thread = run_client(client)
+            assert wait_for(client.connected.is_set)
+            time.sleep(0.2)
+            client.stop()
+            thread.join(2)
+        assert received == []
+
+    def test_disabling_releases_busy(self):
+        """
+        测试关闭后重新开启时不再停留在忙碌状态，新的句子可以立即发出。
+        """
+        received = []
+        client = TranscriptionClient(on_utterance=received.append)
+        client._deliver("第一句。")
+        client._deliver("第二句。")
+        assert received == ["第一句。"]
+
+        client.set_enabled(False)
+        client.set_enabled(True)
+        client._deliver("第三句。")
+        assert received == ["第一句。", "第三句。"]
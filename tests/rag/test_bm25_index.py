@@ -0,0 +1,63 @@
+import pickle
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from rag.bm25_index import BM25Index, tokenize
+from rag.rag_retriever import RagRetriever
+from tests.mock_data.test_diary.diarys import diary_content_list
+
+
+class TestBM25Index:
+    """
+    测试 BM25 倒排索引的分词、增量更新以及与向量检索的融合。
+    """
+
+    def test_tokenize_mixed_text(self):
+        """
+        测试汉字切分为单字和二字组，字母数字按整词切分。
+        """
+        assert tokenize("张总, YouTube 2025") == ["张", "总", "张总", "youtube", "2025"]
+
+    def test_add_remove_and_replace(self):
+        """
+        测试文档的增删替换都会反映在检索结果中，且删除后槽位可复用。
+        """
+        index = BM25Index()
+        index.add("a", "张总叫我进办公室")
+        index.add("b", "邻居王阿姨养花")
+        assert [doc_id for doc_id, _ in index.search("王阿姨")] == ["b"]
+
+        index.remove("b")
+        assert index.search("王阿姨") == []
+        index.add("c", "王阿姨来看郁金香")
+        index.add("a", "今天休息")
+        assert len(index) == 2
+        assert [doc_id for doc_id, _ in index.search("王阿姨 张总")] == ["c"]
+
+        restored = pickle.loads(pickle.dumps(index))
+        assert restored.search("郁金香") == index.search("郁金香")
+
+    def test_hybrid_retrieval_finds_names(self):
+        """
+        测试向量检索给不出有效排序时，混合检索仍能按人名命中正确的日记。
+        """
+        retriever = RagRetriever(
+            diary_content_list, embedding_model=DeterministicFakeEmbedding(size=16)
+        )
+        for query, title in [("张总", "职场困境"), ("王阿姨", "园艺爱好")]:
+            doc = retriever.retrieve(query, k=1)[0]
+            assert title in doc.page_content
+            doc = retriever.retrieve(query, k=1, mode="lexical")[0]
+            assert title in doc.page_content
+
+    def test_prefilter_scores_only_candidates(self):
+        """
+        测试超过阈值后向量检索只在 BM25 候选中排序。
+        """
+        retriever = RagRetriever(
+            diary_content_list,
+            embedding_model=DeterministicFakeEmbedding(size=16),
+            prefilter_threshold=0,
+        )
+        docs = retriever.retrieve("豆豆", k=1, lexical_weight=0.0)
+        assert "宠物日常" in docs[0].page_content
@@ -0,0 +1,97 @@
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from models import Diary
+from rag.diary_chunker import DiaryChunker, split_sentences
+from rag.rag_retriever import RagRetriever
+from tests.mock_data.test_diary.diarys import diary_content_list
+
+
+class TestDiaryChunker:
+    """
+    测试日记按句切分为重叠段落，以及段落级别的索引和检索。
+    """
+
+    def test_split_sentences(self):
+        """
+        测试中英文句末标点、引号和换行的切分。
+        """
+        text = "标题\n他说：“好的。”然后走了！OK? yes"
+        assert split_sentences(text) == [
+            "标题",
+            "他说：“好的。”",
+            "然后走了！",
+            "OK?",
+            "yes",
+        ]
+
+    def test_passages_overlap_and_metadata(self):
+        """
+        测试段落不超过长度上限、相邻段落有重叠，并带有日期天气元数据，不含创建/修改时间。
+        """
+        chunker = DiaryChunker(max_chars=120, overlap_chars=60)
+        diary = Diary(
+            date="2025-04-12",
+            content=diary_content_list[5],
+            weather="晴",
+            note="记得施肥",
+            create_time="2025-04-12 21:00:00",
+        )
+        passages = chunker(diary)
+        assert len(passages) > 2
+        assert passages[-1].page_content == "2025-04-12 晴\n备注：记得施肥"
+        for i, passage in enumerate(passages):
+            assert passage.page_content.startswith("2025-04-12 晴\n")
+            assert "21:00" not in passage.page_content
+            assert passage.metadata == {
+                "source": "2025-04-12",
+                "date": "2025-04-12",
+                "weather": "晴",
+                "has_note": True,
+                "chunk": i,
+            }
+
+        bodies = chunker.split_text(diary.content)
+        assert all(len(body) <= 120 for body in bodies)
+        last_sentence = split_sentences(bodies[0])[-1]
+        assert bodies[1].startswith(last_sentence)
+
+    def test_long_sentence_is_hard_split(self):
+        """
+        测试没有标点的超长文本按字符切分并保留重叠。
+        """
+        bodies = DiaryChunker(max_chars=100, overlap_chars=20).split_text("字" * 250)
+        assert [len(body) for body in bodies] == [100, 100, 90]
+
+    def test_overlap_must_be_smaller_than_passage(self):
+        """
+        测试重叠长度不小于段落长度（硬切分无法前进）或为负数时拒绝创建。
+        """
+        for overlap_chars in (100, 150, -1):
+            with pytest.raises(ValueError):
+                DiaryChunker(max_chars=100, overlap_chars=overlap_chars)
+        DiaryChunker(max_chars=100, overlap_chars=0)
+
+    def test_retriever_replaces_all_passages(self):
+        """
+        测试检索返回命中的段落，重新保存日记时旧段落全部被替换。
+        """
+        chunker = DiaryChunker(max_chars=120, overlap_chars=40)
+        diary = Diary(date="2025-04-12", content=diary_content_list[5], weather="晴")
+        retriever = RagRetriever(
+            [chunker(diary)],
+            embedding_model=DeterministicFakeEmbedding(size=16),
+            ids=["2025-04-12"],
+        )
+        count = len(retriever.passage_ids["2025-04-12"])
+        assert retriever.vectorstore.index.ntotal == count > 1
+
+        doc = retriever.retrieve("王阿姨隔着栏杆指导我", k=1, mode="lexical")[0]
+        assert "栏杆" in doc.page_content
+        assert doc.metadata["source"] == "2025-04-12"
+
+        diary.content = "今天下雨，没有浇水。"
+        retriever.update_documents({"2025-04-12": chunker(diary)})
+        assert retriever.passage_ids == {"2025-04-12": ["2025-04-12#0"]}
+        assert retriever.vectorstore.index.ntotal == 1
+        assert len(retriever.bm25) == 1
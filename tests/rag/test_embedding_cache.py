@@ -0,0 +1,52 @@
+from rag.embedding_cache import CachedEmbeddings
+
+
+class TestCachedEmbeddings:
+    """
+    测试 CachedEmbeddings 的缓存命中、去重、淘汰和持久化。
+    """
+
+    def test_repeated_texts_are_embedded_once(self, recording_embedding):
+        """
+        测试重复文本（包括同一批次内的重复）只嵌入一次，且向量与原模型一致。
+        """
+        underlying = recording_embedding(size=8)
+        cached = CachedEmbeddings(underlying)
+        vectors = cached.embed_documents(["张总", "王阿姨", "张总"])
+        assert underlying.embedded == ["张总", "王阿姨"]
+        assert vectors[0] == vectors[2]
+        assert cached.embed_documents(["王阿姨"]) == [vectors[1]]
+        assert cached.embed_query("张总") == cached.embed_query("张总")
+        assert underlying.embedded == ["张总", "王阿姨", "张总"]
+
+        stats = cached.stats()
+        assert (stats["hits"], stats["misses"]) == (3, 3)
+        assert abs(vectors[0][0] - underlying.embed_query("张总")[0]) < 1e-6
+
+    def test_evicts_least_recently_used(self, recording_embedding):
+        """
+        测试超过条数上限时淘汰最久未使用的向量。
+        """
+        underlying = recording_embedding(size=8)
+        cached = CachedEmbeddings(underlying, max_entries=2)
+        cached.embed_documents(["a"])
+        cached.embed_documents(["b"])
+        cached.embed_documents(["a"])
+        cached.embed_documents(["c"])
+        assert cached.stats()["entries"] == 2
+        cached.embed_documents(["a", "b"])
+        assert underlying.embedded == ["a", "b", "c", "b"]
+
+    def test_persists_across_instances(self, tmp_path, recording_embedding):
+        """
+        测试缓存文件在重新打开后仍然有效。
+        """
+        cache_path = str(tmp_path / "embeddings.db")
+        underlying = recording_embedding(size=8)
+        first = CachedEmbeddings(underlying, cache_path=cache_path)
+        vector = first.embed_documents(["京都"])
+        first.close()
+
+        second = CachedEmbeddings(underlying, cache_path=cache_path)
+        assert second.embed_documents(["京都"]) == vector
+        assert underlying.embedded == ["京都"]
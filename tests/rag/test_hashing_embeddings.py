@@ -0,0 +1,43 @@
+import numpy as np
+
+from rag.hashing_embeddings import HashingEmbeddings
+from rag.rag_retriever import RagRetriever
+from tests.mock_data.test_diary.diarys import diary_content_list
+
+
+class TestHashingEmbeddings:
+    """
+    测试本地哈希嵌入的确定性、归一化和检索效果。
+    """
+
+    def test_deterministic_and_normalized(self):
+        """
+        测试同一文本的向量始终相同且为单位向量，空文本为零向量。
+        """
+        embedding = HashingEmbeddings(dim=256)
+        vectors = embedding.embed_array(["今天去了京都", "", "今天去了京都"])
+        assert vectors.shape == (3, 256)
+        assert np.allclose(vectors[0], vectors[2])
+        assert np.isclose(np.linalg.norm(vectors[0]), 1.0)
+        assert not vectors[1].any()
+        assert embedding.embed_query("今天去了京都") == vectors[0].tolist()
+
+    def test_batching_does_not_change_vectors(self):
+        """
+        测试分批向量化与逐条向量化结果一致。
+        """
+        batched = HashingEmbeddings(batch_size=2).embed_array(diary_content_list)
+        single = np.vstack(
+            [HashingEmbeddings().embed_array([text]) for text in diary_content_list]
+        )
+        assert np.allclose(batched, single)
+
+    def test_retrieves_mock_diaries_offline(self):
+        """
+        测试使用本地嵌入离线检索模拟日记。
+        """
+        retriever = RagRetriever(
+            diary_content_list, embedding_model=HashingEmbeddings()
+        )
+        doc = retriever.retrieve("张总叫我进办公室干什么？", k=1)[0]
+        assert "职场困境" in doc.page_content
@@ -0,0 +1,181 @@
+import threading
+
+from rag.llm_chat_with_history import LlmChatWithHistory
+
+
+class FakeGenerator:
+    """按调用顺序返回固定回复的假 LLM 生成器"""
+
+    def __init__(self, on_call=None):
+        self.prompts = []
+        self.on_call = on_call
+
+    def prompt_predict(self, prompt):
+        self.prompts.append(prompt)
+        if self.on_call:
+            self.on_call()
+        return f"回复{len(self.prompts)}"
+
+    def prompt_stream(self, prompt):
+        self.prompts.append(prompt)
+        for delta in ["今天", "去看了", "郁金香"]:
+            if self.on_call:
+                self.on_call()
+            yield delta
+
+
+class TestLlmChatWithHistory:
+    """
+    测试聊天管理类的阶段耗时统计和取消。
+    """
+
+    def test_records_history_and_timings(self):
+        """
+        测试正常处理时写入聊天记录并统计构造提示词和 LLM 调用耗时。
+        """
+        chat = LlmChatWithHistory(FakeGenerator())
+        timings = {}
+        assert (
+            chat.process_input("你好", context="2025-04-12 晴\n种花", timings=timings)
+            == "回复1"
+        )
+        assert set(timings) == {"prompt", "llm"}
+        assert [m["content"] for m in chat.chat_history] == ["你好", "回复1"]
+
+    def test_cancelled_request_is_not_recorded(self):
+        """
+        测试取消后不调用 LLM；LLM 调用期间被取消时丢弃回复，且都不写入聊天记录。
+        """
+        cancel_event = threading.Event()
+        cancel_event.set()
+        generator = FakeGenerator()
+        chat = LlmChatWithHistory(generator)
+        assert chat.process_input("你好", cancel_event=cancel_event) is None
+        assert generator.prompts == []
+
+        cancel_event = threading.Event()
+        chat = LlmChatWithHistory(FakeGenerator(on_call=cancel_event.set))
+        assert chat.process_input("你好", cancel_event=cancel_event) is None
+        assert list(chat.chat_history) == []
+
+    def test_cancelled_while_waiting_for_history_is_not_recorded(self):
+        """
+        测试等待写入聊天记录期间被取消时不写入，也不记录序号。
+        """
+        called, go = threading.Event(), threading.Event()
+
+        def on_call():
+            called.set()
+            go.wait(5)
+
+        chat = LlmChatWithHistory(FakeGenerator(on_call=on_call))
+        cancel_event = threading.Event()
+        recorded = {}
+        results = []
+        worker = threading.Thread(
+            target=lambda: results.append(
+                chat.process_input("你好", cancel_event=cancel_event, recorded=recorded)
+            )
+        )
+        worker.start()
+        assert called.wait(5)
+        with chat._history_lock:
+            go.set()
+            cancel_event.set()
+        worker.join(5)
+        assert results == [None]
+        assert recorded == {}
+        assert list(chat.chat_history) == []
+
+    def test_stream_records_full_message(self):
+        """
+        测试流式生成时逐段回调，聊天记录中保存完整回答。
+        """
+        chat = LlmChatWithHistory(FakeGenerator())
+        deltas = []
+        timings = {}
+        response = chat.process_input(
+            "做了什么", on_delta=deltas.append, timings=timings
+        )
+        assert response == "今天去看了郁金香"
+        assert deltas == ["今天", "去看了", "郁金香"]
+        assert timings["first_token"] <= timings["llm"]
+        assert chat.chat_history[-1] == {"role": "ai", "content": response}
+
+    def test_stream_cancelled_midway(self):
+        """
+        测试流式生成中途取消时停止回调且不写入聊天记录。
+        """
+        cancel_event = threading.Event()
+        deltas = []
+
+        def on_delta(delta):
+            deltas.append(delta)
+            cancel_event.set()
+
+        chat = LlmChatWithHistory(FakeGenerator())
+        assert (
+            chat.process_input("你好", cancel_event=cancel_event, on_delta=on_delta)
+            is None
+        )
+        assert deltas == ["今天"]
+        assert list(chat.chat_history) == []
+
+    def test_summary_runs_in_background(self):
+        """
+        测试摘要在回答之后于后台生成：生成期间对话不被阻塞、不重复发起摘要，
+        完成后下一轮提示词带上最新的摘要。
+        """
+        release = threading.Event()
+        summary_prompts = []
+
+        class SlowSummaryGenerator(FakeGenerator):
+            def prompt_predict(self, prompt):
+                if "提炼为一条摘要" in prompt:
+                    summary_prompts.append(prompt)
+                    release.wait(5)
+                    return "摘要：聊了种花"
+                return super().prompt_predict(prompt)
+
+        generator = SlowSummaryGenerator()
+        chat = LlmChatWithHistory(generator, summary_interval=2)
+        chat.process_input("你好")
+        assert not chat.wait_for_summary(timeout=0.05)
+        chat.process_input("种了什么")
+        assert list(chat.summaries) == []
+        assert len(summary_prompts) == 1
+        assert "摘要：聊了种花" not in generator.prompts[-1]
+
+        release.set()
+        assert chat.wait_for_summary(timeout=5)
+        assert list(chat.summaries) == [
+            {"role": "summary", "content": "摘要：聊了种花"}
+        ]
+        chat.process_input("还有呢")
+        assert "摘要：聊了种花" in generator.prompts[-1]
+
+    def test_history_is_bounded_and_persisted(self, tmp_path):
+        """
+        测试内存中只保留最近的消息，完整记录写入 chat_log，重新打开后恢复最近的消息。
+        """
+        from managers.chat_log import ChatLog
+
+        log = ChatLog("s1", str(tmp_path))
+        chat = LlmChatWithHistory(FakeGenerator(), chat_log=log, max_history=4)
+        recorded = {}
+        for i in range(5):
+            chat.process_input(f"问题{i}", recorded=recorded)
+        assert len(chat.chat_history) == 4
+        assert chat.message_count == len(log) == 10
+        assert recorded == {"user": 8, "ai": 9}
+        first = log.load_page(before=1, count=1)[0]
+        assert (first["role"], first["content"]) == ("user", "问题0")
+        log.close()
+
+        log = ChatLog("s1", str(tmp_path))
+        restored = LlmChatWithHistory(FakeGenerator(), chat_log=log, max_history=4)
+        assert [m["content"] for m in restored.get_recent_messages(2)] == [
+            "问题4",
+            "回复5",
+        ]
+        assert restored.message_count == 10
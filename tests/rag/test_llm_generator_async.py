@@ -0,0 +1,169 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pytest
+
+from rag.llm_generator import LLMGenerator
+
+
+class StubOpenAIServer(ThreadingHTTPServer):
+    """
+    本地 OpenAI 兼容的假服务，只实现 /v1/chat/completions。
+    回答为“回答：”加上最后一条消息，可设置响应延迟和前若干次请求返回 429。
+    """
+
+    daemon_threads = True
+
+    def __init__(self, delay=0.0, rate_limited=0):
+        super().__init__(("127.0.0.1", 0), StubOpenAIHandler)
+        self.delay = delay
+        self.rate_limited = rate_limited
+        self.requests = []  # 收到的提示词
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_port}/v1"
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["messages"][-1]["content"]
+        server = self.server
+        with server.lock:
+            server.requests.append(prompt)
+            limited = server.rate_limited > 0
+            server.rate_limited -= limited
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delay)
+            if limited:
+                self._send(429, {"error": {"message": "rate limited"}})
+                return
+            self._send(
+                200,
+                {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": body["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {
+                                "role": "assistant",
+                                "content": f"回答：{prompt}",
+                            },
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": 1,
+                        "completion_tokens": 1,
+                        "total_tokens": 2,
+                    },
+                },
+            )
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端已超时断开
+
+
+class TestLLMGeneratorAsync:
+    """
+    使用本地假服务测试 LLMGenerator 异步接口的并发上限、请求合并、退避重试和超时。
+    """
+
+    @pytest.fixture(autouse=True)
+    def _api_key(self, monkeypatch):
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    def _make_generator(self, server, **kwargs):
+        return LLMGenerator(base_url=server.base_url, backoff_base=0.01, **kwargs)
+
+    def test_concurrency_is_limited(self):
+        """
+        测试同时进行的请求数不超过 max_concurrency，且每个回答对应各自的提示词。
+        """
+        with StubOpenAIServer(delay=0.1) as server:
+            generator = self._make_generator(server, max_concurrency=2)
+
+            async def main():
+                prompts = [f"问题{i}" for i in range(5)]
+                return await asyncio.gather(
+                    *(generator.aprompt_predict(p) for p in prompts)
+                )
+
+            answers = asyncio.run(main())
+        assert answers == [f"回答：问题{i}" for i in range(5)]
+        assert server.max_active <= 2
+        assert len(server.requests) == 5
+
+    def test_identical_prompts_are_coalesced(self):
+        """
+        测试相同提示词的并发调用只向服务端请求一次。
+        """
+        with StubOpenAIServer(delay=0.1) as server:
+            generator = self._make_generator(server)
+
+            async def main():
+                return await asyncio.gather(
+                    generator.adiary_generate_predict("出门散步"),
+                    generator.adiary_generate_predict("出门散步"),
+                    generator.aprompt_predict("别的问题"),
+                )
+
+            first, second, other = asyncio.run(main())
+        assert first == second
+        assert other == "回答：别的问题"
+        assert len(server.requests) == 2
+
+    def test_retries_rate_limited_requests(self):
+        """
+        测试遇到 429 时退避重试，直到请求成功。
+        """
+        with StubOpenAIServer(rate_limited=2) as server:
+            generator = self._make_generator(server, max_retries=3)
+            answer = asyncio.run(generator.aqa_context_predict("张总是谁", "同事"))
+        assert answer.startswith("回答：")
+        assert len(server.requests) == 3
+
+    def test_request_timeout(self):
+        """
+        测试请求超过 request_timeout 后重试，重试用尽时抛出超时异常。
+        """
+        with StubOpenAIServer(delay=0.5) as server:
+            generator = self._make_generator(server, request_timeout=0.1, max_retries=1)
+            with pytest.raises((TimeoutError, openai.APITimeoutError)):
+                asyncio.run(generator.aprompt_predict("问题"))
+        assert len(server.requests) == 2
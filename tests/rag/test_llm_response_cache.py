@@ -0,0 +1,93 @@
+from unittest.mock import patch
+
+import pytest
+
+from managers.crypto_manager import CryptoManager
+from rag.llm_generator import LLMGenerator
+from rag.llm_response_cache import LlmResponseCache
+
+
+class TestLlmResponseCache:
+    """
+    测试 LlmResponseCache 的键规范化、加密持久化、过期、淘汰，以及 LLMGenerator 的按方法缓存。
+    """
+
+    @pytest.fixture(autouse=True)
+    def _setup(self, test_keys):
+        """让 CryptoManager 使用测试密钥"""
+        self.crypto_manager = CryptoManager()
+
+    def test_key_normalizes_prompt(self):
+        """
+        测试只有空白和换行符不同的提示词得到相同的键，模型或参数不同时键不同。
+        """
+        key = LlmResponseCache.make_key("gpt", {"temperature": 0}, "你好\n世界")
+        assert key == LlmResponseCache.make_key(
+            "gpt", {"temperature": 0}, "  你好  \r\n世界\n"
+        )
+        assert key != LlmResponseCache.make_key("gpt", {"temperature": 0}, "你好世界")
+        assert key != LlmResponseCache.make_key("gpt", {"temperature": 1}, "你好\n世界")
+        assert key != LlmResponseCache.make_key(
+            "gpt-4", {"temperature": 0}, "你好\n世界"
+        )
+
+    def test_encrypted_and_persists_across_instances(self, tmp_path):
+        """
+        测试回答加密保存，重新打开缓存文件后仍能命中。
+        """
+        cache_path = str(tmp_path / "llm_cache.db")
+        first = LlmResponseCache(cache_path, crypto_manager=self.crypto_manager)
+        first.put("k", "今天和张总吃了午饭")
+        first.close()
+        with open(cache_path, "rb") as f:
+            assert "张总".encode("utf-8") not in f.read()
+
+        second = LlmResponseCache(cache_path, crypto_manager=self.crypto_manager)
+        assert second.get("k", "qa_context_predict") == "今天和张总吃了午饭"
+        assert second.get("missing", "qa_context_predict") is None
+        stats = second.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+        assert stats["methods"]["qa_context_predict"] == {"hits": 1, "misses": 1}
+
+    def test_expires_and_evicts(self):
+        """
+        测试过期条目视为未命中，超过条数上限时淘汰最久未使用的条目。
+        """
+        cache = LlmResponseCache(ttl=60, max_entries=2)
+        with patch("rag.llm_response_cache.time.time", return_value=1000.0):
+            cache.put("a", "A")
+        with patch("rag.llm_response_cache.time.time", return_value=1001.0):
+            cache.put("b", "B")
+        with patch("rag.llm_response_cache.time.time", return_value=1002.0):
+            assert cache.get("a") == "A"
+            cache.put("c", "C")
+        assert cache.stats()["entries"] == 2
+        with patch("rag.llm_response_cache.time.time", return_value=1003.0):
+            assert cache.get("b") is None
+            assert cache.get("a") == "A"
+        with patch("rag.llm_response_cache.time.time", return_value=1100.0):
+            assert cache.get("a") is None
+        assert cache.stats()["entries"] == 1
+
+    def test_generator_caches_enabled_methods_only(self, monkeypatch):
+        """
+        测试 LLMGenerator 只为启用的方法查询缓存，其余调用照常请求 LLM。
+        """
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        cache = LlmResponseCache()
+        generator = LLMGenerator(
+            response_cache=cache, cache_methods=["qa_context_predict"]
+        )
+        prompts = []
+
+        def fake_predict(prompt):
+            prompts.append(prompt)
+            return f"回答{len(prompts)}"
+
+        generator.prompt_predict = fake_predict
+        assert generator.qa_context_predict("张总是谁", "同事") == "回答1"
+        assert generator.qa_context_predict("张总是谁", "同事") == "回答1"
+        assert generator.diary_generate_predict("出门") == "回答2"
+        assert generator.diary_generate_predict("出门") == "回答3"
+        stats = generator.cache_stats()
+        assert (stats["hits"], stats["misses"]) == (1, 1)
@@ -0,0 +1,98 @@
+from unittest.mock import patch
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from models import Diary, DiaryFilter
+from rag.diary_chunker import DiaryChunker
+from rag.metadata_index import MetadataIndex
+from rag.rag_retriever import RagRetriever
+from tests.mock_data.test_diary.diarys import diary_content_list
+
+# 模拟日记的日期和天气，顺序与 diary_content_list 一致
+MOCK_META = [
+    ("2025-03-15", "晴", None),
+    ("2025-02-24", "雨", "裁员传闻"),
+    ("2025-01-05", "阳光明媚", None),
+    ("2025-04-03", "多云", None),
+    ("2025-03-30", "阴转晴", "豆豆打了疫苗"),
+    ("2025-04-12", "晴", None),
+]
+
+
+def _mock_diaries():
+    return [
+        Diary(date=date, content=content, weather=weather, note=note)
+        for (date, weather, note), content in zip(MOCK_META, diary_content_list)
+    ]
+
+
+class TestMetadataIndex:
+    """
+    测试元数据索引的过滤条件解析，以及检索器按元数据预过滤。
+    """
+
+    def setup_method(self):
+        self.index = MetadataIndex()
+        for date, weather, note in MOCK_META:
+            self.index.add(
+                date, {"date": date, "weather": weather, "has_note": bool(note)}
+            )
+
+    def test_resolve_filters(self):
+        """
+        测试日期范围、星期、天气关键词、备注条件及其组合。
+        """
+        resolve = self.index.resolve
+        assert resolve(DiaryFilter(start_date="2025-03-01", end_date="2025-03-31")) == {
+            "2025-03-15",
+            "2025-03-30",
+        }
+        assert resolve(DiaryFilter(end_date="2025-02-24")) == {
+            "2025-01-05",
+            "2025-02-24",
+        }
+        assert resolve(DiaryFilter(weekdays=[5, 6])) == {
+            "2025-01-05",
+            "2025-03-15",
+            "2025-03-30",
+            "2025-04-12",
+        }
+        assert resolve(DiaryFilter(weather=["晴"], has_note=False)) == {
+            "2025-03-15",
+            "2025-04-12",
+        }
+        assert resolve(DiaryFilter(start_date="2025-04-01", weather=["雨"])) == set()
+        assert len(resolve(DiaryFilter())) == 6
+
+    def test_remove_and_replace(self):
+        """
+        测试删除和替换元数据后过滤结果随之更新。
+        """
+        self.index.remove("2025-04-12")
+        self.index.add("2025-03-15", {"date": "2025-03-15", "weather": "雪"})
+        self.index.add("undated", {"date": None})
+        assert len(self.index) == 5
+        assert self.index.resolve(DiaryFilter(weather=["晴"])) == {"2025-03-30"}
+        assert self.index.resolve(DiaryFilter(weather=["雪"])) == {"2025-03-15"}
+
+    def test_retrieve_with_filters(self):
+        """
+        测试检索只返回过滤后日记中的段落，候选较多时使用 FAISS 的 ID 过滤。
+        """
+        retriever = RagRetriever(
+            [DiaryChunker()(diary) for diary in _mock_diaries()],
+            embedding_model=DeterministicFakeEmbedding(size=16),
+            ids=[date for date, _, _ in MOCK_META],
+        )
+        filters = {"start_date": "2025-03-01", "end_date": "2025-03-31"}
+        docs = retriever.retrieve("邻居", k=10, filters=filters)
+        assert docs
+        assert {doc.metadata["source"] for doc in docs} <= {"2025-03-15", "2025-03-30"}
+
+        with patch("rag.rag_retriever._RECONSTRUCT_LIMIT", 0):
+            docs = retriever.retrieve(
+                "今天", k=3, mode="vector", filters=DiaryFilter(weekdays=[0])
+            )
+        assert [doc.metadata["source"] for doc in docs] == ["2025-02-24"] * len(docs)
+
+        assert retriever.retrieve("邻居", filters={"weather": ["雪"]}) == []
@@ -0,0 +1,122 @@
+from rag.prompt_packer import ApproximateEncoding, PromptPacker
+
+TEMPLATE = "输入：{input}\n段落：{context}\n日记：{diary_content}\n记录：{chat_history}"
+
+
+class WideEllipsisEncoding(ApproximateEncoding):
+    """省略号占 3 个 token 的近似编码"""
+
+    def encode(self, text):
+        tokens = []
+        for token in super().encode(text):
+            tokens.extend([token, "", ""] if token == "…" else [token])
+        return tokens
+
+
+def make_packer(max_tokens, encoding=None):
+    return PromptPacker(
+        max_tokens=max_tokens,
+        template=TEMPLATE,
+        encoding=encoding or ApproximateEncoding(),
+        min_section_tokens=4,
+    )
+
+
+class TestPromptPacker:
+    """
+    测试 PromptPacker 的优先级填充、截断和用量统计。
+    """
+
+    def test_everything_fits(self):
+        """
+        测试预算充足时所有部分完整放入，用量之和不超过总量。
+        """
+        packer = make_packer(1000)
+        messages = [
+            {"role": "user", "content": "你好"},
+            {"role": "ai", "content": "你好呀"},
+        ]
+        packed = packer.pack(
+            "今天做了什么",
+            passages=["2025-04-12 晴\n种花", "2025-04-13 雨\n看书"],
+            diary_content="今天下雨",
+            messages=messages,
+            summary="聊了种花",
+        )
+        assert packed.truncated == set()
+        assert "用户：你好\nAI：你好呀" in packed.prompt
+        assert "摘要：聊了种花" in packed.prompt
+        assert "种花\n\n2025-04-13" in packed.prompt
+        assert packed.usage["total"] <= 1000
+        assert packed.usage["input"] == packer.count_tokens("今天做了什么")
+
+    def test_low_priority_sections_are_dropped_first(self):
+        """
+        测试预算不足时先舍弃摘要、截断较早的聊天记录，保留输入、段落和最新的消息。
+        """
+        packer = make_packer(60)
+        messages = [
+            {"role": "user", "content": "很久以前的问题" * 6},
+            {"role": "ai", "content": "最新的回答"},
+        ]
+        packed = packer.pack(
+            "问题",
+            passages=["张总来访"],
+            messages=messages,
+            summary="很长的摘要" * 10,
+        )
+        assert "问题" in packed.prompt and "张总来访" in packed.prompt
+        assert "AI：最新的回答" in packed.prompt
+        assert "很久以前的问题" * 6 not in packed.prompt
+        assert "…\nAI：最新的回答" in packed.prompt
+        assert packed.usage["summary"] == 0
+        assert {"chat_history", "summary"} <= packed.truncated
+        assert packed.usage["total"] <= 60
+
+    def test_long_passage_is_truncated(self):
+        """
+        测试放不下的段落被截断并以省略号结尾，之后的段落被舍弃。
+        """
+        packer = make_packer(50)
+        packed = packer.pack("问", passages=["春" * 100, "夏天"])
+        assert packed.truncated == {"context"}
+        assert "春…" in packed.prompt
+        assert "夏天" not in packed.prompt
+        assert packed.usage["total"] <= 50
+
+    def test_recent_turns_outrank_diary_draft(self):
+        """
+        测试编辑框中的长日记不会挤掉最近的聊天记录，预算不足时先截断日记。
+        """
+        packer = make_packer(60)
+        packed = packer.pack(
+            "问题",
+            passages=["张总来访"],
+            diary_content="很长的日记草稿" * 20,
+            messages=[{"role": "ai", "content": "最新的回答"}],
+        )
+        assert "AI：最新的回答" in packed.prompt
+        assert "diary_content" in packed.truncated
+        assert "chat_history" not in packed.truncated
+        assert packed.usage["total"] <= 60
+
+    def test_truncation_reserves_room_for_ellipsis(self):
+        """
+        测试省略号占多个 token 时，截断后的文本（含省略号）仍不超过预算。
+        """
+        packer = make_packer(50, WideEllipsisEncoding())
+        for budget in range(0, 8):
+            text = packer.truncate("春" * 20, budget)
+            assert packer.count_tokens(text) <= budget
+        assert packer.truncate("春" * 20, 5) == "春春…"
+        packed = packer.pack("问", passages=["春" * 100])
+        assert packed.usage["total"] <= 50
+
+    def test_approximate_encoding_round_trips(self):
+        """
+        测试近似编码可无损还原文本，汉字按单字计数。
+        """
+        encoding = ApproximateEncoding()
+        text = "今天 reading books，很开心"
+        assert encoding.decode(encoding.encode(text)) == text
+        assert len(encoding.encode("张总")) == 2
@@ -0,0 +1,98 @@
+import threading
+import time
+
+from managers.diary_manager import DIARY_DELETED, DIARY_SAVED
+from models import Diary
+from rag.rag_indexer import RagIndexer
+from rag.rag_retriever import RagRetriever
+
+
+class TestRagIndexer:
+    """
+    测试 RagIndexer 的防抖合并和增量更新。
+    """
+
+    def test_burst_of_saves_coalesces_into_one_embedding_call(
+        self, recording_embedding
+    ):
+        """
+        测试连续保存被合并为一次嵌入调用，删除事件会移除对应向量。
+        """
+        embedding = recording_embedding(size=16)
+        retriever = RagRetriever(
+            ["京都"], embedding_model=embedding, ids=["2025-01-05"]
+        )
+        indexer = RagIndexer(
+            retriever, debounce=10, document_builder=lambda d: d.content
+        )
+
+        for i in range(5):
+            diary = Diary(date="2025-04-03", content=f"搬家第 {i} 稿")
+            indexer.on_diary_changed(DIARY_SAVED, diary.date, diary)
+        indexer.on_diary_changed(DIARY_DELETED, "2025-01-05")
+        assert indexer.flush(timeout=5)
+
+        assert embedding.batches == [["京都"], ["搬家第 4 稿"]]
+        assert retriever.vectorstore.index.ntotal == 1
+        assert retriever.content_hashes.keys() == {"2025-04-03"}
+        indexer.stop(timeout=5)
+
+    def test_bootstrap_syncs_before_pending_changes(self, recording_embedding):
+        """
+        测试全量同步在后台线程中执行，且先于同步期间到达的变更。
+        """
+        embedding = recording_embedding(size=16)
+        retriever = RagRetriever(None, embedding_model=embedding)
+        indexer = RagIndexer(
+            retriever, debounce=10, document_builder=lambda d: d.content
+        )
+        started = threading.Event()
+        release = threading.Event()
+        threads = []
+
+        def load_documents():
+            threads.append(threading.current_thread().name)
+            started.set()
+            release.wait(5)
+            return {"2025-01-05": "京都", "2025-04-03": "搬家"}
+
+        indexer.bootstrap(load_documents)
+        assert started.wait(5)
+        indexer.on_diary_changed(DIARY_DELETED, "2025-01-05")
+        release.set()
+        assert indexer.flush(timeout=5)
+
+        assert threads == ["rag-indexer"]
+        assert embedding.batches == [["京都", "搬家"]]
+        assert retriever.content_hashes.keys() == {"2025-04-03"}
+        indexer.stop(timeout=5)
+
+    def test_flush_returns_after_stop_skips_pending_bootstrap(
+        self, recording_embedding
+    ):
+        """
+        测试停止时跳过尚未开始的全量同步后，flush 立即返回而不是等到超时。
+        """
+        retriever = RagRetriever(None, embedding_model=recording_embedding(size=16))
+        indexer = RagIndexer(retriever, document_builder=lambda d: d.content)
+        started = threading.Event()
+        release = threading.Event()
+        loads = []
+
+        def load_documents():
+            loads.append(len(loads))
+            started.set()
+            release.wait(5)
+            return {"2025-04-03": "搬家"}
+
+        indexer.bootstrap(load_documents)
+        assert started.wait(5)
+        indexer.bootstrap(load_documents)  # 前一次同步结束前停止，这次被跳过
+        indexer.stop(timeout=0)
+        release.set()
+        indexer.stop(timeout=5)
+
+        start = time.monotonic()
+        assert indexer.flush(timeout=5)
+        assert time.monotonic() - start < 1
+        assert loads == [0]
@@ -0,0 +1,84 @@
+import pytest
+
+from managers.crypto_manager import CryptoManager
+from rag.hashing_embeddings import HashingEmbeddings
+from rag.rag_retriever import RagRetriever, RetrievalHit
+
+
+class TestRagRetriever:
+    """
+    测试 RagRetriever 的加密持久化索引和增量嵌入。
+    """
+
+    @pytest.fixture(autouse=True)
+    def _setup(self, test_keys, recording_embedding):
+        """让 CryptoManager 使用测试密钥"""
+        self.crypto_manager = CryptoManager()
+        self.recording_embedding = recording_embedding
+
+    def _make_retriever(self, index_path, documents):
+        embedding = self.recording_embedding(size=16)
+        retriever = RagRetriever(
+            list(documents.values()),
+            embedding_model=embedding,
+            ids=list(documents),
+            index_path=str(index_path),
+            crypto_manager=self.crypto_manager,
+        )
+        return retriever, embedding.embedded
+
+    def test_only_changed_documents_are_embedded(self, tmp_path):
+        """
+        测试重启后只嵌入新增或内容变化的文档，并删除已不存在的文档。
+        """
+        index_path = tmp_path / "index.enc"
+        documents = {"2025-01-05": "京都", "2025-02-24": "加班", "2025-03-15": "考试"}
+        _, embedded = self._make_retriever(index_path, documents)
+        assert sorted(embedded) == sorted(documents.values())
+        assert b"\xe4\xba\xac\xe9\x83\xbd" not in index_path.read_bytes()
+
+        documents["2025-02-24"] = "加班到八点"
+        documents["2025-04-03"] = "搬家"
+        del documents["2025-03-15"]
+        retriever, embedded = self._make_retriever(index_path, documents)
+        assert sorted(embedded) == ["加班到八点", "搬家"]
+        assert retriever.vectorstore.index.ntotal == 3
+
+        retriever, embedded = self._make_retriever(index_path, documents)
+        assert embedded == []
+        assert retriever.retrieve("搬家", k=1)[0].page_content == "搬家"
+
+    def test_corrupt_index_is_rebuilt(self, tmp_path):
+        """
+        测试索引文件损坏时重建索引。
+        """
+        index_path = tmp_path / "index.enc"
+        index_path.write_bytes(b"corrupt")
+        _, embedded = self._make_retriever(index_path, {"2025-01-05": "京都"})
+        assert embedded == ["京都"]
+
+    def test_search_hits_and_batch(self):
+        """
+        测试快速路径返回带得分的轻量结果，批量检索与逐条检索结果一致且查询嵌入走缓存。
+        """
+        documents = {"2025-01-05": "京都", "2025-02-24": "加班", "2025-03-15": "考试"}
+        retriever = RagRetriever(
+            list(documents.values()),
+            embedding_model=HashingEmbeddings(dim=64),
+            ids=list(documents),
+        )
+        hits = retriever.search("加班", k=3, mode="vector")
+        assert hits[0] == RetrievalHit("2025-02-24#0", "2025-02-24", -0.0)
+        assert [hit.score for hit in hits] == sorted(
+            (hit.score for hit in hits), reverse=True
+        )
+
+        queries = ["京都", "考试", "加班"]
+        for mode in ["vector", "lexical", "hybrid"]:
+            batch = retriever.retrieve_batch(queries, k=2, mode=mode)
+            assert batch == [retriever.retrieve(q, k=2, mode=mode) for q in queries]
+        assert [docs[0].page_content for docs in batch] == queries
+
+        stats = retriever.embedding_model.stats()
+        retriever.search_batch(queries, k=1)
+        assert retriever.embedding_model.stats()["hits"] == stats["hits"] + 3
@@ -0,0 +1,57 @@
+import os
+from unittest.mock import patch
+
+import pytest
+
+from managers.config_manager import ConfigManager
+from managers.diary_manager import DiaryManager
+from models import Config, Diary
+from utils.diary_export import export_with_pillow, iter_export_jobs
+
+DATES = ["2025-03-01", "2025-03-02", "2025-03-05", "2025-04-01"]
+
+
+@pytest.mark.usefixtures("test_keys")
+class TestDiaryExport:
+    """
+    测试批量导出任务的生成和 Pillow 批量导出。
+    """
+
+    def _make_manager(self, tmp_path):
+        config = Config(diary_path=str(tmp_path / "diary")).model_dump()
+        with patch.object(ConfigManager, "_load_config", return_value=config):
+            diary_manager = DiaryManager()
+        for date in DATES:
+            diary_manager.save_diary(
+                Diary(date=date, weather="晴", content=f"# {date}\n\n- 起床")
+            )
+        return diary_manager
+
+    def test_iter_export_jobs(self, tmp_path):
+        """
+        测试按日期顺序生成日期范围内每篇日记的导出任务。
+        """
+        diary_manager = self._make_manager(tmp_path)
+        out_dir = str(tmp_path / "export")
+        jobs = list(
+            iter_export_jobs(diary_manager, out_dir, "pdf", "2025-03-01", "2025-03-31")
+        )
+        assert [job.date for job in jobs] == DATES[:3]
+        assert jobs[0].path == os.path.join(out_dir, "2025-03-01.pdf")
+        assert "2025-03-01 · 晴" in jobs[0].html
+        assert "<li>起床</li>" in jobs[0].html
+        assert jobs[0].body.startswith("<p>2025-03-01 · 晴</p><hr>")
+
+        with pytest.raises(ValueError):
+            list(iter_export_jobs(diary_manager, out_dir, "gif"))
+
+    def test_export_with_pillow(self, tmp_path):
+        """
+        测试不依赖 WebEngine 批量导出为图片。
+        """
+        pytest.importorskip("PIL")
+        diary_manager = self._make_manager(tmp_path)
+        out_dir = str(tmp_path / "export")
+        paths = export_with_pillow(diary_manager, out_dir, "png", end="2025-03-05")
+        assert paths == [os.path.join(out_dir, f"{date}.png") for date in DATES[:3]]
+        assert all(os.path.getsize(path) > 0 for path in paths)
@@ -0,0 +1,76 @@
+import markdown
+import pytest
+
+from utils.html2img import Block, html_to_image, parse_blocks, wrap_code, wrap_text
+
+
+def measure(text):
+    """测试用的宽度：汉字和全角标点宽 2，其他字符宽 1"""
+    return sum(2 if ord(char) > 0x2E80 else 1 for char in text)
+
+
+class TestHtml2Img:
+    """
+    测试不依赖浏览器的排版：HTML 拆分为文本块和中英文混排折行。
+    """
+
+    def test_parse_blocks(self):
+        """
+        测试标题、段落、嵌套列表、引用、代码块、分隔线和表格被拆为对应的文本块。
+        """
+        html = markdown.markdown(
+            "# 今天\n\n天气**很好**。\n去了公园。\n\n- 跑步\n\n    1. 早饭\n\n"
+            "> 明天\n> 继续\n\n```\nx = 1\n\ny = 2\n```\n\n---\n\n"
+            "| 时间 | 事项 |\n|---|---|\n| 8:00 | 起床 |",
+            extensions=["extra"],
+        )
+        assert parse_blocks(html) == [
+            Block("heading", "今天", 1),
+            Block("paragraph", "天气很好。去了公园。"),
+            Block("list_item", "跑步", 1, "•"),
+            Block("list_item", "早饭", 2, "1."),
+            Block("quote", "明天继续", 1),
+            Block("code", "x = 1\n\ny = 2"),
+            Block("rule", ""),
+            Block("table_row", "时间 | 事项"),
+            Block("table_row", "8:00 | 起床"),
+        ]
+
+    def test_wrap_text(self):
+        """
+        测试汉字逐字折行、英文按单词折行、超长单词拆开，句末标点不出现在行首，开括号不留在行尾。
+        """
+        assert wrap_text("今天天气很好，我们去公园（西湖）玩。", 12, measure) == [
+            "今天天气很好，",
+            "我们去公园",
+            "（西湖）玩。",
+        ]
+        assert wrap_text("Hello world, a verylongwordhere\n第二行", 10, measure) == [
+            "Hello",
+            "world, a",
+            "verylongwo",
+            "rdhere",
+            "第二行",
+        ]
+
+    def test_wrap_code(self):
+        """
+        测试代码逐字符折行，保留缩进和连续的空格。
+        """
+        assert wrap_code("    if x:  y = 1", 1000, len) == ["    if x:  y = 1"]
+        assert wrap_code("def f():\n    return  1", 8, len) == [
+            "def f():",
+            "    retu",
+            "rn  1",
+        ]
+        assert wrap_code("", 8, len) == [""]
+
+    def test_html_to_image(self):
+        """
+        测试 Pillow 渲染的图片高度随内容增长。
+        """
+        pytest.importorskip("PIL")
+        short = html_to_image("<p>今天</p>", width=400)
+        long = html_to_image("<p>今天天气很好。</p>" * 30, width=400)
+        assert short.width == long.width == 400
+        assert long.height > short.height
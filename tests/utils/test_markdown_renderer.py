@@ -0,0 +1,69 @@
+import markdown
+
+from utils.markdown_renderer import DEFAULT_EXTENSIONS, MarkdownRenderer, split_blocks
+
+DIARY = """# 今天
+
+天气**很好**。
+去了公园。
+
+- 早上跑步
+- 中午午睡
+
+- 晚上看书
+
+  看的是《红楼梦》
+
+```python
+x = 1
+
+y = 2
+```
+
+| 时间 | 事项 |
+|---|---|
+| 8:00 | 起床 |
+
+## 今天
+
+> 明天继续努力"""
+
+
+class TestMarkdownRenderer:
+    """
+    测试按块缓存的 Markdown 渲染。
+    """
+
+    def test_same_output_as_whole_document(self):
+        """
+        测试逐块渲染的结果与整篇渲染一致，围栏代码块和松散列表不会被切开。
+        """
+        blocks = split_blocks(DIARY)
+        assert "```python\nx = 1\n\ny = 2\n```" in blocks
+        assert blocks[2].startswith("- 早上跑步") and blocks[2].endswith("红楼梦》")
+
+        renderer = MarkdownRenderer()
+        expected = markdown.markdown(DIARY, extensions=list(DEFAULT_EXTENSIONS))
+        assert renderer.render(DIARY) == expected
+
+        text = "正文\n\n[链接][1]\n\n[1]: https://example.com"
+        assert renderer.render(text) == markdown.markdown(
+            text, extensions=list(DEFAULT_EXTENSIONS)
+        )
+
+    def test_only_changed_blocks_are_rendered(self):
+        """
+        测试内容不变时不重新渲染，修改一段时只重新渲染这一段。
+        """
+        renderer = MarkdownRenderer()
+        renderer.render(DIARY)
+        count = renderer.rendered_blocks
+        assert count == len(split_blocks(DIARY))
+
+        renderer.render(DIARY)
+        assert renderer.rendered_blocks == count
+
+        edited = DIARY.replace("去了公园。", "去了公园，还买了花。")
+        html = renderer.render(edited)
+        assert renderer.rendered_blocks == count + 1
+        assert "还买了花" in html
@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+pytest.importorskip("PySide6")
+
+from PySide6.QtWidgets import QApplication, QListView, QStyleOptionViewItem  # noqa: E402
+
+from view.chat_transcript import (  # noqa: E402
+    MAX_MEASURED_WIDTHS,
+    ChatBubbleDelegate,
+    ChatListModel,
+    ChatMessage,
+)
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+def make_messages(count):
+    return [ChatMessage("AI助手", "", f"消息{i}") for i in range(count)]
+
+
+class TestChatListModel:
+    """
+    测试聊天消息列表模型的行号维护。
+    """
+
+    def test_insert_and_remove_first(self, app):
+        """
+        测试在顶部插入较早的消息、从顶部移除消息后行号与消息对应。
+        """
+        model = ChatListModel()
+        recent = make_messages(3)
+        for message in recent:
+            model.append_message(message)
+        older = make_messages(2)
+        model.insert_messages(0, older)
+        assert model.rowCount() == 5
+        assert [model.message(row) for row in range(5)] == older + recent
+        assert model.row_of(recent[0]) == 2
+
+        model.remove_first(3)
+        assert model.rowCount() == 2
+        assert model.row_of(recent[1]) == 0
+        assert model.row_of(older[0]) == -1
+        assert not model.message_changed(older[0]).isValid()
+        assert model.message_changed(recent[2]).row() == 1
+
+        model.remove_first(10)
+        assert model.rowCount() == 0
+
+
+class TestChatBubbleDelegate:
+    """
+    测试聊天气泡委托的尺寸缓存和布局缓存。
+    """
+
+    @pytest.fixture(autouse=True)
+    def _setup(self, app):
+        self.view = QListView()
+        self.view.resize(400, 300)
+        self.model = ChatListModel()
+        self.view.setModel(self.model)
+
+    def _delegate(self, **kwargs):
+        delegate = ChatBubbleDelegate(self.view, **kwargs)
+        layouts = []
+        text_layout = delegate._text_layout
+
+        def counting_layout(message, width):
+            layouts.append(message)
+            return text_layout(message, width)
+
+        delegate._text_layout = counting_layout
+        return delegate, layouts
+
+    def test_size_hint_is_cached_until_text_changes(self):
+        """
+        测试宽度和内容不变时 sizeHint 不再重新排版，追加文本后重新测量且高度增加。
+        """
+        delegate, layouts = self._delegate()
+        message = ChatMessage("AI助手", "", "你好")
+        self.model.append_message(message)
+        index = self.model.index(0)
+        option = QStyleOptionViewItem()
+
+        first = delegate.sizeHint(option, index)
+        assert delegate.sizeHint(option, index) == first
+        assert layouts == [message]
+
+        message.append_text("\n今天去看了郁金香\n还去了西湖")
+        second = delegate.sizeHint(option, index)
+        assert len(layouts) == 2
+        assert second.height() > first.height()
+
+    def test_measured_widths_are_bounded(self):
+        """
+        测试每条消息只记住最近 MAX_MEASURED_WIDTHS 个宽度下的测量结果。
+        """
+        delegate, _ = self._delegate()
+        message = ChatMessage("AI助手", "", "你好")
+        for width in range(100, 100 + 10 * (MAX_MEASURED_WIDTHS + 2), 10):
+            delegate._text_size(message, width)
+        assert len(message._text_sizes) == MAX_MEASURED_WIDTHS
+        assert 100 not in message._text_sizes
+
+    def test_layout_cache_is_lru(self):
+        """
+        测试文本布局缓存超过容量时淘汰最久未使用的消息。
+        """
+        delegate, layouts = self._delegate(layout_cache_size=2)
+        first, second, third = make_messages(3)
+        delegate._text_layout(first, 200)
+        delegate._text_layout(second, 200)
+        delegate._text_layout(first, 200)  # 命中缓存，first 成为最近使用
+        delegate._text_layout(third, 200)
+        assert list(delegate._layouts) == [first, third]
+        assert layouts == [first, second, first, third]
@@ -0,0 +1,59 @@
+import os
+import time
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+pytest.importorskip("PySide6.QtWebEngineWidgets")
+
+from PySide6.QtCore import QObject, Signal  # noqa: E402
+from PySide6.QtWidgets import QApplication  # noqa: E402
+
+from utils.diary_export import ExportJob  # noqa: E402
+from view.diary_exporter import BatchExporter  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+class FakeRenderer(QObject):
+    """立即完成渲染的假渲染器"""
+
+    finished = Signal(str, str)
+
+    def render(self, html, path):
+        self.finished.emit(path, "")
+
+    def discard(self, paths):
+        return []
+
+
+def wait_for(app, results, timeout=5):
+    """处理事件直到收到结果或超时"""
+    deadline = time.monotonic() + timeout
+    while not results and time.monotonic() < deadline:
+        app.processEvents()
+
+
+class TestBatchExporter:
+    """
+    测试批量导出的结束报告。
+    """
+
+    def test_generator_error_is_reported(self, app):
+        """
+        测试生成导出任务时出错，finished 报告错误而不是当作正常结束。
+        """
+
+        def jobs():
+            yield ExportJob("2025-01-01", "<p>1</p>", "<p>1</p>", "1.png")
+            raise RuntimeError("无法解密 2025-01-02")
+
+        exporter = BatchExporter(FakeRenderer())
+        results = []
+        exporter.finished.connect(lambda *args: results.append(args))
+        exporter.start(jobs())
+        wait_for(app, results)
+        assert results == [(["1.png"], [], "无法解密 2025-01-02")]
@@ -0,0 +1,163 @@
+import html
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional
+
+from models import Diary
+from utils.html2img import html_to_image
+from utils.markdown_renderer import MarkdownRenderer
+
+EXPORT_FORMATS = ("png", "pdf")
+
+# 导出页面的样式，WebEngine 渲染时使用
+EXPORT_STYLE = """
+body {
+    margin: 40px;
+    font-family: "Microsoft YaHei", "PingFang SC", "Noto Sans CJK SC", sans-serif;
+    font-size: 16px;
+    line-height: 1.7;
+    color: #222;
+    background: #fff;
+}
+.meta { color: #888; margin-bottom: 24px; }
+pre { background: #f5f5f5; padding: 12px; border-radius: 6px; white-space: pre-wrap; }
+blockquote { color: #666; border-left: 3px solid #ddd; margin-left: 0; padding-left: 16px; }
+table { border-collapse: collapse; }
+th, td { border: 1px solid #ddd; padding: 4px 8px; }
+img { max-width: 100%; }
+"""
+
+
+class ExportJob(NamedTuple):
+    """一篇待导出的日记"""
+
+    date: str
+    html: str  # 完整的 HTML 页面
+    body: str  # 不含样式的 HTML 片段（日期和正文），Pillow 渲染时使用
+    path: str  # 输出文件路径
+
+
+def _meta(diary: Diary) -> str:
+    return html.escape(" · ".join(filter(None, [diary.date, diary.weather])))
+
+
+def build_export_html(diary: Diary, body: str) -> str:
+    """
+    生成导出用的完整 HTML 页面
+
+    Args:
+        diary: 日记对象，日期和天气显示在正文上方
+        body: 日记正文渲染出的 HTML
+    """
+    meta = _meta(diary)
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        f"<style>{EXPORT_STYLE}</style></head><body>"
+        f'<div class="meta">{meta}</div>{body}</body></html>'
+    )
+
+
+def make_export_job(diary: Diary, body: str, path: str) -> ExportJob:
+    """
+    生成一篇日记的导出任务
+
+    Args:
+        diary: 日记对象
+        body: 日记正文渲染出的 HTML
+        path: 输出文件路径，扩展名为 .pdf 时导出 PDF，否则导出 PNG
+    """
+    return ExportJob(
+        diary.date,
+        build_export_html(diary, body),
+        f"<p>{_meta(diary)}</p><hr>{body}",
+        path,
+    )
+
+
+def export_path(out_dir: str, date: str, fmt: str) -> str:
+    """日记导出文件的路径，每篇日记一个文件"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    return os.path.join(out_dir, f"{date}.{fmt}")
+
+
+def iter_export_jobs(
+    diary_manager,
+    out_dir: str,
+    fmt: str = "png",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    markdown_renderer: Optional[MarkdownRenderer] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> Iterator[ExportJob]:
+    """
+    按日期顺序产出日期范围内（闭区间）每篇日记的导出任务
+
+    日记由 DiaryManager 在线程池中并行解密，Markdown 按块缓存渲染。
+
+    Args:
+        diary_manager: DiaryManager
+        out_dir: 输出目录
+        fmt: png 或 pdf
+        start: 起始日期 YYYY-MM-DD，为 None 表示不限
+        end: 结束日期 YYYY-MM-DD，为 None 表示不限
+        markdown_renderer: Markdown 渲染器，默认新建一个
+        cancel_event: 取消事件，置位后停止产出
+    """
+    renderer = markdown_renderer or MarkdownRenderer()
+    os.makedirs(out_dir, exist_ok=True)
+    for diary in diary_manager.iter_diaries(start, end, cancel_event=cancel_event):
+        body = renderer.render(diary.content or "")
+        yield make_export_job(diary, body, export_path(out_dir, diary.date, fmt))
+
+
+def render_with_pillow(job: ExportJob, **options) -> str:
+    """
+    用 Pillow 渲染一个导出任务并保存，PDF 为单页
+
+    Args:
+        job: 导出任务
+        options: 传给 html_to_image 的排版参数
+
+    Returns:
+        输出文件路径
+    """
+    image = html_to_image(job.body, **options)
+    if job.path.endswith(".pdf"):
+        image.save(job.path, "PDF", resolution=96)
+    else:
+        image.save(job.path, "PNG", optimize=False)
+    return job.path
+
+
+def export_with_pillow(
+    diary_manager,
+    out_dir: str,
+    fmt: str = "png",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    workers: int = 2,
+    cancel_event: Optional[threading.Event] = None,
+    **options,
+) -> List[str]:
+    """
+    不依赖 WebEngine 批量导出日期范围内的日记
+
+    解密、Markdown 渲染与排版、编码写盘流水线进行：生成任务的同时，已生成的任务在线程池中
+    排版并保存，同时在途的任务数受限。
+
+    Returns:
+        按日期顺序排列的输出文件路径
+    """
+    paths = []
+    pending = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export") as pool:
+        for job in iter_export_jobs(
+            diary_manager, out_dir, fmt, start, end, cancel_event=cancel_event
+        ):
+            pending.append(pool.submit(render_with_pillow, job, **options))
+            if len(pending) >= workers * 2:
+                paths.append(pending.pop(0).result())
+        paths.extend(future.result() for future in pending)
+    return paths
@@ -1,17 +1,331 @@
-from PIL import Image, ImageDraw, ImageFont
+import re
+from functools import lru_cache
+from html.parser import HTMLParser
+from typing import Callable, List, NamedTuple, Optional
 
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # Pillow 是可选依赖，只有不使用 WebEngine 导出时才需要
+    Image = ImageDraw = ImageFont = None
 
-def html_to_image(html):
-    # Set up image parameters
-    width, height = 800, 600  # You can adjust the size as needed
-    background_color = (255, 255, 255)
-    # font = ImageFont.load_default()
+# 中日韩文字及全角标点，可以在任意两个字之间换行
+_CJK = "\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\ufe30-\ufe4f\uff00-\uffef"
+_TOKEN = re.compile(rf"\s+|[{_CJK}]|[^\s{_CJK}]+")
+_CJK_SPACE = re.compile(rf"(?<=[{_CJK}]) (?=[{_CJK}])")
+# 避头：不能出现在行首的标点，排版时允许悬挂在行尾
+_NO_LINE_START = set("，。、；：？！）」』》〉】〕”’,.;:?!)]}…—%")
+# 避尾：不能出现在行尾的标点，换行时移到下一行
+_NO_LINE_END = set("（「『《〈【〔“‘([{")
+
+# 常见系统中支持中文的字体，按顺序尝试
+CJK_FONTS = (
+    "msyh.ttc",
+    "simhei.ttf",
+    "simsun.ttc",
+    "PingFang.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+    "/System/Library/Fonts/STHeiti Light.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+)
+
+HEADING_SCALE = {1: 1.6, 2: 1.4, 3: 1.2, 4: 1.1, 5: 1.0, 6: 1.0}
+
+
+class Block(NamedTuple):
+    """
+    排版用的文本块
+
+    kind 为 heading、paragraph、list_item、code、quote、rule 或 table_row；
+    level 为标题级别或列表/引用的嵌套深度；prefix 为列表项的项目符号或序号。
+    """
+
+    kind: str
+    text: str
+    level: int = 0
+    prefix: str = ""
+
+
+def normalize_text(text: str) -> str:
+    """合并空白，并去掉 Markdown 换行在两个汉字之间留下的空格"""
+    return _CJK_SPACE.sub("", re.sub(r"\s+", " ", text)).strip()
+
+
+class _BlockParser(HTMLParser):
+    """把 Markdown 渲染出的 HTML 拆分为文本块，只保留排版需要的结构"""
+
+    _BLOCK_TAGS = {"p", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "li", "tr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[Block] = []
+        self._lists = []  # 每层列表的 [类型, 下一个序号]
+        self._quote = 0
+        self._kind = None
+        self._level = 0
+        self._prefix = ""
+        self._text = []
+        self._cells = []
+
+    def _start(self, kind, level=0, prefix=""):
+        self._flush()
+        self._kind, self._level, self._prefix = kind, level, prefix
+
+    def _flush(self):
+        if self._kind is None:
+            return
+        text = "".join(self._text)
+        text = text.strip("\n") if self._kind == "code" else normalize_text(text)
+        if text or self._kind == "rule":
+            self.blocks.append(Block(self._kind, text, self._level, self._prefix))
+        self._kind = None
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("ul", "ol"):
+            self._flush()
+            self._lists.append([tag, 1])
+        elif tag == "li":
+            prefix = "•"
+            if self._lists and self._lists[-1][0] == "ol":
+                prefix = f"{self._lists[-1][1]}."
+                self._lists[-1][1] += 1
+            self._start("list_item", len(self._lists), prefix)
+        elif tag == "blockquote":
+            self._flush()
+            self._quote += 1
+        elif tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self._start("heading", int(tag[1]))
+        elif tag == "pre":
+            self._start("code", self._quote)
+        elif tag == "p":
+            if self._kind == "list_item" and not "".join(self._text).strip():
+                return  # 松散列表中列表项的第一段
+            if self._lists:
+                self._start("paragraph", len(self._lists))
+            else:
+                self._start("quote" if self._quote else "paragraph", self._quote)
+        elif tag == "tr":
+            self._start("table_row")
+            self._cells = []
+        elif tag in ("td", "th"):
+            self._text = []
+        elif tag == "hr":
+            self._start("rule")
+            self._flush()
+        elif tag == "br":
+            self._text.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in ("ul", "ol"):
+            self._flush()
+            if self._lists:
+                self._lists.pop()
+        elif tag == "blockquote":
+            self._flush()
+            self._quote = max(0, self._quote - 1)
+        elif tag in ("td", "th"):
+            self._cells.append(normalize_text("".join(self._text)))
+            self._text = []
+        elif tag == "tr":
+            self._text = [" | ".join(self._cells)]
+            self._flush()
+        elif tag in self._BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._kind is None:
+            if not data.strip():
+                return
+            self._start("quote" if self._quote else "paragraph", self._quote)
+        self._text.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
 
-    # Create a new image with white background
-    image = Image.new('RGB', (width, height), background_color)
-    draw = ImageDraw.Draw(image)
 
-    # Draw text on the image
-    draw.text((10, 10), html, fill=(0, 0, 0))
+def parse_blocks(html: str) -> List[Block]:
+    """把 HTML 拆分为文本块"""
+    parser = _BlockParser()
+    parser.feed(html)
+    parser.close()
+    return parser.blocks
 
-    return image
\ No newline at end of file
+
+def wrap_text(
+    text: str, max_width: float, measure: Callable[[str], float]
+) -> List[str]:
+    """
+    按宽度折行
+
+    英文按单词折行，中日韩文字可以在任意两个字之间折行；句末标点不放在行首（悬挂在上一行末尾），
+    开括号、开引号不留在行尾；比一行还长的单词按字符拆开。
+
+    Args:
+        text: 文本，其中的换行符强制换行
+        max_width: 最大行宽
+        measure: 计算文本宽度的函数
+    """
+    lines = []
+    for paragraph in text.split("\n"):
+        line = ""
+        tokens = _TOKEN.findall(paragraph)
+        tokens.reverse()
+        while tokens:
+            token = tokens.pop()
+            if token.isspace():
+                if line:
+                    line += " "
+                continue
+            if measure(line + token) <= max_width or not line.strip():
+                if measure(token) > max_width and len(token) > 1 and not line:
+                    # 超长的单词逐字放入
+                    tokens.extend(reversed(token))
+                    continue
+                line += token
+            elif token[0] in _NO_LINE_START:
+                line += token
+            else:
+                line = line.rstrip()
+                carry = ""
+                while len(line) > 1 and line[-1] in _NO_LINE_END:
+                    carry = line[-1] + carry
+                    line = line[:-1]
+                lines.append(line)
+                line = carry
+                tokens.append(token)
+        lines.append(line.rstrip())
+    return lines
+
+
+def wrap_code(
+    text: str, max_width: float, measure: Callable[[str], float]
+) -> List[str]:
+    """
+    按宽度逐字符折行代码，保留缩进和连续的空格
+
+    Args:
+        text: 代码，其中的换行符强制换行
+        max_width: 最大行宽
+        measure: 计算文本宽度的函数
+    """
+    lines = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for char in paragraph:
+            if line and measure(line + char) > max_width:
+                lines.append(line)
+                line = ""
+            line += char
+        lines.append(line)
+    return lines
+
+
+@lru_cache(maxsize=32)
+def load_font(size: int, font_path: Optional[str] = None):
+    """加载指定字号的字体，依次尝试 font_path 和常见的中文字体"""
+    if ImageFont is None:
+        raise ImportError("Pillow 未安装，无法使用 Pillow 渲染图片")
+    for path in ((font_path,) if font_path else ()) + CJK_FONTS:
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    print("没有找到中文字体，使用 Pillow 默认字体")
+    return ImageFont.load_default(size)
+
+
+def html_to_image(
+    html,
+    width: int = 800,
+    font_size: int = 18,
+    font_path: Optional[str] = None,
+    padding: int = 40,
+    background_color=(255, 255, 255),
+):
+    """
+    不依赖浏览器，用 Pillow 把 Markdown 渲染出的 HTML 排版为图片
+
+    支持标题、段落、有序/无序列表、引用、代码块、分隔线和表格行，图片高度随内容增长。
+
+    Args:
+        html: HTML 文本
+        width: 图片宽度
+        font_size: 正文字号
+        font_path: 字体文件，默认使用系统中的中文字体
+        padding: 页边距
+        background_color: 背景颜色
+
+    Returns:
+        PIL.Image.Image
+    """
+    if Image is None:
+        raise ImportError("Pillow 未安装，无法使用 Pillow 渲染图片")
+
+    body_font = load_font(font_size, font_path)
+    line_spacing = font_size // 2
+    indent = font_size * 2
+    content_width = width - 2 * padding
+
+    # 第一遍：折行并计算每行的位置
+    items = []  # (x, y, 文本, 字体, 颜色)
+    decorations = []  # (类型, 坐标)
+    y = padding
+    for block in parse_blocks(html):
+        font, color, x = body_font, (0, 0, 0), padding
+        if block.kind == "heading":
+            font = load_font(int(font_size * HEADING_SCALE[block.level]), font_path)
+            y += line_spacing
+        elif block.kind == "rule":
+            decorations.append(("rule", (padding, y + line_spacing, width - padding)))
+            y += 2 * line_spacing + 1
+            continue
+        elif block.kind in ("list_item", "paragraph") and block.level:
+            x += indent * block.level
+        elif block.kind == "quote":
+            x += indent * block.level
+            color = (100, 100, 100)
+        elif block.kind == "code":
+            x += indent * block.level + line_spacing
+            color = (60, 60, 60)
+
+        if block.prefix:
+            items.append(
+                (x - font.getlength(block.prefix + " "), y, block.prefix, font, color)
+            )
+        line_height = font.getbbox("国Ag")[3] + line_spacing
+        top = y
+        max_width = content_width - (x - padding)  # 扣除缩进后的可用宽度
+        if block.kind == "code":
+            lines = wrap_code(block.text, max_width - line_spacing, font.getlength)
+        else:
+            lines = wrap_text(block.text, max_width, font.getlength)
+        for line in lines:
+            items.append((x, y, line, font, color))
+            y += line_height
+        if block.kind == "code":
+            decorations.append(
+                ("code", (x - line_spacing, top - 4, width - padding, y))
+            )
+        elif block.kind == "quote":
+            decorations.append(("quote", (x - indent // 2, top, y - line_spacing)))
+        y += line_spacing
+    height = max(y + padding, 2 * padding)
+
+    # 第二遍：绘制
+    image = Image.new("RGB", (width, int(height)), background_color)
+    draw = ImageDraw.Draw(image)
+    for kind, box in decorations:
+        if kind == "rule":
+            left, top, right = box
+            draw.line((left, top, right, top), fill=(200, 200, 200), width=1)
+        elif kind == "code":
+            draw.rounded_rectangle(box, radius=6, fill=(245, 245, 245))
+        else:
+            left, top, bottom = box
+            draw.line((left, top, left, bottom), fill=(210, 210, 210), width=3)
+    for x, y, text, font, color in items:
+        draw.text((x, y), text, font=font, fill=color)
+    return image
@@ -0,0 +1,151 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+import markdown
+from markdown.extensions.toc import unique
+
+DEFAULT_EXTENSIONS = ("extra", "markdown.extensions.toc")
+
+# 围栏代码块的起止行
+_FENCE = re.compile(r"^\s*(`{3,}|~{3,})")
+# 列表项的首行
+_LIST_ITEM = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s")
+# 依赖全文的语法：引用式链接/脚注的定义、缩写定义和 [TOC] 标记，
+# 出现时无法按块单独渲染，退回到整篇渲染
+_DOCUMENT_WIDE = re.compile(
+    r"^\s{0,3}(?:\[[^\]]+\]:|\*\[[^\]]+\]:)|^\s*\[TOC\]\s*$", re.MULTILINE
+)
+# toc 扩展为标题生成的 id
+_HEADING_ID = re.compile(r'(<h[1-6][^>]*\sid=")([^"]*)(")')
+
+
+def split_blocks(text: str) -> List[str]:
+    """
+    按空行把 Markdown 切分为可以单独渲染的块
+
+    围栏代码块内的空行不切分；空行后缩进的行（列表项的后续段落、缩进代码）以及
+    连续的列表项仍归入同一块，保证逐块渲染的结果与整篇渲染一致。
+    """
+    blocks = []
+    current: List[str] = []
+    fence = None
+    blank = False
+    for line in text.split("\n"):
+        if fence is not None:
+            current.append(line)
+            match = _FENCE.match(line)
+            if (
+                match
+                and match.group(1)[0] == fence[0]
+                and len(match.group(1)) >= len(fence)
+            ):
+                fence = None
+            continue
+
+        if not line.strip():
+            if current:
+                blank = True
+                current.append(line)
+            continue
+
+        if blank:
+            continues = line[:1] in (" ", "\t") or (
+                _LIST_ITEM.match(line) and _LIST_ITEM.match(current[0])
+            )
+            if not continues:
+                blocks.append("\n".join(current).rstrip("\n"))
+                current = []
+            blank = False
+
+        match = _FENCE.match(line)
+        if match:
+            fence = match.group(1)
+        current.append(line)
+
+    if current:
+        blocks.append("\n".join(current).rstrip("\n"))
+    return blocks
+
+
+class MarkdownRenderer:
+    """
+    带缓存的 Markdown 渲染器
+
+    文档按空行切分为块，每个块渲染出的 HTML 按内容哈希缓存在容量有限的 LRU 中，
+    编辑时只有改动过的块需要重新渲染。整篇内容与上次相同时直接返回上次的结果。
+    文档中有引用式链接、脚注、缩写等依赖全文的语法时退回到整篇渲染。
+    可以在后台线程中调用。
+    """
+
+    def __init__(
+        self, extensions: Sequence[str] = DEFAULT_EXTENSIONS, cache_size: int = 512
+    ):
+        """
+        初始化渲染器
+
+        Args:
+            extensions: Python-Markdown 扩展
+            cache_size: 最多缓存的块数
+        """
+        self.extensions = list(extensions)
+        self.cache_size = cache_size
+        self._md = markdown.Markdown(extensions=self.extensions)
+        self._blocks: OrderedDict = OrderedDict()  # 块内容哈希 -> HTML
+        self._last_digest: Optional[bytes] = None
+        self._last_html = ""
+        self._lock = threading.Lock()
+        self.rendered_blocks = 0  # 实际渲染的块数，用于统计缓存效果
+
+    @staticmethod
+    def digest(text: str) -> bytes:
+        """内容哈希，用于判断内容是否变化"""
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def render(self, text: str) -> str:
+        """渲染 Markdown 为 HTML"""
+        digest = self.digest(text)
+        with self._lock:
+            if digest == self._last_digest:
+                return self._last_html
+
+            if _DOCUMENT_WIDE.search(text):
+                html = self._convert(text)
+            else:
+                html = "\n".join(
+                    self._render_block(block) for block in split_blocks(text)
+                )
+                # 各块单独渲染时标题 id 可能重复，按整篇渲染的规则重新去重
+                ids = set()
+                html = _HEADING_ID.sub(
+                    lambda m: m.group(1) + unique(m.group(2), ids) + m.group(3), html
+                )
+
+            self._last_digest = digest
+            self._last_html = html
+            return html
+
+    def _render_block(self, block: str) -> str:
+        key = self.digest(block)
+        html = self._blocks.get(key)
+        if html is not None:
+            self._blocks.move_to_end(key)
+            return html
+        html = self._convert(block)
+        self._blocks[key] = html
+        while len(self._blocks) > self.cache_size:
+            self._blocks.popitem(last=False)
+        return html
+
+    def _convert(self, text: str) -> str:
+        self.rendered_blocks += 1
+        return self._md.reset().convert(text)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._blocks.clear()
+            self._last_digest = None
+            self._last_html = ""
@@ -106,11 +106,12 @@ class CalendarInterface(QCalendarWidget):
         self.parent = parent
         self.setObjectName("MarkedCalendar")
         self.diary_manager = DiaryManager()
-        self.dates = []
+        self.dates = set()
         self.load_diary_dates()
         self.marked_dates = []
 
         self.clicked.connect(self.date_clicked)
+        self.currentPageChanged.connect(self.load_diary_dates)
 
         # 应用样式表
         self.setStyleSheet(StyleSheet)
@@ -118,7 +119,7 @@ class CalendarInterface(QCalendarWidget):
     def paintCell(self, painter, rect, date):
         super().paintCell(painter, rect, date)
 
-        if date in self.dates:
+        if date.toString("yyyy-MM-dd") in self.dates:
             painter.save()
             # 设置半透明的红色
             painter.setBrush(QBrush(QColor(255, 0, 0, 128)))
@@ -126,12 +127,15 @@ class CalendarInterface(QCalendarWidget):
             painter.drawEllipse(rect.center(), 15, 15)
             painter.restore()
 
-    def load_diary_dates(self):
-        self.dates = self.diary_manager.get_all_dates()
-        self.dates = [
-            QDate.fromString(date_str, "yyyy-MM-dd")
-            for date_str in self.diary_manager.get_all_dates()
-        ]
+    def load_diary_dates(self, year=None, month=None):
+        """只查询当前页（含前后相邻月份露出的日期）范围内的日记日期"""
+        year = year or self.yearShown()
+        month = month or self.monthShown()
+        first_day = QDate(year, month, 1)
+        start = first_day.addMonths(-1).toString("yyyy-MM-dd")
+        end = first_day.addMonths(2).addDays(-1).toString("yyyy-MM-dd")
+        self.dates = set(self.diary_manager.get_dates_between(start, end))
+        self.updateCells()
 
     def date_clicked(self, date):
         print(date)
@@ -0,0 +1,290 @@
+from collections import OrderedDict
+
+from PySide6.QtCore import QAbstractListModel, QModelIndex, QPointF, QRectF, QSize, Qt
+from PySide6.QtGui import QColor, QFont, QPainter, QPixmap, QTextLayout, QTextOption
+from PySide6.QtWidgets import QStyledItemDelegate
+
+AVATAR_SIZE = 40
+SPACING = 10  # 头像与气泡之间、消息与消息之间的间距
+PADDING = 8  # 气泡内边距
+NAME_HEIGHT = 20  # 用户名一行的高度
+# 每条消息最多记住几个宽度下的测量结果，窗口在几个常用宽度之间切换时不必重新测量
+MAX_MEASURED_WIDTHS = 4
+
+
+class ChatMessage:
+    """
+    聊天列表中的一条消息
+
+    只保存内容和测量结果；文本布局由 ChatBubbleDelegate 按需生成并在有限的缓存中复用。
+    """
+
+    __slots__ = (
+        "_measured_version",
+        "_text_sizes",
+        "alignment",
+        "avatar_path",
+        "log_index",
+        "reply_to",
+        "text",
+        "username",
+        "version",
+    )
+
+    def __init__(
+        self, username, avatar_path, text, alignment=Qt.AlignLeft, log_index=None
+    ):
+        """
+        :param log_index: 消息在聊天记录文件中的序号，尚未写入时为 None。
+        """
+        self.username = username
+        self.avatar_path = avatar_path
+        self.text = text
+        self.alignment = alignment
+        self.log_index = log_index
+        self.reply_to = None  # AI 消息所回复的用户消息
+        self.version = 0  # 内容每变化一次加一，用于判断缓存的布局是否过期
+        self._measured_version = None  # _text_sizes 对应的内容版本
+        self._text_sizes = {}  # 宽度 -> 文本尺寸 (宽, 高)
+
+    def set_text(self, text):
+        """替换消息内容"""
+        self.text = text
+        self.version += 1
+
+    def append_text(self, text):
+        """在消息末尾追加文本"""
+        self.text += text
+        self.version += 1
+
+
+class ChatListModel(QAbstractListModel):
+    """聊天消息列表模型，DisplayRole 返回消息文本，MessageRole 返回 ChatMessage"""
+
+    MessageRole = Qt.UserRole + 1
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._messages = []
+
+    def rowCount(self, parent=None):
+        if parent is None:
+            parent = QModelIndex()
+        return 0 if parent.isValid() else len(self._messages)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        message = self._messages[index.row()]
+        if role == Qt.DisplayRole:
+            return message.text
+        if role == self.MessageRole:
+            return message
+        return None
+
+    def message(self, row):
+        return self._messages[row]
+
+    def append_message(self, message):
+        """在末尾添加一条消息"""
+        row = len(self._messages)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._messages.append(message)
+        self.endInsertRows()
+
+    def insert_messages(self, row, messages):
+        """在 row 处插入多条消息"""
+        if not messages:
+            return
+        self.beginInsertRows(QModelIndex(), row, row + len(messages) - 1)
+        self._messages[row:row] = messages
+        self.endInsertRows()
+
+    def remove_first(self, count):
+        """移除最上方的 count 条消息"""
+        count = min(count, len(self._messages))
+        if count <= 0:
+            return
+        self.beginRemoveRows(QModelIndex(), 0, count - 1)
+        del self._messages[:count]
+        self.endRemoveRows()
+
+    def row_of(self, message):
+        """查找消息所在的行，不存在时返回 -1；更新的通常是最新的消息，从末尾开始查找"""
+        for row in range(len(self._messages) - 1, -1, -1):
+            if self._messages[row] is message:
+                return row
+        return -1
+
+    def message_changed(self, message):
+        """
+        通知视图消息内容已变化。
+        :return: 消息的索引，消息已被移除时返回无效索引。
+        """
+        row = self.row_of(message)
+        if row < 0:
+            return QModelIndex()
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+        return index
+
+
+class ChatBubbleDelegate(QStyledItemDelegate):
+    """
+    聊天气泡委托
+
+    直接绘制头像、用户名和圆角气泡，不为每条消息创建控件。消息高度按视图宽度测量后
+    保存在 ChatMessage 中（每条消息记住最近几个宽度），宽度和内容不变时不再重新测量；排好的文本布局放在容量有限的
+    LRU 缓存中，只有可见的消息才会被绘制，消息条数增加不影响每帧的绘制开销。
+    """
+
+    def __init__(self, view, layout_cache_size=256):
+        """
+        :param view: 使用该委托的列表视图，用于获取可用宽度。
+        :param layout_cache_size: 最多缓存的文本布局数量。
+        """
+        super().__init__(view)
+        self.view = view
+        self.layout_cache_size = layout_cache_size
+        self._layouts = OrderedDict()  # ChatMessage -> (宽度, 版本, QTextLayout)
+        self._avatars = {}  # 头像路径 -> 缩放后的 QPixmap，每个头像只加载一次
+        self._font = QFont(view.font())
+        self._name_font = QFont(view.font())
+        self._name_font.setBold(True)
+
+    def _text_width(self):
+        """气泡内文本的最大宽度"""
+        width = self.view.viewport().width() - 2 * (AVATAR_SIZE + 2 * SPACING)
+        return max(40, width - 2 * PADDING)
+
+    def _text_layout(self, message, width):
+        """获取按宽度排好的文本布局，同时记录文本的实际尺寸"""
+        entry = self._layouts.get(message)
+        if entry is not None and entry[0] == width and entry[1] == message.version:
+            self._layouts.move_to_end(message)
+            return entry[2]
+
+        # QTextLayout 不把 \n 当作换行，替换为行分隔符
+        layout = QTextLayout(message.text.replace("\n", "\u2028"), self._font)
+        text_option = QTextOption()
+        text_option.setWrapMode(QTextOption.WrapAtWordBoundaryOrAnywhere)
+        layout.setTextOption(text_option)
+        height = 0.0
+        natural_width = 0.0
+        layout.beginLayout()
+        while True:
+            line = layout.createLine()
+            if not line.isValid():
+                break
+            line.setLineWidth(width)
+            line.setPosition(QPointF(0, height))
+            height += line.height()
+            natural_width = max(natural_width, line.naturalTextWidth())
+        layout.endLayout()
+
+        self._remember_size(message, width, (natural_width, height))
+        self._layouts[message] = (width, message.version, layout)
+        self._layouts.move_to_end(message)
+        while len(self._layouts) > self.layout_cache_size:
+            self._layouts.popitem(last=False)
+        return layout
+
+    @staticmethod
+    def _remember_size(message, width, size):
+        """记录消息在该宽度下的文本尺寸，内容变化后旧的测量结果全部作废"""
+        sizes = message._text_sizes
+        if message._measured_version != message.version:
+            sizes.clear()
+            message._measured_version = message.version
+        sizes.pop(width, None)
+        sizes[width] = size
+        while len(sizes) > MAX_MEASURED_WIDTHS:
+            del sizes[next(iter(sizes))]
+
+    def _text_size(self, message, width):
+        """获取文本尺寸 (宽, 高)，宽度和内容不变时直接使用测量结果"""
+        if message._measured_version == message.version:
+            size = message._text_sizes.get(width)
+            if size is not None:
+                return size
+        self._text_layout(message, width)
+        return message._text_sizes[width]
+
+    def _avatar(self, message):
+        pixmap = self._avatars.get(message.avatar_path)
+        if pixmap is None:
+            pixmap = QPixmap(message.avatar_path)
+            if pixmap.isNull():
+                # 头像加载失败时，画一个带用户名首字的圆形占位符
+                pixmap = QPixmap(AVATAR_SIZE, AVATAR_SIZE)
+                pixmap.fill(Qt.transparent)
+                painter = QPainter(pixmap)
+                painter.setRenderHint(QPainter.Antialiasing)
+                painter.setPen(Qt.NoPen)
+                painter.setBrush(QColor("#dddddd"))
+                painter.drawEllipse(0, 0, AVATAR_SIZE, AVATAR_SIZE)
+                painter.setPen(QColor("#555555"))
+                painter.drawText(pixmap.rect(), Qt.AlignCenter, message.username[:1])
+                painter.end()
+            else:
+                pixmap = pixmap.scaled(
+                    AVATAR_SIZE,
+                    AVATAR_SIZE,
+                    Qt.KeepAspectRatio,
+                    Qt.SmoothTransformation,
+                )
+            self._avatars[message.avatar_path] = pixmap
+        return pixmap
+
+    def sizeHint(self, option, index):
+        message = index.data(ChatListModel.MessageRole)
+        _, text_height = self._text_size(message, self._text_width())
+        height = max(AVATAR_SIZE, NAME_HEIGHT + text_height + 2 * PADDING)
+        return QSize(self.view.viewport().width(), int(height) + 2 * SPACING)
+
+    def paint(self, painter, option, index):
+        message = index.data(ChatListModel.MessageRole)
+        width = self._text_width()
+        layout = self._text_layout(message, width)
+        text_width, text_height = message._text_sizes[width]
+        rect = option.rect
+        right = message.alignment == Qt.AlignRight
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+
+        top = rect.top() + SPACING
+        if right:
+            avatar_x = rect.right() - SPACING - AVATAR_SIZE
+        else:
+            avatar_x = rect.left() + SPACING
+        painter.drawPixmap(avatar_x, top, self._avatar(message))
+
+        bubble_width = text_width + 2 * PADDING
+        if right:
+            bubble_x = avatar_x - SPACING - bubble_width
+            name_rect = QRectF(
+                avatar_x - SPACING - width - 2 * PADDING, top, width, NAME_HEIGHT
+            )
+        else:
+            bubble_x = avatar_x + AVATAR_SIZE + SPACING
+            name_rect = QRectF(bubble_x, top, width + 2 * PADDING, NAME_HEIGHT)
+
+        painter.setFont(self._name_font)
+        painter.setPen(QColor("#555555"))
+        painter.drawText(
+            name_rect,
+            (Qt.AlignRight if right else Qt.AlignLeft) | Qt.AlignVCenter,
+            message.username,
+        )
+
+        bubble = QRectF(
+            bubble_x, top + NAME_HEIGHT, bubble_width, text_height + 2 * PADDING
+        )
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor("#f0f0f0"))
+        painter.drawRoundedRect(bubble, 10, 10)
+        painter.setPen(QColor("#000000"))
+        layout.draw(painter, bubble.topLeft() + QPointF(PADDING, PADDING))
+
+        painter.restore()
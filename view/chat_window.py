@@ -1,159 +1,164 @@
-import socket
+import threading
+import time
+
 from PySide6.QtWidgets import (
+    QAbstractItemView,
     QApplication,
     QMainWindow,
+    QMenu,
     QVBoxLayout,
     QHBoxLayout,
     QWidget,
-    QListWidget,
-    QListWidgetItem,
+    QListView,
     QLineEdit,
     QPushButton,
-    QLabel,
     QProgressBar,
-    QTextEdit,
 )
-from PySide6.QtGui import QPixmap
-from PySide6.QtCore import Qt, QThread, Signal
+from PySide6.QtCore import Qt, QThread, QTimer, Signal
+from managers.transcription_client import TranscriptionClient
 from rag.llm_chat_with_history import LlmChatWithHistory
-from PySide6.QtGui import QTextOption
+from view.chat_transcript import ChatBubbleDelegate, ChatListModel, ChatMessage
 
 
 class LlmThread(QThread):
-    """用于后台处理LLM请求的线程"""
+    """
+    用于后台处理LLM请求的线程
 
-    response_ready = Signal(str)
+    指定 retriever 时，检索也在该线程中进行：嵌入查询、检索段落、构造提示词、调用 LLM
+    作为一个整体任务执行，并统计各阶段耗时。任务可随时取消，取消后不再发出结果，
+    也不会写入聊天记录。stream 为 True 时通过 delta_ready 逐段发出生成的文本。
+    """
 
-    def __init__(self, chat_manager, input="", diary_content="", context=""):
-        """初始化线程，设置聊天管理器、输入和上下文"""
+    response_ready = Signal(str)
+    delta_ready = Signal(str)  # 流式生成的文本增量
+    timings_ready = Signal(dict)  # 阶段名 -> 耗时（秒）
+    recorded_ready = Signal(dict)  # 本轮写入聊天记录的序号，键为 user 和 ai
+
+    def __init__(
+        self,
+        chat_manager,
+        input="",
+        diary_content="",
+        context="",
+        retriever=None,
+        k=3,
+        stream=False,
+    ):
+        """初始化线程，设置聊天管理器、输入和上下文，retriever 不为空时先检索上下文"""
 
         super().__init__()
         self.chat_manager = chat_manager
         self.input = input
         self.diary_content = diary_content
         self.context = context
+        self.retriever = retriever
+        self.k = k
+        self.stream = stream
+        self._cancel_event = threading.Event()
 
-    def run(self):
-        response = self.chat_manager.process_input(
-            input=self.input, diary_content=self.diary_content, context=self.context
-        )
-        self.response_ready.emit(response)
-
-
-class ChatMessageWidget(QWidget):
-    """自定义聊天消息组件"""
-
-    def __init__(self, username, avatar_path, message, alignment=Qt.AlignLeft):
-        super().__init__()
-        layout = QHBoxLayout()
-        layout.setSpacing(10)
-
-        # 根据对齐方式调整布局
-        if alignment == Qt.AlignLeft:
-            layout.addWidget(self.create_avatar_label(avatar_path))
-            layout.addWidget(self.create_message_label(username, message))
-            layout.addStretch()
-        else:
-            layout.addStretch()
-            layout.addWidget(self.create_message_label(username, message))
-            layout.addWidget(self.create_avatar_label(avatar_path))
+    def cancel(self):
+        """取消任务，正在进行的阶段结束后即停止"""
+        self._cancel_event.set()
 
-        self.setLayout(layout)
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
 
-    def create_avatar_label(self, avatar_path):
-        """创建头像标签"""
-        avatar_label = QLabel()
+    def run(self):
+        timings = {}
+        recorded = {}
         try:
-            avatar_pixmap = QPixmap(avatar_path).scaled(
-                40, 40, Qt.KeepAspectRatio, Qt.SmoothTransformation
+            context = self.context
+            if self.retriever is not None:
+                start = time.perf_counter()
+                # 查询嵌入进入缓存，随后的检索直接命中
+                self.retriever.embedding_model.embed_query(self.input)
+                timings["embed"] = time.perf_counter() - start
+                if self.is_cancelled():
+                    return
+
+                start = time.perf_counter()
+                passages = self.retriever.retrieve(self.input, k=self.k)
+                # 段落按相关度传入，超出提示词预算时优先舍弃靠后的段落
+                context = [doc.page_content for doc in passages]
+                timings["search"] = time.perf_counter() - start
+                if self.is_cancelled():
+                    return
+
+            response = self.chat_manager.process_input(
+                input=self.input,
+                diary_content=self.diary_content,
+                context=context,
+                cancel_event=self._cancel_event,
+                timings=timings,
+                on_delta=self._emit_delta if self.stream else None,
+                recorded=recorded,
             )
-            avatar_label.setPixmap(avatar_pixmap)
-        except Exception as e:  # 捕获通用异常并记录错误信息
-            print(f"加载头像失败: {e}")
-            # 如果图片加载失败，显示占位符
-            avatar_label.setText("头像")
-            avatar_label.setStyleSheet(
-                "background-color: #ddd; border-radius: 20px; padding: 8px;"
-            )
-        return avatar_label
-
-    def create_message_label(self, username, message):
-        """创建消息标签"""
-        message_widget = QWidget()
-        message_layout = QVBoxLayout()
-        message_layout.setContentsMargins(0, 0, 0, 0)
-
-        username_label = QLabel(username)
-        username_label.setStyleSheet("font-weight: bold; color: #555;")
-        message_label = QTextEdit(message)
-        message_label.setReadOnly(True)  # 设置为只读
-        message_label.setStyleSheet(
-            """
-            background-color: #f0f0f0;
-            border-radius: 10px;
-            padding: 8px;
-            margin: 0px;
-            """
-        )
-        message_label.setWordWrapMode(
-            QTextOption.WrapAtWordBoundaryOrAnywhere
-        )  # 启用自动换行
-        message_label.setFocusPolicy(Qt.NoFocus)  # 禁用焦点
-        message_label.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)  # 隐藏滚动条
-        message_label.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)  # 隐藏滚动条
+        except Exception as e:
+            print(f"LLM请求失败: {e}")
+            response = f"请求失败: {e}"
+        if response is None or self.is_cancelled():
+            return
+        self.timings_ready.emit(timings)
+        if recorded:
+            self.recorded_ready.emit(recorded)
+        self.response_ready.emit(response)
 
-        # 动态调整高度
-        message_label.document().setTextWidth(message_label.viewport().width())
-        document_height = message_label.document().size().height()
-        message_label.setFixedHeight(document_height + 10)  # 添加额外的高度以适应边距
+    def _emit_delta(self, delta):
+        if not self.is_cancelled():
+            self.delta_ready.emit(delta)
 
-        message_layout.addWidget(username_label)
-        message_layout.addWidget(message_label)
-        message_widget.setLayout(message_layout)
-        return message_widget
 
+class TranscriptionThread(QThread):
+    """
+    在后台运行语音转写客户端的线程
 
-class SocketThread(QThread):
-    """用于后台处理Socket通信的线程"""
+    转写结果合并为完整的句子后通过 message_received 发出。发出一条消息后进入忙碌状态，
+    回复结束时调用 set_busy(False)，期间说的话合并为一条消息在回复结束后发出。
+    """
 
     message_received = Signal(str)
 
-    def __init__(self, host="127.0.0.1", port=5000):
+    def __init__(self, host="127.0.0.1", port=5000, **options):
+        """
+        :param options: 传给 TranscriptionClient 的其他参数，如 framing、ignore_patterns。
+        """
         super().__init__()
-        self.host = host
-        self.port = port
-        self.running = True
+        self.client = TranscriptionClient(
+            host, port, on_utterance=self.message_received.emit, **options
+        )
 
     def run(self):
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as client_socket:
-            try:
-                client_socket.connect((self.host, self.port))
-                print(f"Connected to server at {self.host}:{self.port}")
-                while self.running:
-                    data = client_socket.recv(1024)  # 接收数据
-                    if not data:
-                        break
-                    print(f"Received data: {data.decode('utf-8')}")
-
-                    decoded_message = data.decode("utf-8")
-                    if "转写" in decoded_message or "林黛玉" in decoded_message:
-                        continue
-                    print(f"Received message: {decoded_message}")
-                    self.message_received.emit(decoded_message)
-            except ConnectionRefusedError:
-                print("Failed to connect to the server. Is it running?")
-            except Exception as e:
-                print(f"Socket error: {e}")
+        self.client.run()
+
+    def set_busy(self, busy):
+        self.client.set_busy(busy)
+
+    def set_enabled(self, enabled):
+        self.client.set_enabled(enabled)
 
     def stop(self):
         """停止线程"""
-        self.running = False
-        self.quit()
+        self.client.stop()
         self.wait()
 
 
 class ChatWindow(QMainWindow):
-    def __init__(self, llm_generator):
+    def __init__(
+        self,
+        llm_generator,
+        prompt_packer=None,
+        chat_log=None,
+        page_size=30,
+        max_visible_messages=10000,
+        transcription=None,
+    ):
+        """
+        :param chat_log: ChatLog 实例，传入时显示并持久化该会话的聊天记录。
+        :param page_size: 向上滚动到顶部时每次加载的历史消息条数。
+        :param max_visible_messages: 列表中最多保留的消息条数，超出时移除最上方的消息，
+            再次向上滚动时从聊天记录重新加载。
+        :param transcription: 传给 TranscriptionThread 的参数，如 host、port、framing。
+        """
         super().__init__()
         self.setWindowTitle("AI聊天界面")
         self.setGeometry(100, 100, 500, 700)
@@ -164,7 +169,7 @@ class ChatWindow(QMainWindow):
                 background-color: #2b2b2b;  /* 深灰色背景 */
                 color: #ffffff;  /* 默认字体颜色为白色 */
             }
-            QListWidget {
+            QListView {
                 background-color: #3c3c3c;  /* 聊天记录区域背景 */
                 color: #ffffff;  /* 聊天记录字体颜色 */
             }
@@ -190,9 +195,25 @@ class ChatWindow(QMainWindow):
             """
         )
         # 初始化LLM相关组件
-        self.chat_manager = LlmChatWithHistory(llm_generator)
+        self.chat_manager = LlmChatWithHistory(
+            llm_generator, prompt_packer=prompt_packer, chat_log=chat_log
+        )
+        self.page_size = page_size
+        self.max_visible_messages = max_visible_messages
+        # 列表中最早一条历史消息在聊天记录中的序号，为 0 时已无更早的消息
+        self._oldest_loaded = len(chat_log) if chat_log is not None else 0
+        self._last_user_message = None
+        # 输入框回车、发送按钮和语音消息都交给它处理，见 set_message_handler
+        self._message_handler = self.send_message
         self.llm_thread = None
-        self.socket_thread = None
+        self.transcription = transcription or {}
+        self.transcription_thread = None
+        # 正在流式输出的AI消息 -> 尚未显示的文本增量，定时批量追加以减少重排
+        self._streams = {}
+        self._stream_timer = QTimer(self)
+        self._stream_timer.setSingleShot(True)
+        self._stream_timer.setInterval(50)
+        self._stream_timer.timeout.connect(self._flush_streams)
 
         # 主窗口部件
         central_widget = QWidget()
@@ -202,8 +223,20 @@ class ChatWindow(QMainWindow):
         main_layout = QVBoxLayout(central_widget)
 
         # 聊天记录区域
-        self.chat_list = QListWidget()
-        self.chat_list.setSpacing(10)
+        # 消息由委托直接绘制，不为每条消息创建控件；分批布局，消息很多时也不卡顿
+        self.chat_model = ChatListModel(self)
+        self.chat_list = QListView()
+        self.chat_list.setModel(self.chat_model)
+        self.chat_delegate = ChatBubbleDelegate(self.chat_list)
+        self.chat_list.setItemDelegate(self.chat_delegate)
+        self.chat_list.setResizeMode(QListView.Adjust)
+        self.chat_list.setLayoutMode(QListView.Batched)
+        self.chat_list.setBatchSize(100)
+        self.chat_list.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.chat_list.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.chat_list.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.chat_list.customContextMenuRequested.connect(self._show_message_menu)
+        self.chat_list.verticalScrollBar().valueChanged.connect(self._on_scroll)
         main_layout.addWidget(self.chat_list)
 
         # 进度条（处理中状态指示）
@@ -219,12 +252,12 @@ class ChatWindow(QMainWindow):
         # 文本输入框
         self.input_field = QLineEdit()
         self.input_field.setPlaceholderText("输入消息...")
-        self.input_field.returnPressed.connect(self.send_message)
+        self.input_field.returnPressed.connect(self._on_input_submitted)
         input_layout.addWidget(self.input_field)
 
         # 发送按钮
         self.send_button = QPushButton("发送")
-        self.send_button.clicked.connect(self.send_message)
+        self.send_button.clicked.connect(self._on_input_submitted)
         input_layout.addWidget(self.send_button)
 
         # 语音按钮
@@ -235,16 +268,40 @@ class ChatWindow(QMainWindow):
 
         main_layout.addLayout(input_layout)
 
-        # 欢迎消息
-        self.add_message(
-            "AI助手",
-            "ai_avatar.png",
-            "你好！我是AI助手，有什么可以帮您的吗？",
-            alignment=Qt.AlignLeft,
-        )
+        if self._oldest_loaded:
+            # 显示最近的一页历史消息，更早的消息在滚动到顶部时加载
+            self.load_older_messages()
+            self.chat_list.scrollToBottom()
+        else:
+            # 欢迎消息
+            self.add_message(
+                "AI助手",
+                "ai_avatar.png",
+                "你好！我是AI助手，有什么可以帮您的吗？",
+                alignment=Qt.AlignLeft,
+            )
+
+        # 启动语音转写线程
+        self.start_transcription_thread()
+
+    def set_message_handler(self, handler):
+        """
+        将输入框回车、发送按钮和语音消息改为交给 handler(message=None) 处理
 
-        # 启动Socket线程
-        self.start_socket_thread()
+        信号始终只连接到固定的转发方法，替换处理函数不需要断开和重连信号，
+        每条消息只会被处理一次。
+        """
+        self._message_handler = handler
+
+    def _on_input_submitted(self):
+        self._message_handler(None)
+
+    def _on_message_received(self, message):
+        self._message_handler(message)
+        # 转写客户端发出消息后处于忙碌状态，处理函数没有开始回复（如忽略了这条消息）时
+        # 立即解除，否则之后的语音消息会一直暂存
+        if self.transcription_thread and not self._streams:
+            self.transcription_thread.set_busy(False)
 
     def toggle_voice_mode(self):
         """切换语音模式"""
@@ -252,21 +309,158 @@ class ChatWindow(QMainWindow):
             self.voice_button.setStyleSheet("background-color: #87CEEB;")  # 高亮
         else:
             self.voice_button.setStyleSheet("")  # 恢复默认样式
-
-    def start_socket_thread(self):
-        """启动Socket通信线程"""
-        self.socket_thread = SocketThread()
-        self.socket_thread.message_received.connect(self.send_message)
-        self.socket_thread.start()
-
-    def add_message(self, username, avatar_path, message, alignment=Qt.AlignLeft):
-        """添加一条消息到聊天记录"""
-        message_widget = ChatMessageWidget(username, avatar_path, message, alignment)
-        list_item = QListWidgetItem()
-        list_item.setSizeHint(message_widget.sizeHint())
-        self.chat_list.addItem(list_item)
-        self.chat_list.setItemWidget(list_item, message_widget)
+        # 非语音模式下转写结果直接丢弃，不会暂存到之后发出
+        if self.transcription_thread:
+            self.transcription_thread.set_enabled(self.voice_button.isChecked())
+
+    def start_transcription_thread(self):
+        """启动语音转写线程，断线后自动重连"""
+        self.transcription_thread = TranscriptionThread(**self.transcription)
+        self.transcription_thread.set_enabled(self.voice_button.isChecked())
+        self.transcription_thread.message_received.connect(self._on_message_received)
+        self.transcription_thread.start()
+
+    def add_message(
+        self,
+        username,
+        avatar_path,
+        message,
+        alignment=Qt.AlignLeft,
+        log_index=None,
+        row=None,
+    ):
+        """
+        添加一条消息到聊天记录
+        :param log_index: 消息在聊天记录文件中的序号，尚未写入时为 None。
+        :param row: 插入的位置，为 None 时添加到末尾并滚动到底部。
+        :return: ChatMessage，用于之后更新消息内容。
+        """
+        chat_message = ChatMessage(username, avatar_path, message, alignment, log_index)
+        if alignment == Qt.AlignRight:
+            self._last_user_message = chat_message
+        if row is not None:
+            self.chat_model.insert_messages(row, [chat_message])
+            return chat_message
+        self.chat_model.append_message(chat_message)
         self.chat_list.scrollToBottom()
+        self._trim_messages()
+        return chat_message
+
+    def _update_message(self, chat_message):
+        """消息内容变化后重新测量高度并重绘"""
+        index = self.chat_model.message_changed(chat_message)
+        if index.isValid():
+            self.chat_delegate.sizeHintChanged.emit(index)
+
+    def _show_message_menu(self, pos):
+        """右键菜单：复制消息内容"""
+        index = self.chat_list.indexAt(pos)
+        if not index.isValid():
+            return
+        menu = QMenu(self)
+        copy_action = menu.addAction("复制")
+        if menu.exec(self.chat_list.viewport().mapToGlobal(pos)) == copy_action:
+            QApplication.clipboard().setText(index.data(Qt.DisplayRole))
+
+    def _on_scroll(self, value):
+        if value == self.chat_list.verticalScrollBar().minimum():
+            self.load_older_messages()
+
+    def load_older_messages(self):
+        """从聊天记录加载一页更早的消息，插入到列表顶部并保持当前的滚动位置"""
+        chat_log = self.chat_manager.chat_log
+        if chat_log is None or self._oldest_loaded <= 0:
+            return
+        scroll_bar = self.chat_list.verticalScrollBar()
+        old_maximum, old_value = scroll_bar.maximum(), scroll_bar.value()
+        messages = chat_log.load_page(before=self._oldest_loaded, count=self.page_size)
+        start = self._oldest_loaded - len(messages)
+        chat_messages = []
+        for offset, message in enumerate(messages):
+            if message["role"] == "user":
+                style = ("你", "user_avatar.png", Qt.AlignRight)
+            else:
+                style = ("AI助手", "ai_avatar.png", Qt.AlignLeft)
+            chat_messages.append(
+                ChatMessage(*style[:2], message["content"], style[2], start + offset)
+            )
+        self.chat_model.insert_messages(0, chat_messages)
+        self._oldest_loaded = start
+        self.chat_list.doItemsLayout()
+        scroll_bar.setValue(old_value + scroll_bar.maximum() - old_maximum)
+
+    def _trim_messages(self):
+        """消息超过 max_visible_messages 条时移除最上方的消息，内存占用不随对话增长"""
+        count = self.chat_model.rowCount() - self.max_visible_messages
+        if count <= 0:
+            return
+        # 正在流式输出的消息不移除
+        for row in range(count):
+            if self.chat_model.message(row) in self._streams:
+                count = row
+                break
+        self.chat_model.remove_first(count)
+        chat_log = self.chat_manager.chat_log
+        if chat_log is not None:
+            # 下次向上滚动时从剩余消息中最早的一条之前开始加载
+            self._oldest_loaded = len(chat_log)
+            for row in range(self.chat_model.rowCount()):
+                log_index = self.chat_model.message(row).log_index
+                if log_index is not None:
+                    self._oldest_loaded = log_index
+                    break
+
+    def begin_ai_message(self):
+        """添加一条空的AI消息，用于流式追加回复"""
+        chat_message = self.add_message(
+            "AI助手", "ai_avatar.png", "", alignment=Qt.AlignLeft
+        )
+        chat_message.reply_to = self._last_user_message
+        self._streams[chat_message] = []
+        # 回复期间语音转写的结果先暂存，回复结束后再发出
+        if self.transcription_thread:
+            self.transcription_thread.set_busy(True)
+        return chat_message
+
+    def append_ai_delta(self, chat_message, delta):
+        """缓存文本增量，最多每 50 毫秒批量追加到消息中一次"""
+        if chat_message not in self._streams:
+            return  # 已结束或已取消
+        self.progress_bar.hide()  # 首个增量到达即视为开始回复
+        self._streams[chat_message].append(delta)
+        if not self._stream_timer.isActive():
+            self._stream_timer.start()
+
+    def _flush_streams(self):
+        for chat_message, pending in self._streams.items():
+            if pending:
+                chat_message.append_text("".join(pending))
+                pending.clear()
+                self._update_message(chat_message)
+        self.chat_list.scrollToBottom()
+
+    def finish_ai_message(self, chat_message, response):
+        """流式回复结束，以完整回复替换消息内容"""
+        self._streams.pop(chat_message, None)
+        chat_message.set_text(response)
+        self._update_message(chat_message)
+        self.handle_ai_response(None)
+
+    def _set_log_indices(self, chat_message, recorded):
+        """记下这轮对话在聊天记录中的序号，移出列表后可从聊天记录重新加载"""
+        if recorded.get("ai") is None:
+            return
+        if chat_message.reply_to is not None:
+            chat_message.reply_to.log_index = recorded["user"]
+        chat_message.log_index = recorded["ai"]
+
+    def cancel_ai_message(self, chat_message):
+        """流式回复被取消，保留已显示的部分并标注"""
+        pending = self._streams.pop(chat_message, None)
+        if pending is None:
+            return
+        chat_message.append_text("".join(pending) + "（已取消）")
+        self._update_message(chat_message)
 
     def send_message(self, message):
         """发送消息并获取AI回复"""
@@ -293,9 +487,18 @@ class ChatWindow(QMainWindow):
         self.send_button.setEnabled(False)
         self.progress_bar.show()
 
-        # 在后台线程中处理LLM请求
-        self.llm_thread = LlmThread(self.chat_manager, message)
-        self.llm_thread.response_ready.connect(self.handle_ai_response)
+        # 在后台线程中处理LLM请求，回复逐段显示
+        chat_message = self.begin_ai_message()
+        self.llm_thread = LlmThread(self.chat_manager, message, stream=True)
+        self.llm_thread.delta_ready.connect(
+            lambda delta: self.append_ai_delta(chat_message, delta)
+        )
+        self.llm_thread.recorded_ready.connect(
+            lambda recorded: self._set_log_indices(chat_message, recorded)
+        )
+        self.llm_thread.response_ready.connect(
+            lambda response: self.finish_ai_message(chat_message, response)
+        )
         self.llm_thread.start()
 
     def handle_ai_response(self, response):
@@ -304,14 +507,35 @@ class ChatWindow(QMainWindow):
         self.progress_bar.hide()
         self.input_field.setEnabled(True)
         self.send_button.setEnabled(True)
+        if self.transcription_thread:
+            self.transcription_thread.set_busy(False)
 
-        # 显示AI回复
-        self.add_message("AI助手", "ai_avatar.png", response, alignment=Qt.AlignLeft)
+        # 显示AI回复，流式回复已显示在消息中时 response 为 None
+        if response is not None:
+            self.add_message(
+                "AI助手", "ai_avatar.png", response, alignment=Qt.AlignLeft
+            )
+
+    def show_timings(self, timings):
+        """在状态栏显示本次回复各阶段的耗时"""
+        names = {
+            "embed": "嵌入",
+            "search": "检索",
+            "prompt": "构造提示词",
+            "first_token": "首字",
+            "llm": "LLM",
+        }
+        text = "  ".join(
+            f"{names.get(stage, stage)} {seconds * 1000:.0f} ms"
+            for stage, seconds in timings.items()
+        )
+        print(f"阶段耗时: {text}")
+        self.statusBar().showMessage(text, 10000)
 
     def closeEvent(self, event):
-        """关闭窗口时停止Socket线程"""
-        if self.socket_thread:
-            self.socket_thread.stop()
+        """关闭窗口时停止语音转写线程"""
+        if self.transcription_thread:
+            self.transcription_thread.stop()
         super().closeEvent(event)
 
 
@@ -0,0 +1,250 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+from PySide6.QtCore import QMarginsF, QObject, Qt, QUrl, Signal
+from PySide6.QtGui import QPageLayout, QPageSize
+from PySide6.QtWebEngineWidgets import QWebEngineView
+
+from utils.diary_export import ExportJob
+
+# 截图的最大高度，避免超长日记生成过大的图片
+MAX_CAPTURE_HEIGHT = 20000
+_HEIGHT_SCRIPT = "document.documentElement.scrollHeight"
+
+
+class OffscreenRenderer(QObject):
+    """
+    常驻的离屏 WebEngine 渲染器
+
+    只创建一个不显示在屏幕上的 QWebEngineView 并反复使用，省去每次导出启动页面的开销。
+    任务依次排队：页面 loadFinished 后按内容高度调整视图大小再截图，或直接打印为 PDF，
+    不需要固定等待。每个任务完成后发出 ``finished(输出路径, 错误信息)``，成功时错误信息为空。
+    """
+
+    finished = Signal(str, str)
+
+    def __init__(self, width=800, parent=None):
+        """
+        :param width: 导出图片的宽度。
+        """
+        super().__init__(parent)
+        self.width = width
+        self._view = None
+        self._queue = deque()  # (HTML, 输出路径)
+        self._current = None
+
+    def _ensure_view(self):
+        if self._view is None:
+            view = QWebEngineView()
+            # 不显示在屏幕上，但需要 show 之后页面才会真正绘制
+            view.setAttribute(Qt.WA_DontShowOnScreen)
+            view.resize(self.width, 600)
+            view.show()
+            view.loadFinished.connect(self._on_load_finished)
+            view.page().pdfPrintingFinished.connect(self._on_pdf_finished)
+            self._view = view
+        return self._view
+
+    def warm_up(self):
+        """提前创建视图并启动渲染进程，第一次导出时不用再等待"""
+        if self._view is None:
+            self._ensure_view().setHtml("<html><body></body></html>")
+
+    def render(self, html, path):
+        """
+        添加导出任务。
+        :param html: 完整的 HTML 页面。
+        :param path: 输出文件路径，扩展名为 .pdf 时导出 PDF，否则导出 PNG。
+        """
+        self._queue.append((html, path))
+        if self._current is None:
+            self._next()
+
+    def discard(self, paths):
+        """
+        丢弃尚未开始的任务。
+        :return: 被丢弃的任务的输出路径。
+        """
+        kept, discarded = deque(), []
+        for html, path in self._queue:
+            if path in paths:
+                discarded.append(path)
+            else:
+                kept.append((html, path))
+        self._queue = kept
+        return discarded
+
+    def _next(self):
+        self._current = self._queue.popleft() if self._queue else None
+        if self._current is None:
+            return
+        view = self._ensure_view()
+        view.resize(self.width, 600)
+        # 以 file:/// 为基础路径，日记中引用的本地图片可以加载
+        view.setHtml(self._current[0], QUrl("file:///"))
+
+    def _done(self, error=""):
+        _, path = self._current
+        if error:
+            print(f"导出 {path} 失败: {error}")
+        self.finished.emit(path, error)
+        self._next()
+
+    def _on_load_finished(self, ok):
+        if self._current is None:
+            return  # 预热页面
+        if not ok:
+            self._done("页面加载失败")
+            return
+        _, path = self._current
+        if path.lower().endswith(".pdf"):
+            layout = QPageLayout(
+                QPageSize(QPageSize.A4),
+                QPageLayout.Portrait,
+                QMarginsF(15, 15, 15, 15),
+                QPageLayout.Millimeter,
+            )
+            self._view.page().printToPdf(path, layout)
+        else:
+            self._view.page().runJavaScript(_HEIGHT_SCRIPT, 0, self._capture)
+
+    def _capture(self, height):
+        if self._current is None:
+            return
+        height = min(max(int(height or 0), 100), MAX_CAPTURE_HEIGHT)
+        if height > self._view.height():
+            # 调整大小后再查询一次高度：这次往返保证渲染进程已经按新尺寸排版，再截图
+            self._view.resize(self.width, height)
+            self._view.page().runJavaScript(_HEIGHT_SCRIPT, 0, self._capture)
+            return
+        _, path = self._current
+        image = self._view.grab()
+        if height < self._view.height():
+            image = image.copy(0, 0, self.width, height)
+        self._done("" if image.save(path) else "保存图片失败")
+
+    def _on_pdf_finished(self, file_path, success):
+        if self._current is not None:
+            self._done("" if success else "打印 PDF 失败")
+
+    def close(self):
+        """释放视图和渲染进程"""
+        self._queue.clear()
+        self._current = None
+        if self._view is not None:
+            self._view.deleteLater()
+            self._view = None
+
+
+class BatchExporter(QObject):
+    """
+    批量导出
+
+    后台线程生成导出任务（解密日记、渲染 Markdown），主线程中的 OffscreenRenderer 依次渲染，
+    两者流水线进行：渲染当前日记的同时准备下一篇，最多提前准备 ``prefetch`` 篇。
+    """
+
+    progress = Signal(int, str)  # (已导出篇数, 输出路径)
+    # (导出成功的路径, 导出失败的路径, 生成任务出错时的错误信息，没有出错时为空)
+    finished = Signal(list, list, str)
+    _job_ready = Signal(object)  # 后台线程生成的任务，None 表示没有了
+
+    def __init__(self, renderer: OffscreenRenderer, prefetch=2, parent=None):
+        super().__init__(parent)
+        self.renderer = renderer
+        self.prefetch = prefetch
+        self.cancel_event = threading.Event()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="export-jobs"
+        )
+        self._jobs: Optional[Iterator[ExportJob]] = None
+        self._producing = False
+        self._exhausted = False
+        self._outstanding = set()  # 已交给渲染器、尚未完成的输出路径
+        self._exported = []
+        self._failed = []
+        self._error = ""
+        self._job_ready.connect(self._on_job_ready)
+        renderer.finished.connect(self._on_rendered)
+
+    def is_running(self):
+        return self._jobs is not None
+
+    def start(self, jobs: Iterator[ExportJob]):
+        """
+        开始导出。
+        :param jobs: 导出任务的迭代器，在后台线程中迭代，
+            如 utils.diary_export.iter_export_jobs(..., cancel_event=exporter.cancel_event)。
+        """
+        if self._jobs is not None:
+            raise RuntimeError("已有批量导出正在进行")
+        self.cancel_event.clear()
+        self._jobs = jobs
+        self._exhausted = False
+        self._exported = []
+        self._failed = []
+        self._error = ""
+        self._maybe_prefetch()
+
+    def cancel(self):
+        """取消导出，正在渲染的那一篇完成后结束"""
+        self.cancel_event.set()
+        for path in self.renderer.discard(self._outstanding):
+            self._outstanding.discard(path)
+        self._check_finished()
+
+    def _maybe_prefetch(self):
+        if (
+            self._exhausted
+            or self._producing
+            or len(self._outstanding) >= self.prefetch
+        ):
+            return
+        self._producing = True
+        future = self._executor.submit(next, self._jobs, None)
+        future.add_done_callback(self._on_prefetched)
+
+    def _on_prefetched(self, future):
+        # 在后台线程中调用，通过信号回到主线程
+        try:
+            job = future.result()
+        except Exception as e:
+            # 之后的日记不会再导出，记下错误在 finished 中报告，而不是当作正常结束
+            print("生成导出任务失败", e)
+            self._error = str(e) or type(e).__name__
+            job = None
+        self._job_ready.emit(job)
+
+    def _on_job_ready(self, job):
+        self._producing = False
+        if job is None or self.cancel_event.is_set():
+            self._exhausted = True
+            self._check_finished()
+            return
+        self._outstanding.add(job.path)
+        self.renderer.render(job.html, job.path)
+        self._maybe_prefetch()
+
+    def _on_rendered(self, path, error):
+        if path not in self._outstanding:
+            return  # 不是批量导出的任务
+        self._outstanding.discard(path)
+        if error:
+            self._failed.append(path)
+        else:
+            self._exported.append(path)
+            self.progress.emit(len(self._exported), path)
+        self._maybe_prefetch()
+        self._check_finished()
+
+    def _check_finished(self):
+        if self._jobs is None or self._producing:
+            return
+        if not (self._exhausted or self.cancel_event.is_set()) or self._outstanding:
+            return
+        jobs, self._jobs = self._jobs, None
+        if hasattr(jobs, "close"):
+            jobs.close()  # 取消时结束生成器，停止后台解密
+        self.finished.emit(list(self._exported), list(self._failed), self._error)
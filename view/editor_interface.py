@@ -2,17 +2,16 @@ from concurrent.futures import ThreadPoolExecutor
 import sys
 from datetime import datetime
 
-from PySide6.QtWebEngineWidgets import QWebEngineView
 from PySide6.QtWidgets import (
     QWidget,
     QVBoxLayout,
     QApplication,
     QHBoxLayout,
     QFileDialog,
+    QInputDialog,
 )
 from qfluentwidgets import StateToolTip
-from PySide6.QtCore import QTimer, Qt
-import markdown
+from PySide6.QtCore import QTimer, Qt, Signal
 from qfluentwidgets import (
     FluentTranslator,
     TextEdit,
@@ -20,35 +19,168 @@ from qfluentwidgets import (
     Action,
 )
 from qfluentwidgets import FluentIcon as FIF
-from managers import DiaryManager
+from managers import DiaryManager, ChatLog, AutosaveManager
 from models import Diary
 from rag.llm_generator import LLMGenerator
 from common import signalBus
 from view.chat_window import ChatWindow, LlmThread
+from utils.markdown_renderer import MarkdownRenderer
+from utils.diary_export import (
+    export_with_pillow,
+    iter_export_jobs,
+    make_export_job,
+    render_with_pillow,
+)
+from view.diary_exporter import BatchExporter, OffscreenRenderer
 
 from PySide6.QtWidgets import QPushButton
-from rag import RagRetriever
+from rag import (
+    RagRetriever,
+    RagIndexer,
+    DiaryChunker,
+    LlmResponseCache,
+    PromptPacker,
+    create_embedding_model,
+)
 
 
 class EditorInterface(QWidget):
+    preview_rendered = Signal(object, object)  # (内容哈希, HTML)，后台渲染完成后发出
+    # (导出成功的路径, 导出失败的路径, 导出中断时的错误信息，没有出错时为空)
+    export_finished = Signal(list, list, str)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.executor = ThreadPoolExecutor(max_workers=1)  # 创建线程池
         self.setObjectName("EditorInterface")
         self.diary_manager = DiaryManager()
-        self.llm_generator = LLMGenerator(model_name="gpt-4-turbo-preview")
+        self.llm_generator = LLMGenerator(
+            model_name="gpt-4-turbo-preview",
+            response_cache=self._create_response_cache(),
+            cache_methods=self.diary_manager.config_manager.get_config_value(
+                "llm_cache_methods", ["qa_context_predict", "diary_generate_predict"]
+            ),
+        )
         self.html = None
-        self.rag_retriever = RagRetriever(self.diary_manager.get_all_diaries_str())
+        # 预览在单独的线程中渲染，按块缓存 HTML
+        self.markdown_renderer = MarkdownRenderer()
+        self.preview_executor = ThreadPoolExecutor(max_workers=1)
+        self._preview_digest = None  # 预览当前显示的内容的哈希
+        self._preview_rendering = False
+        self._preview_stale = False  # 渲染期间内容又有变化
+        self.llm_thread = None
+        self._llm_message = None  # 正在流式显示的回复消息
+        self._cancelled_llm_threads = set()  # 已取消但尚未结束的任务，结束前需保留引用
+        self._init_rag()
+        config = self.diary_manager.config_manager
+        self.autosave = AutosaveManager(
+            self.diary_manager,
+            journal_dir=config.get_config_value(
+                "autosave_journal_dir", "./data/journal/"
+            ),
+            debounce=config.get_config_value("autosave_debounce", 2.0),
+        )
+
+        # 导出使用常驻的离屏渲染器，第一次导出时创建
+        self.export_backend = config.get_config_value("export_backend", "webengine")
+        self.export_width = config.get_config_value("export_width", 800)
+        self._export_renderer = None
+        self._batch_exporter = None
+        self._share_paths = set()
 
         self.initUI()
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_preview)
-        self.timer.start(300)  # Update preview every 300 milliseconds
+        self.export_finished.connect(self._on_export_finished)
+        if self.export_backend == "webengine" and config.get_config_value(
+            "export_warm_up", False
+        ):
+            QTimer.singleShot(0, lambda: self._get_export_renderer().warm_up())
+        # 停止输入一段时间后才刷新预览
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(
+            self.diary_manager.config_manager.get_config_value(
+                "preview_debounce_ms", 300
+            )
+        )
+        self.preview_timer.timeout.connect(self.update_preview)
+        self.text_edit.textChanged.connect(self.preview_timer.start)
+        self.preview_rendered.connect(self._apply_preview)
+        # 编辑合并为一批后交给自动保存引擎，加密和写盘都在后台线程中进行
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.setSingleShot(True)
+        self.autosave_timer.setInterval(
+            config.get_config_value("autosave_batch_ms", 500)
+        )
+        self.autosave_timer.timeout.connect(self.queue_autosave)
+        if config.get_config_value("autosave_enabled", True):
+            self.text_edit.textChanged.connect(self.autosave_timer.start)
 
         self.diary = None
         # 自动加载当日日记
         self.load_diary_to_text_edit()
 
+    def _create_response_cache(self):
+        """配置开启时创建用保险库密钥加密的 LLM 回答缓存，否则返回 None"""
+        config = self.diary_manager.config_manager
+        if not config.get_config_value("llm_cache_enabled", False):
+            return None
+        return LlmResponseCache(
+            cache_path=config.get_config_value("llm_cache_path"),
+            crypto_manager=self.diary_manager.crypto_manager,
+            ttl=config.get_config_value("llm_cache_ttl", 7 * 24 * 3600),
+            max_entries=config.get_config_value("llm_cache_size", 1000),
+        )
+
+    def _open_chat_log(self):
+        """打开加密的聊天记录，配置为续接时打开最近的会话，否则新建会话"""
+        config = self.diary_manager.config_manager
+        log_dir = config.get_config_value("chat_log_dir", "./data/chat/")
+        sessions = ChatLog.list_sessions(log_dir)
+        if sessions and config.get_config_value("chat_resume_session", True):
+            session_id = sessions[-1]
+        else:
+            session_id = ChatLog.new_session_id()
+        return ChatLog(
+            session_id,
+            log_dir,
+            crypto_manager=self.diary_manager.crypto_manager,
+            ring_size=config.get_config_value("chat_history_size", 50),
+        )
+
+    def _init_rag(self):
+        """加载检索索引，在后台线程中与日记库同步，并在日记变更时后台更新索引"""
+        config = self.diary_manager.config_manager
+        # 日记切分为带日期、天气的段落，检索只返回命中的段落
+        chunker = DiaryChunker(
+            max_chars=config.get_config_value("rag_chunk_size", 300),
+            overlap_chars=config.get_config_value("rag_chunk_overlap", 80),
+        )
+        # 这里只加载已保存的索引，解密全部日记和嵌入变化的日记都在索引器的后台线程中进行
+        self.rag_retriever = RagRetriever(
+            None,
+            embedding_model=create_embedding_model(
+                config.get_config_value("embedding_backend", "openai"),
+                config.get_config_value("hashing_embedding_dim", 1024),
+            ),
+            index_path=config.get_config_value("rag_index_path"),
+            crypto_manager=self.diary_manager.crypto_manager,
+            embedding_cache_path=config.get_config_value("embedding_cache_path"),
+            embedding_cache_size=config.get_config_value("embedding_cache_size", 50000),
+        )
+        # 保存/删除日记后在后台增量更新索引
+        self.rag_indexer = RagIndexer(
+            self.rag_retriever,
+            debounce=config.get_config_value("rag_index_debounce", 2.0),
+            document_builder=chunker,
+        )
+        self.diary_manager.add_listener(self.rag_indexer.on_diary_changed)
+        self.rag_indexer.bootstrap(
+            lambda: {
+                diary.date: chunker(diary)
+                for diary in self.diary_manager.iter_diaries()
+            }
+        )
+
     def initUI(self):
         self.stateTooltip = None
         main_layout = QVBoxLayout()
@@ -102,6 +234,9 @@ class EditorInterface(QWidget):
                 Action(FIF.DELETE, self.tr("Delete")),  # 删除
             ]
         )
+        export_action = Action(FIF.DOWNLOAD, self.tr("Export"))  # 批量导出
+        export_action.triggered.connect(self.export_diaries)
+        bar.addAction(export_action)
 
         # 绑定 Save 按钮到 self.save_file 方法
         save_action = bar.actions()[2]  # Save
@@ -147,14 +282,37 @@ class EditorInterface(QWidget):
         editor_layout.addWidget(self.preview)
 
         # 创建聊天窗口
-        self.chat_window = ChatWindow(llm_generator=self.llm_generator)
+        config = self.diary_manager.config_manager
+        self.chat_window = ChatWindow(
+            llm_generator=self.llm_generator,
+            prompt_packer=PromptPacker(
+                max_tokens=config.get_config_value("chat_prompt_max_tokens", 3000),
+                model_name=self.llm_generator.model_name,
+            ),
+            chat_log=self._open_chat_log(),
+            page_size=config.get_config_value("chat_page_size", 30),
+            max_visible_messages=config.get_config_value(
+                "chat_max_visible_messages", 10000
+            ),
+            transcription={
+                "host": config.get_config_value("transcription_host", "127.0.0.1"),
+                "port": config.get_config_value("transcription_port", 5000),
+                "framing": config.get_config_value("transcription_framing", "line"),
+                "utterance_timeout": config.get_config_value(
+                    "transcription_utterance_timeout", 1.2
+                ),
+                "ignore_patterns": config.get_config_value(
+                    "transcription_ignore_patterns", ["转写", "林黛玉"]
+                ),
+            },
+        )
         self.chat_window.setVisible(False)  # 默认隐藏
         editor_layout.addWidget(self.chat_window)  # 添加到 editor_layout
 
         main_layout.addLayout(top_layout)
         main_layout.addLayout(editor_layout)
         self.setLayout(main_layout)
-        self.chat_window.send_message = self.send_message
+        self.chat_window.set_message_handler(self.send_message)
 
     # # 重写 chat_window 的 send_message 方法
     # def send_message(self):
@@ -231,22 +389,40 @@ class EditorInterface(QWidget):
             "你", "user_avatar.png", message, alignment=Qt.AlignRight
         )
 
-        # 禁用输入区域并显示进度条
-        self.chat_window.input_field.setEnabled(False)
-        self.chat_window.send_button.setEnabled(False)
+        # 显示进度条；输入区域保持可用，新消息会取消尚未完成的旧请求
         self.chat_window.progress_bar.show()
-        context = self.rag_retriever.retrieve(message, k=3)
-        print("context", context)
-        # 在后台线程中处理LLM请求
+        self._cancel_llm_thread()
+
+        # 检索和LLM请求作为一个任务在后台线程中执行，不阻塞界面，回复逐段显示
+        chat_message = self.chat_window.begin_ai_message()
+        self._llm_message = chat_message
         self.llm_thread = LlmThread(
             self.chat_window.chat_manager,
             input=message,
             diary_content=self.text_edit.toPlainText(),
-            context=context,
+            retriever=self.rag_retriever,
+            k=3,
+            stream=True,
+        )
+        self.llm_thread.delta_ready.connect(
+            lambda delta: self.chat_window.append_ai_delta(chat_message, delta)
         )
-        self.llm_thread.response_ready.connect(self.chat_window.handle_ai_response)
+        self.llm_thread.response_ready.connect(
+            lambda response: self.chat_window.finish_ai_message(chat_message, response)
+        )
+        self.llm_thread.timings_ready.connect(self.chat_window.show_timings)
         self.llm_thread.start()
 
+    def _cancel_llm_thread(self):
+        """取消正在进行的检索/LLM任务，其结果将被丢弃"""
+        thread = self.llm_thread
+        if thread is None or not thread.isRunning():
+            return
+        thread.cancel()
+        self.chat_window.cancel_ai_message(self._llm_message)
+        self._cancelled_llm_threads.add(thread)
+        thread.finished.connect(lambda: self._cancelled_llm_threads.discard(thread))
+
     def get_current_diary(self, tool_input=None):
         """获取当前用户编辑框里的日记"""
         return self.text_edit.toPlainText()
@@ -265,60 +441,212 @@ class EditorInterface(QWidget):
             self.chat_toggle_button.setText("▶")  # 右三角按钮
 
     def update_preview(self):
+        """在后台线程中渲染预览，内容没有变化时跳过"""
+        if self._preview_rendering:
+            self._preview_stale = True  # 当前渲染结束后再渲染最新的内容
+            return
         text = self.text_edit.toPlainText()
-
-        self.html = markdown.markdown(
-            text, extensions=["extra", "markdown.extensions.toc"]
+        digest = self.markdown_renderer.digest(text)
+        if digest == self._preview_digest:
+            return
+        self._preview_rendering = True
+        future = self.preview_executor.submit(self.markdown_renderer.render, text)
+        future.add_done_callback(
+            lambda future: self._on_preview_rendered(digest, future)
         )
-        self.preview.setHtml(self.html)
-
-        # Alternative method
-        # self.preview.setMarkdown(text)
-
-    def save_file(self):
-        print("保存文件")
 
+    def _on_preview_rendered(self, digest, future):
+        # 在渲染线程中调用，通过信号回到主线程更新界面
+        try:
+            html = future.result()
+        except Exception as e:
+            print("预览渲染失败", e)
+            digest, html = None, None
+        self.preview_rendered.emit(digest, html)
+
+    def _apply_preview(self, digest, html):
+        self._preview_rendering = False
+        if html is not None and digest != self._preview_digest:
+            self._preview_digest = digest
+            self.html = html
+            # setHtml 会重置滚动位置，保持用户正在看的位置
+            scroll_bar = self.preview.verticalScrollBar()
+            position = scroll_bar.value()
+            self.preview.setHtml(html)
+            scroll_bar.setValue(position)
+        if self._preview_stale:
+            self._preview_stale = False
+            self.update_preview()
+
+    def _edited_diary(self):
+        """用编辑框的内容更新当前日记"""
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         update_data = {
             "content": self.text_edit.toPlainText(),
             "update_time": current_time,
             "create_time": self.diary.create_time or current_time,
         }
+        return self.diary.copy(update=update_data)
+
+    def queue_autosave(self):
+        """把当前编辑交给自动保存引擎，内容未变化时不会保存"""
+        self.autosave_timer.stop()
+        if self.diary is None:
+            return False
+        diary = self._edited_diary()
+        if self.autosave.update(diary):
+            self.diary = diary
+            return True
+        return False
+
+    def flush_autosave(self):
+        """立即在后台保存当前编辑，不等待保存完成，切换日期前调用"""
+        self.queue_autosave()
+        self.autosave.flush(wait=False)
+
+    def shutdown_autosave(self, timeout=None):
+        """保存剩余的编辑并停止自动保存线程，退出程序前调用"""
+        self.queue_autosave()
+        self.autosave.stop(timeout)
+
+    def shutdown_rag_indexer(self, timeout=None):
+        """把尚未处理的日记变更写入索引并停止索引线程，在自动保存停止后调用"""
+        self.diary_manager.remove_listener(self.rag_indexer.on_diary_changed)
+        self.rag_indexer.stop(timeout)
 
-        self.diary = self.diary.copy(update=update_data)
-        res = self.diary_manager.save_diary(self.diary)
-        print("保存结果", res)
+    def save_file(self):
+        print("保存文件")
+        self.flush_autosave()
 
     def load_diary_to_text_edit(self, date=None):
         print("load_diary_to_text_edit" + str(date))
         date = date or str(datetime.now().date())
-        self.diary = self.diary_manager.load_diary(date)
+        # 切换前的编辑可能还在后台保存，优先使用尚未保存完成的内容
+        pending = self.autosave.get_pending(date)
+        self.diary = pending or self.diary_manager.load_diary(date)
         if not self.diary:
             self.diary = Diary(
                 date=date,
             )
-        self.text_edit.setPlainText(self.diary.content)
+        content = self.diary.content or ""
+        if pending is None:
+            self.autosave.mark_clean(date, content)
+            # 上次退出前没来得及保存的编辑
+            recovered = self.autosave.recover(date)
+            if recovered is not None and recovered != content:
+                print(f"从自动保存日志恢复了 {date} 未保存的内容")
+                content = recovered
+        self.text_edit.setPlainText(content)
+
+    def _get_export_renderer(self):
+        if self._export_renderer is None:
+            self._export_renderer = OffscreenRenderer(self.export_width, self)
+            self._export_renderer.finished.connect(self._on_share_exported)
+        return self._export_renderer
 
     def share_file(self):
-        self.webview = QWebEngineView()
-        self.webview.setHtml(self.html)
-
-        # Wait until the HTML is fully loaded, then take a screenshot
-        QTimer.singleShot(1000, self.capture_screenshot)
+        """把当前日记导出为图片或 PDF"""
+        save_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save Image",
+            f"{self.diary.date}.png",
+            "PNG Files (*.png);;PDF Files (*.pdf);;All Files (*)",
+        )
+        if not save_path:
+            return
+        if not save_path.lower().endswith((".png", ".pdf")):
+            save_path += ".png"
+
+        diary = self._edited_diary()
+        # 未修改的块直接使用预览的渲染缓存
+        body = self.markdown_renderer.render(diary.content or "")
+        job = make_export_job(diary, body, save_path)
+        if self.export_backend == "pillow":
+            future = self.executor.submit(
+                lambda: [render_with_pillow(job, width=self.export_width)]
+            )
+            future.add_done_callback(self._on_pillow_export_done)
+        else:
+            self._share_paths.add(save_path)
+            self._get_export_renderer().render(job.html, save_path)
+
+    def _on_share_exported(self, path, error):
+        if path in self._share_paths:
+            self._share_paths.discard(path)
+            self._on_export_finished([] if error else [path], [path] if error else [])
+
+    def export_diaries(self):
+        """批量导出日期范围内的日记，每篇一个文件"""
+        if self._batch_exporter is not None and self._batch_exporter.is_running():
+            self._batch_exporter.cancel()
+            print("已取消批量导出")
+            return
+        today = datetime.now().date()
+        text, ok = QInputDialog.getText(
+            self,
+            "批量导出",
+            "日期范围（YYYY-MM-DD ~ YYYY-MM-DD，留空表示不限）",
+            text=f"{today.replace(day=1)} ~ {today}",
+        )
+        if not ok:
+            return
+        start, _, end = text.partition("~")
+        start, end = start.strip() or None, end.strip() or None
+        fmt, ok = QInputDialog.getItem(
+            self, "批量导出", "格式", ["png", "pdf"], 0, False
+        )
+        if not ok:
+            return
+        out_dir = QFileDialog.getExistingDirectory(self, "导出到")
+        if not out_dir:
+            return
 
-    def capture_screenshot(self):
-        # Set the size of the webview to the desired image size
-        self.webview.resize(800, 600)
-        self.webview.show()
+        # 先在后台保存当前的编辑，导出的是存储中的日记
+        self.flush_autosave()
+        if self.export_backend == "pillow":
+            future = self.executor.submit(
+                self._export_with_pillow, out_dir, fmt, start, end
+            )
+            future.add_done_callback(self._on_pillow_export_done)
+        else:
+            if self._batch_exporter is None:
+                self._batch_exporter = BatchExporter(
+                    self._get_export_renderer(), parent=self
+                )
+                self._batch_exporter.finished.connect(self._on_export_finished)
+            self._batch_exporter.start(
+                self._iter_export_jobs(
+                    out_dir, fmt, start, end, self._batch_exporter.cancel_event
+                )
+            )
+        print(f"开始导出 {start or ''} ~ {end or ''} 的日记到 {out_dir}")
 
-        # Capture the screenshot and save it to a file
-        # self.webview.grab().save('screenshot.png')
+    def _iter_export_jobs(self, out_dir, fmt, start, end, cancel_event):
+        # 在导出线程中迭代：等待自动保存写完后再读取日记
+        self.autosave.flush(timeout=10)
+        yield from iter_export_jobs(
+            self.diary_manager, out_dir, fmt, start, end, cancel_event=cancel_event
+        )
 
-        save_path, _ = QFileDialog.getSaveFileName(
-            self, "Save Image", "", "PNG Files (*.png);;All Files (*)"
+    def _export_with_pillow(self, out_dir, fmt, start, end):
+        self.autosave.flush(timeout=10)
+        return export_with_pillow(
+            self.diary_manager, out_dir, fmt, start, end, width=self.export_width
         )
-        if save_path:
-            self.webview.grab().save(save_path)
+
+    def _on_pillow_export_done(self, future):
+        # 在线程池中调用，通过信号回到主线程
+        try:
+            self.export_finished.emit(future.result(), [], "")
+        except Exception as e:
+            self.export_finished.emit([], [], str(e) or type(e).__name__)
+
+    def _on_export_finished(self, exported, failed, error=""):
+        if error:
+            print("导出中断，之后的日记没有导出:", error)
+        if failed:
+            print("导出失败", failed)
+        print(f"导出完成，共 {len(exported)} 个文件", exported[-1:] if exported else "")
 
     def diary_generate(self):
         try:
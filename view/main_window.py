@@ -41,12 +41,20 @@ class Main_Window(FluentWindow):
 
     def calendar_switchTo_editor(self, date):
         print(date)
-        print("cao")
-        # todo: 保存原editor
+        # 在后台保存原日记，不阻塞界面
+        self.editorInterface.flush_autosave()
 
         self.editorInterface.load_diary_to_text_edit(date=date)
         self.switchTo(self.editorInterface)
 
+    def closeEvent(self, event):
+        # 退出前保存尚未保存的编辑，再把这些保存更新到检索索引
+        self.editorInterface.shutdown_autosave(timeout=10)
+        self.editorInterface.shutdown_rag_indexer(timeout=10)
+        # 不再需要加解密：清空内存中的明文日记并丢弃数据密钥
+        self.editorInterface.diary_manager.lock()
+        super().closeEvent(event)
+
     def check(self):
         cwd = os.getcwd()
         print(cwd)